@@ -0,0 +1,122 @@
+"""Benchmarks for the text processing pipeline.
+
+Run them from the `app` directory as modules, for example:
+
+    python -m bin.benchmarks.corenlp_output_formats
+
+They use the configured settings, so the CoreNLP and LanguageTool
+services must be reachable. For deterministic runs point the settings to
+a `bin.replay_server` serving recorded responses.
+"""
+
+import importlib
+import os
+import statistics
+import time
+
+import django
+
+
+fixture_modules = [
+    'lti_app.tests.academic_style_checker.data',
+    'lti_app.tests.citation_checker.data',
+    'lti_app.tests.grammar_checker.data',
+    'lti_app.tests.plagiarism_checker.data',
+    'lti_app.tests.semantics_checker.data'
+]
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scriba.settings.local')
+    django.setup()
+
+
+def get_fixture_texts():
+    """Get the (unique) texts used by the test fixtures.
+
+    Returns:
+        list of str: The texts.
+    """
+
+    texts = []
+
+    for module_name in fixture_modules:
+        module = importlib.import_module(module_name)
+
+        for value in vars(module).values():
+            if type(value) is not list:
+                continue
+
+            for item in value:
+                if type(item) is not tuple:
+                    continue
+
+                texts.extend(
+                    element
+                    for element in item
+                    if type(element) is str
+                    and ' ' in element
+                    and element not in texts
+                )
+
+    return texts
+
+
+def get_fixture_submissions():
+    """Get (text, excerpt, supporting excerpts) submissions from the fixtures.
+
+    Returns:
+        list of tuple: The submissions of the semantics checker fixtures.
+    """
+
+    from lti_app.tests.semantics_checker.data import similarity_data
+
+    return [
+        (text, excerpt, supporting_excerpts)
+        for text, excerpt, supporting_excerpts, *_ in similarity_data
+    ]
+
+
+def timed(func, *args, **kwargs):
+    """Call a function and time it.
+
+    Returns:
+        tuple: The result and the duration in seconds.
+    """
+
+    started_at = time.perf_counter()
+    result = func(*args, **kwargs)
+
+    return result, time.perf_counter() - started_at
+
+
+def summarize(values):
+    """Summarize a list of measurements.
+
+    Returns:
+        dict: The mean, median, 95th percentile and total.
+    """
+
+    ordered = sorted(values)
+
+    return {
+        'mean': statistics.mean(ordered),
+        'median': statistics.median(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'total': sum(ordered)
+    }
+
+
+def print_table(title, headers, rows):
+    print('\n' + title)
+    print('=' * len(title))
+
+    widths = [
+        max(len(str(value)) for value in [header] + [row[i] for row in rows])
+        for i, header in enumerate(headers)
+    ]
+
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,57 @@
+"""Compares the JSON and protobuf CoreNLP output formats.
+
+For every fixture text it reports the response size and the time spent
+decoding the response into the parse data.
+"""
+
+from . import get_fixture_texts, print_table, setup_django, summarize, timed
+
+
+def main():
+    setup_django()
+
+    from lti_app.core.api import CoreNlpClient
+    from lti_app.core.text_processing.parser import build_parse_data, decode_sentences
+
+    client = CoreNlpClient()
+    annotators = ['parse']
+    measurements = {'json': [], 'serialized': []}
+
+    for text in get_fixture_texts():
+        json_response = client._post(text, {
+            'annotators': ','.join(annotators),
+            'outputFormat': 'json'
+        })
+        _, json_decode = timed(
+            lambda: build_parse_data(json_response.json().get('sentences'))
+        )
+        measurements['json'].append((len(json_response.content), json_decode))
+
+        serialized = client.run_serialized(text, annotators)
+        _, serialized_decode = timed(
+            lambda: build_parse_data(decode_sentences(serialized))
+        )
+        measurements['serialized'].append((len(serialized), serialized_decode))
+
+    rows = []
+
+    for output_format, values in measurements.items():
+        sizes = summarize([size for size, _ in values])
+        durations = summarize([duration for _, duration in values])
+        rows.append([
+            output_format,
+            int(sizes['total']),
+            int(sizes['mean']),
+            '{:.2f}'.format(durations['total'] * 1000),
+            '{:.3f}'.format(durations['mean'] * 1000)
+        ])
+
+    print_table(
+        'CoreNLP output formats ({} texts)'.format(len(measurements['json'])),
+        ['format', 'total bytes', 'mean bytes', 'total decode ms', 'mean decode ms'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Measures the end-to-end latency of the paraphrase analysis.
+
+Every fixture submission goes through `DefaultChecker` (processing and
+checks) twice: once with the LanguageTool request sent after the text is
+parsed and once with it sent concurrently with the parsing
+(`settings.LANGUAGETOOL['CONCURRENT']`). The excerpts are processed once
+beforehand so that both runs hit the same caches.
+"""
+
+from django.conf import settings
+
+from . import get_fixture_submissions, print_table, setup_django, summarize, timed
+
+
+def analyse(text, excerpt, supporting_excerpts):
+    from lti_app.core.checkers import DefaultChecker
+
+    checker = DefaultChecker(text, excerpt, supporting_excerpts, None)
+
+    return checker.run()
+
+
+def main():
+    setup_django()
+
+    submissions = get_fixture_submissions()
+    rows = []
+
+    # Warm up the excerpt caches and the models
+    for submission in submissions:
+        analyse(*submission)
+
+    for concurrent in [False, True]:
+        settings.LANGUAGETOOL['CONCURRENT'] = concurrent
+        latencies = [
+            timed(analyse, *submission)[1]
+            for submission in submissions
+        ]
+        latency = summarize(latencies)
+        rows.append([
+            'concurrent' if concurrent else 'sequential',
+            '{:.1f}'.format(latency['mean'] * 1000),
+            '{:.1f}'.format(latency['median'] * 1000),
+            '{:.1f}'.format(latency['p95'] * 1000)
+        ])
+
+    print_table(
+        'Job latency ({} submissions)'.format(len(submissions)),
+        ['LanguageTool', 'mean ms', 'median ms', 'p95 ms'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
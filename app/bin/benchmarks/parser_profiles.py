@@ -0,0 +1,81 @@
+"""Compares the CoreNLP parser profiles.
+
+For every profile it reports the per-sentence parsing latency over the
+fixture texts and how many texts get a different grammar checker output
+than with the default profile.
+"""
+
+from django.conf import settings
+
+from . import get_fixture_texts, print_table, setup_django, summarize, timed
+
+
+def grammar_output(parse_data, text):
+    from lti_app import strings
+    from lti_app.core.grammar_checker import Checker
+    from lti_app.core.text_processing.document import Document
+
+    document = Document(text, {
+        strings.cleaned_text: text,
+        strings.parse_data: parse_data
+    })
+    checker = Checker(document)
+    output = checker.process_parse_tree([
+        checker.get_comma_splices,
+        checker.get_sentence_fragments,
+        checker.get_noun_verb_disagreements
+    ])
+    output['auxiliary_do_negated_mistakes'] = checker.get_auxiliary_do_negated_mistakes()
+
+    return output
+
+
+def main():
+    setup_django()
+
+    from lti_app.core.text_helpers import clean_text
+    from lti_app.core.text_processing.parser import Parser
+
+    parser = Parser(sentence_cache=False, chunk_size=0)
+    texts = [clean_text(text) for text in get_fixture_texts()]
+    default_profile = settings.STANFORD_CORENLP['PARSER_PROFILE']
+    profiles = sorted(settings.STANFORD_CORENLP['PARSER_PROFILES'])
+    outputs = {}
+    rows = []
+
+    for profile in profiles:
+        latencies = []
+        outputs[profile] = []
+
+        for text in texts:
+            parse_data, duration = timed(parser.parse, text, profile)
+            num_sentences = max(1, len(parse_data['constituencies']))
+            latencies.append(duration / num_sentences)
+            outputs[profile].append(grammar_output(parse_data, text))
+
+        latency = summarize(latencies)
+        rows.append([
+            profile,
+            '{:.1f}'.format(latency['mean'] * 1000),
+            '{:.1f}'.format(latency['median'] * 1000),
+            '{:.1f}'.format(latency['p95'] * 1000)
+        ])
+
+    for row in rows:
+        profile = row[0]
+        changed = sum(
+            1
+            for output, default_output in zip(outputs[profile], outputs[default_profile])
+            if output != default_output
+        )
+        row.append(changed)
+
+    print_table(
+        'Parser profiles ({} texts, default: {})'.format(len(texts), default_profile),
+        ['profile', 'mean ms/sent', 'median ms/sent', 'p95 ms/sent', 'grammar changes'],
+        rows
+    )
+
+
+if __name__ == '__main__':
+    main()
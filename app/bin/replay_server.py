@@ -0,0 +1,395 @@
+"""Serves recorded CoreNLP and LanguageTool responses over HTTP.
+
+The server stands in for both NLP services, so that benchmarks and load
+tests can run deterministically without the Java containers. Requests to
+`/v2/...` are LanguageTool requests, every other path is a CoreNLP request.
+Responses are keyed by the method, path, query parameters (including the
+CoreNLP `properties`) and body of the request.
+
+In `record` mode the requests are forwarded to the real services and the
+responses are saved. In `replay` mode the saved responses are served and
+unknown requests get a 404. In `record` mode, requests get a 502 while the
+service is unreachable. In both modes a latency and an error rate can
+be injected.
+
+Run it from the `app` directory, for example:
+
+    python -m bin.replay_server record --port 9100 \\
+        --corenlp http://localhost:9000 --languagetool http://localhost:8010
+    python -m bin.replay_server replay --port 9100 --latency 0.2 --error-rate 0.01
+
+and point the app to it with `STANFORD_CORENLP_BACKENDS=localhost:9100`,
+`LANGUAGETOOL_HOST=localhost` and `LANGUAGETOOL_PORT=9100`.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+
+default_directory = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    'recordings'
+)
+record = 'record'
+replay = 'replay'
+
+
+def _normalize_params(params):
+    normalized = []
+
+    for name, value in sorted(params):
+        # The order of the CoreNLP properties does not matter
+        if name == 'properties':
+            try:
+                value = json.dumps(json.loads(value), sort_keys=True)
+            except ValueError:
+                pass
+
+        normalized.append([name, value])
+
+    return normalized
+
+
+def request_key(method, path, query, body, content_type=None):
+    """Get the recording key of a request.
+
+    Args:
+        method (str): The HTTP method.
+        path (str): The request path.
+        query (str): The query string.
+        body (bytes): The request body.
+        content_type (str, optional): Defaults to None. The body type.
+
+    Returns:
+        str: The SHA-256 hex digest of the normalized request.
+    """
+
+    if content_type and content_type.startswith('application/x-www-form-urlencoded'):
+        body = _normalize_params(parse_qsl(body.decode('utf-8')))
+    else:
+        body = body.decode('utf-8', errors='replace')
+
+    data = [
+        method,
+        path.rstrip('/'),
+        _normalize_params(parse_qsl(query)),
+        body
+    ]
+
+    return hashlib.sha256(json.dumps(data).encode('utf-8')).hexdigest()
+
+
+class Recordings:
+    """A directory of recorded responses, one JSON file per request key.
+
+    Args:
+        directory (str): The directory, created if needed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """Get a recorded response.
+
+        Returns:
+            dict: The status, content type and body or None if missing.
+        """
+
+        try:
+            with open(self._filename(key)) as f:
+                response = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        response['body'] = base64.b64decode(response['body'])
+
+        return response
+
+    def put(self, key, request, status, content_type, body):
+        """Save a response.
+
+        Args:
+            key (str): The request key.
+            request (dict): The request description (for humans).
+            status (int): The response status.
+            content_type (str): The response content type.
+            body (bytes): The response body.
+        """
+
+        filename = self._filename(key)
+        temporary_filename = filename + '.tmp'
+
+        with open(temporary_filename, 'w') as f:
+            json.dump({
+                'request': request,
+                'status': status,
+                'content_type': content_type,
+                'body': base64.b64encode(body).decode('ascii')
+            }, f, indent=2)
+
+        os.replace(temporary_filename, filename)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ReplayServer:
+    """Records or replays the NLP services responses.
+
+    Args:
+        recordings (Recordings): The recorded responses.
+        mode (str, optional): Defaults to `replay`. Either `record` or
+            `replay`.
+        corenlp (str, optional): Defaults to None. The CoreNLP URL used
+            in `record` mode.
+        languagetool (str, optional): Defaults to None. The LanguageTool
+            URL used in `record` mode.
+        latency (float, optional): Defaults to 0.0. Seconds added to
+            every response.
+        jitter (float, optional): Defaults to 0.0. Maximum random
+            seconds added on top of the latency.
+        error_rate (float, optional): Defaults to 0.0. The fraction of
+            requests answered with `error_status`.
+        error_status (int, optional): Defaults to 503. The injected
+            error status.
+        seed (int, optional): Defaults to None. The seed of the latency
+            and error injection.
+        host (str, optional): Defaults to '127.0.0.1'.
+        port (int, optional): Defaults to 0 (a free port).
+    """
+
+    def __init__(
+        self,
+        recordings,
+        mode=replay,
+        corenlp=None,
+        languagetool=None,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        error_status=503,
+        seed=None,
+        host='127.0.0.1',
+        port=0
+    ):
+        if mode not in [record, replay]:
+            raise ValueError('Invalid mode: {}'.format(mode))
+
+        self.recordings = recordings
+        self.mode = mode
+        self.upstreams = {'corenlp': corenlp, 'languagetool': languagetool}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        self.stats = {
+            'requests': 0,
+            'hits': 0,
+            'misses': 0,
+            'errors': 0,
+            'upstream_errors': 0
+        }
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address
+        return 'http://{0}:{1}'.format(host, port)
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _inject(self):
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+
+        if delay > 0:
+            time.sleep(delay)
+
+        return failed
+
+    def _forward(self, method, path, query, body, content_type):
+        service = 'languagetool' if path.startswith('/v2/') else 'corenlp'
+        upstream = self.upstreams.get(service)
+
+        if upstream is None:
+            return None
+
+        response = self.session.request(
+            method,
+            upstream.rstrip('/') + path + ('?' + query if query else ''),
+            data=body,
+            headers={'Content-Type': content_type} if content_type else {}
+        )
+
+        return {
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', 'application/json'),
+            'body': response.content
+        }
+
+    def handle(self, method, path, query, body, content_type):
+        """Get the response to a request.
+
+        Returns:
+            dict: The status, content type and body.
+        """
+
+        self._count('requests')
+
+        if self._inject():
+            self._count('errors')
+            return {
+                'status': self.error_status,
+                'content_type': 'application/json',
+                'body': b'{"error": "Injected error"}'
+            }
+
+        key = request_key(method, path, query, body, content_type)
+
+        if self.mode == record:
+            try:
+                response = self._forward(method, path, query, body, content_type)
+            except requests.ConnectionError as e:
+                self._count('upstream_errors')
+                return {
+                    'status': 502,
+                    'content_type': 'application/json',
+                    'body': json.dumps({
+                        'error': 'Cannot connect to the upstream service: {}'.format(e)
+                    }).encode('utf-8')
+                }
+
+            if response is not None and response['status'] < 500:
+                self.recordings.put(
+                    key,
+                    {'method': method, 'path': path, 'query': query},
+                    response['status'],
+                    response['content_type'],
+                    response['body']
+                )
+        else:
+            response = self.recordings.get(key)
+
+        if response is None:
+            self._count('misses')
+            return {
+                'status': 404,
+                'content_type': 'application/json',
+                'body': b'{"error": "No recorded response"}'
+            }
+
+        self._count('hits')
+
+        return response
+
+    def _make_handler(self):
+        replay_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                url = urlsplit(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                response = replay_server.handle(
+                    self.command,
+                    url.path,
+                    url.query,
+                    body,
+                    self.headers.get('Content-Type')
+                )
+
+                self.send_response(response['status'])
+                self.send_header('Content-Type', response['content_type'])
+                self.send_header('Content-Length', str(len(response['body'])))
+                self.end_headers()
+                self.wfile.write(response['body'])
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread."""
+
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('mode', choices=[record, replay])
+    parser.add_argument('--directory', default=default_directory)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--corenlp', default='http://localhost:9000')
+    parser.add_argument('--languagetool', default='http://localhost:8010')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        Recordings(args.directory),
+        mode=args.mode,
+        corenlp=args.corenlp,
+        languagetool=args.languagetool,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+        host=args.host,
+        port=args.port
+    )
+
+    print('> {0} on {1} ({2})'.format(args.mode, server.endpoint, args.directory))
+
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+        print(server.stats)
+
+
+if __name__ == '__main__':
+    main()
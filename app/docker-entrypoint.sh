@@ -8,5 +8,9 @@ python manage.py collectstatic --noinput
 echo "Apply database migrations"
 python manage.py migrate
 
+# Build the synonym index (once)
+echo "Build the synonym index"
+python manage.py build_synonym_index
+
 # Start supervisord
 /usr/bin/supervisord -c /etc/supervisor/conf.d/supervisord.conf
\ No newline at end of file
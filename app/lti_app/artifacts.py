@@ -0,0 +1,407 @@
+"""Provides the store of processing artefacts.
+
+Artefacts (the outputs of the processing nodes) are content-addressed:
+their key is a hash of the digest of the node inputs and of the name,
+version and options of the node. The same excerpt used in several courses
+is therefore stored once, and changing a node (bumping its version) or its
+options never serves artefacts computed by the previous implementation.
+"""
+
+import json
+import os
+import pickle
+import socket
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from lti_app.caching import (
+    CachingException,
+    coalesce,
+    get_hash,
+    get_local_cache,
+    load_values,
+    store_values
+)
+from lti_app.metrics import Metrics
+
+
+def artifact_key(input_digest, name, version, options=None):
+    """Get the key of an artefact.
+
+    Args:
+        input_digest (str): The digest of the node inputs.
+        name (str): The node name.
+        version (int or str): The node version.
+        options (dict, optional): Defaults to None. The node options
+            changing its output.
+
+    Returns:
+        str: The SHA-256 hex digest of the key parts.
+    """
+
+    return get_hash(json.dumps(
+        [input_digest, name, str(version), options or {}],
+        sort_keys=True,
+        default=str
+    ))
+
+
+# Backends
+# =============================================
+
+class MemoryBackend:
+    """An in-process LRU backend.
+
+    Args:
+        max_size (int): The maximum total size in bytes.
+    """
+
+    # Each process has its own entries
+    shared = False
+    host_local = False
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+
+            if data is not None:
+                self.entries.move_to_end(key)
+
+            return data
+
+    def set(self, key, data):
+        evicted = 0
+
+        with self.lock:
+            previous = self.entries.pop(key, None)
+
+            if previous is not None:
+                self.size -= len(previous)
+
+            self.entries[key] = data
+            self.size += len(data)
+
+            while self.size > self.max_size:
+                _, oldest = self.entries.popitem(last=False)
+                self.size -= len(oldest)
+                evicted += 1
+
+        return evicted
+
+
+class CacheBackend:
+    """A backend on the default Django cache (memcached).
+
+    The artefacts are also kept in the local cache of the process. Large
+    artefacts are compressed and split in chunks (see
+    `lti_app.caching.store_values`).
+
+    Args:
+        timeout (int): Seconds before the entries expire, None for never.
+    """
+
+    shared = True
+    host_local = False
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def get(self, key):
+        key = 'artifact_' + key
+        local_cache = get_local_cache()
+        data = local_cache.get_data(key)
+
+        if data is not None:
+            return data
+
+        data = load_values([key], 'artifacts', pickled=True).get(key)
+
+        if data is not None:
+            local_cache.set_data(key, data)
+
+        return data
+
+    def set(self, key, data):
+        key = 'artifact_' + key
+        store_values({key: data}, self.timeout, 'artifacts', pickled=True)
+        get_local_cache().set_data(key, data)
+        return 0
+
+
+class DiskBackend:
+    """A backend on the local disk, evicting the least recently used files.
+
+    Args:
+        directory (str): The directory, created if needed.
+        max_size (int): The maximum total size in bytes.
+    """
+
+    # Shared by the processes of the host only
+    shared = True
+    host_local = True
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.size = None
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key)
+
+    def _scan(self):
+        entries = []
+
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        return entries
+
+    def get(self, key):
+        filename = self._filename(key)
+
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        # The modification time is the last use
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            pass
+
+        return data
+
+    def set(self, key, data):
+        filename = self._filename(key)
+
+        # Unique across the threads and processes writing the same key
+        fd, temporary_filename = tempfile.mkstemp(
+            suffix='.tmp',
+            dir=self.directory
+        )
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+
+            os.replace(temporary_filename, filename)
+        except OSError:
+            try:
+                os.remove(temporary_filename)
+            except FileNotFoundError:
+                pass
+
+            raise
+
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self._scan())
+            else:
+                self.size += len(data)
+
+            if self.size <= self.max_size:
+                return 0
+
+            # Other processes share the directory, so re-scan it
+            entries = sorted(self._scan())
+            self.size = sum(size for _, size, _ in entries)
+            evicted = 0
+
+            for _, size, path in entries:
+                if self.size <= self.max_size:
+                    break
+
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+                self.size -= size
+                evicted += 1
+
+            return evicted
+
+
+# Store
+# =============================================
+
+class ArtifactStore:
+    """Stores pickled artefacts in a backend.
+
+    Args:
+        backend (object): The backend, with `get(key)` and
+            `set(key, data)` methods on bytes, a `shared` attribute
+            (whether other processes read the stored artefacts) and a
+            `host_local` attribute (whether only the processes of the
+            same host read them).
+        max_item_size (int): Artefacts larger than this (in bytes once
+            pickled) are not stored.
+    """
+
+    def __init__(self, backend, max_item_size):
+        self.backend = backend
+        self.max_item_size = max_item_size
+        self.metrics = Metrics()
+
+    def _count(self, name, namespace):
+        self.metrics.increment('artifacts.' + name)
+
+        if namespace is not None:
+            self.metrics.increment('artifacts.{0}.{1}'.format(namespace, name))
+
+    def get(self, key, namespace=None):
+        """Get an artefact.
+
+        Args:
+            key (str): The artefact key (see `artifact_key`).
+            namespace (str, optional): Defaults to None. The name the hit
+                or miss is also counted under (e.g. the node name).
+
+        Returns:
+            any: The artefact or None if it is not stored.
+        """
+
+        artifact = self._load(key)
+        self._count('misses' if artifact is None else 'hits', namespace)
+
+        return artifact
+
+    def _load(self, key):
+        data = self.backend.get(key)
+
+        return None if data is None else pickle.loads(data)
+
+    def get_or_compute(self, key, compute, namespace=None):
+        """Get an artefact, computing it once across the workers if missing.
+
+        See `lti_app.caching.coalesce`. The other workers can only wait for
+        the artefacts of a shared backend, the others are computed in place.
+        The artefacts of a backend local to the host are only coalesced
+        with the workers of the same host.
+
+        Args:
+            key (str): The artefact key (see `artifact_key`).
+            compute (callable): Computes the artefact.
+            namespace (str, optional): Defaults to None. See `get`.
+
+        Returns:
+            any: The artefact.
+        """
+
+        artifact = self.get(key, namespace)
+
+        if artifact is not None:
+            return artifact
+
+        if not self.backend.shared:
+            artifact = compute()
+            self.put(key, artifact)
+            return artifact
+
+        return coalesce(
+            self.coalescing_key(key),
+            lambda: self._load(key),
+            compute,
+            lambda artifact: self.put(key, artifact),
+            namespace
+        )
+
+    def coalescing_key(self, key):
+        """Get the key the workers computing an artefact coalesce on.
+
+        Args:
+            key (str): The artefact key (see `artifact_key`).
+
+        Returns:
+            str: The key, including the host name if the backend is local
+                to the host.
+        """
+
+        if self.backend.host_local:
+            return 'artifact_{0}_{1}'.format(socket.gethostname(), key)
+
+        return 'artifact_' + key
+
+    def put(self, key, artifact):
+        """Store an artefact.
+
+        Args:
+            key (str): The artefact key (see `artifact_key`).
+            artifact (any): The artefact, None is not stored.
+
+        Returns:
+            bool: Whether the artefact was stored.
+        """
+
+        if artifact is None:
+            return False
+
+        data = pickle.dumps(artifact, pickle.HIGHEST_PROTOCOL)
+
+        if len(data) > self.max_item_size:
+            self.metrics.increment('artifacts.too_large')
+            return False
+
+        evicted = self.backend.set(key, data)
+        self.metrics.increment('artifacts.puts')
+
+        if evicted:
+            self.metrics.increment('artifacts.evictions', evicted)
+
+        return True
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    """Get the artefact store of the current process.
+
+    Raises:
+        CachingException: If the configured backend does not exist.
+
+    Returns:
+        ArtifactStore: The store for the configured backend.
+    """
+
+    config = settings.ARTIFACTS
+    store_key = json.dumps(config, sort_keys=True)
+
+    with _stores_lock:
+        store = _stores.get(store_key)
+
+        if store is not None:
+            return store
+
+        name = config['BACKEND']
+
+        if name == 'memory':
+            backend = MemoryBackend(config['MAX_SIZE'])
+        elif name == 'cache':
+            backend = CacheBackend(config['TIMEOUT'])
+        elif name == 'disk':
+            backend = DiskBackend(config['DIRECTORY'], config['MAX_SIZE'])
+        else:
+            raise CachingException.invalid_backend(name)
+
+        store = ArtifactStore(backend, config['MAX_ITEM_SIZE'])
+        _stores[store_key] = store
+
+        return store
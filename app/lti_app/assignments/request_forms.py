@@ -1,3 +1,4 @@
+from lti_app.models import PARSER_PROFILES
 from lti_app.request_forms import BaseRequestForm as BRF
 
 
@@ -24,5 +25,12 @@ class AssignmentRequestForm(BRF):
     academic_style_check = {'type': bool, 'get': BRF.get_boolean_from_checkbox}
     semantics_check = {'type': int}
 
+    # Text processing
+    parser_profile = {
+        'type': str,
+        'default': None,
+        'choices': [name for name, _ in PARSER_PROFILES]
+    }
+
     def __init__(self, form_data):
         BRF.__init__(self, form_data)
@@ -1,17 +1,20 @@
 """Provides service classes for the assignment views."""
 
+import time
 from html import parser
 
 from django.conf import settings
 from lti import tool_provider
 
-from lti_app.core import checkers, interpreters
+from lti_app import metrics
+from lti_app.core import checkers, compiler, interpreters
 from lti_app.assignments import repositories
 
 
 class AssignmentService:
     def __init__(self):
         self.repository = repositories.AssignmentRepository()
+        self.metrics = metrics.Metrics()
 
     def _send_grade(self, outcome_service_url, result_sourcedid, data):
         tp = tool_provider.ToolProvider(
@@ -34,8 +37,59 @@ class AssignmentService:
     def update(self, model_id, fields):
         self.repository.update(model_id, fields)
 
+    def _get_checks(self, assignment):
+        return {
+            'citation': assignment.citation_check,
+            'grammar': assignment.grammar_check,
+            'plagiarism': assignment.plagiarism_check,
+            'academic_style': assignment.academic_style_check,
+            'semantics': assignment.semantics_check
+        }
+
+    def _get_compiler_args(self, assignment):
+        return (
+            assignment.excerpt,
+            assignment.supporting_excerpts,
+            assignment.reference,
+            self._get_checks(assignment),
+            assignment.parser_profile,
+            self.repository.get_generation(assignment.id)
+        )
+
+    def warm(self, model_id):
+        """Warm the current cache generation of an assignment.
+
+        Run in the background when the assignment is saved (or its
+        generation bumped), so that the first submissions do not pay for
+        the queries and the compilation.
+
+        Args:
+            model_id (int): The assignment primary key.
+
+        Returns:
+            str: The fingerprint of the compiled assignment.
+        """
+
+        assignment = self.repository.get_by_id(model_id)
+        self.get_by_course_assignment_tuple(
+            assignment.course_id,
+            assignment.assignment_id
+        )
+
+        return compiler.build(*self._get_compiler_args(assignment))
+
+    def invalidate(self, model_id=None):
+        """Invalidate the cached entries of the assignments.
+
+        Args:
+            model_id (int, optional): Defaults to None. The assignment
+                primary key. If None every assignment is invalidated.
+        """
+
+        self.repository.invalidate(model_id)
+
     def get_by_course_assignment_tuple(self, course_id, assignment_id):
-        return self.repository.get_by({
+        return self.repository.get_first_by({
             'course_id': course_id,
             'assignment_id': assignment_id
         })
@@ -49,34 +103,36 @@ class AssignmentService:
             outcome_service_url,
             result_sourcedid,
             text):
+        counters_before = self.metrics.snapshot()['counters']
+
         # 1. Retrieve the assignment details
-        assignment = self.repository.get_by({
-            'course_id': course_id,
-            'assignment_id': assignment_id
-        }).first()
+        assignment = self.get_by_course_assignment_tuple(
+            course_id,
+            assignment_id
+        )
 
         # 2. Create the interpreter for the raw data
         feedback_interpreter = interpreters.FeedbackInterpreter(assignment.semantics_check)
         grade_interpreter = interpreters.GradeInterpreter(assignment_type, assignment.semantics_check)
 
         # 3. Select the checks to run
-        checks = {
-            'citation': assignment.citation_check,
-            'grammar': assignment.grammar_check,
-            'plagiarism': assignment.plagiarism_check,
-            'academic_style': assignment.academic_style_check,
-            'semantics': assignment.semantics_check
-        }
+        checks = self._get_checks(assignment)
 
-        # 4. Run the analysis
+        # 4. Run the analysis (with the compiled assignment)
+        started_at = time.monotonic()
+        compiled = compiler.load(*self._get_compiler_args(assignment))
         checker = checkers.DefaultChecker(
             text,
             assignment.excerpt,
             assignment.supporting_excerpts,
             assignment.reference,
-            checks
+            checks,
+            parser_profile=assignment.parser_profile,
+            compiled=compiled
         )
         data = checker.run()
+        analysis_latency = time.monotonic() - started_at
+        self.metrics.observe('jobs.analysis_latency', analysis_latency)
         data['assignment'] = assignment
         data['is_last_attempt'] = attempts == assignment.max_attempts - 1
         data['text'] = text
@@ -89,4 +145,26 @@ class AssignmentService:
         # 6. Send the grade
         self._send_grade(outcome_service_url, result_sourcedid, data)
 
+        # 7. Report the job metrics
+        counters = metrics.counters_delta(
+            counters_before,
+            self.metrics.snapshot()['counters']
+        )
+        path, path_duration = checker.text_document.critical_path
+        metrics.report_to_job('metrics', {
+            'counters': counters,
+            'analysis_latency': analysis_latency,
+            'text_processing': {
+                'timings': checker.text_document.timings,
+                'critical_path': path,
+                'critical_path_duration': path_duration,
+                'materialised': {
+                    'text': checker.text_document.materialised,
+                    'excerpt': checker.excerpt_document.materialised
+                }
+            },
+            'sentence_cache_hit_ratio': metrics.hit_ratio(counters, 'parser.sentence_cache')
+        })
+        metrics.publish()
+
         return data
@@ -6,6 +6,7 @@ from django.views.decorators.http import require_http_methods
 from . import request_forms, services
 from .exceptions import AssignmentException
 from lti_app import strings
+from lti_app.models import PARSER_PROFILES
 
 
 @require_http_methods(['GET', 'POST'])
@@ -51,7 +52,7 @@ def show(request):
     assignment = service.get_by_course_assignment_tuple(
         course_id,
         assignment_id
-    ).first()
+    )
 
     context = {'assignment': assignment}
 
@@ -60,6 +61,7 @@ def show(request):
     if is_instructor:
         # Instructor
         template = strings.teacher_index
+        context['parser_profiles'] = PARSER_PROFILES
     else:
         # Student
         if latest_feedback is not None and assignment.assignment_type == 'D':
@@ -128,13 +130,16 @@ def _create_or_update_assignment(request):
     assignment = service.get_by_course_assignment_tuple(
         data['course_id'],
         data['assignment_id']
-    ).first()
+    )
 
     if assignment is None:
-        service.create(data)
+        assignment = service.create(data)
     else:
         service.update(assignment.id, data)
 
+    # Warm the new cache generation in the background
+    django_rq.enqueue(service.warm, assignment.id)
+
     return render(
         request,
         strings.teacher_submission_confirmation
@@ -1,10 +1,19 @@
 import hashlib
+import json
+import pickle
 import re
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
 from functools import wraps
 
+from django.conf import settings
 from django.core.cache import cache
 
 from .exceptions import BaseLtiException
+from .metrics import Metrics
 
 
 def get_hash(text):
@@ -12,14 +21,482 @@ def get_hash(text):
     return hash_object.hexdigest()
 
 
-def from_cache(text):
+class LocalCache:
+    """A per-process LRU cache in front of the shared cache.
+
+    Values are kept pickled, so that callers never share (and mutate) the
+    same object.
+
+    Args:
+        max_size (int): The maximum total size in bytes.
+        ttl (float): Seconds an entry is served before it is read again
+            from the shared cache.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def _pop(self, key):
+        _, data = self.entries.pop(key)
+        self.size -= len(data)
+
+    def get(self, key):
+        data = self.get_data(key)
+
+        return None if data is None else pickle.loads(data)
+
+    def get_data(self, key):
+        """Get the pickled value of a key (see `set_data`)."""
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return None
+
+            expires_at, data = entry
+
+            if expires_at < time.monotonic():
+                self._pop(key)
+                return None
+
+            self.entries.move_to_end(key)
+
+            return data
+
+    def set(self, key, value):
+        self.set_data(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def set_data(self, key, data):
+        """Set the value of a key given already pickled."""
+
+        if len(data) > self.max_size:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+
+            self.entries[key] = (time.monotonic() + self.ttl, data)
+            self.size += len(data)
+
+            while self.size > self.max_size:
+                self._pop(next(iter(self.entries)))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+
+def get_local_cache():
+    """Get the local cache of the current process.
+
+    Returns:
+        LocalCache: The cache for the configured size and TTL.
+    """
+
+    config = settings.LOCAL_CACHE
+    config_key = (config['MAX_SIZE'], config['TTL'])
+
+    with _local_caches_lock:
+        local_cache = _local_caches.get(config_key)
+
+        if local_cache is None:
+            local_cache = LocalCache(config['MAX_SIZE'], config['TTL'])
+            _local_caches[config_key] = local_cache
+
+        return local_cache
+
+
+def _count(namespace, name, value=1):
+    if value > 0:
+        Metrics().increment(
+            'cache.{0}.{1}'.format(namespace or 'default', name),
+            value
+        )
+
+
+# Shared Cache Values
+# =============================================
+
+value_prefix = b'SCV1'
+manifest_prefix = b'SCM1'
+
+# The buckets of the value size histograms (in bytes)
+size_buckets = [1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024]
+
+
+def encode_value(value, pickled=False):
+    """Serialize a value for the shared cache.
+
+    Values are pickled and, above the configured threshold, compressed.
+
+    Args:
+        value (any): The value.
+        pickled (bool, optional): Defaults to False. Whether the value
+            is already pickled (bytes).
+
+    Returns:
+        tuple: The encoded bytes and the size of the pickled value.
+    """
+
+    config = settings.CACHE_VALUES
+    data = value if pickled else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    size = len(data)
+
+    if size >= config['COMPRESS_THRESHOLD']:
+        return value_prefix + b'z' + zlib.compress(data, config['COMPRESS_LEVEL']), size
+
+    return value_prefix + b'p' + data, size
+
+
+def decode_value(data, pickled=False):
+    """Deserialize a value encoded by `encode_value`.
+
+    Args:
+        data (any): The cached data.
+        pickled (bool, optional): Defaults to False. Whether to return
+            the value pickled (bytes).
+
+    Returns:
+        any: The value.
+    """
+
+    # Stored before the values were encoded
+    if type(data) is not bytes or not data.startswith(value_prefix):
+        return pickle.dumps(data, pickle.HIGHEST_PROTOCOL) if pickled else data
+
+    start = len(value_prefix) + 1
+    payload = data[start:]
+
+    if data[start - 1:start] == b'z':
+        payload = zlib.decompress(payload)
+
+    return payload if pickled else pickle.loads(payload)
+
+
+def store_values(mapping, timeout=None, namespace=None, pickled=False):
+    """Save values in the shared cache in a single round trip.
+
+    Values larger than the configured chunk size are split across several
+    keys. The key of the value then holds the list of chunks.
+
+    Args:
+        mapping (dict): Mapping of (hashed) keys to values.
+        timeout (int, optional): Defaults to None (no expiry). Seconds
+            before the values expire.
+        namespace (str, optional): Defaults to None. See `Cache`.
+        pickled (bool, optional): Defaults to False. Whether the values
+            are already pickled (bytes).
+    """
+
+    chunk_size = settings.CACHE_VALUES['CHUNK_SIZE']
+    metrics = Metrics()
+    entries = {}
+
+    for key, value in mapping.items():
+        data, size = encode_value(value, pickled)
+        metrics.histogram(
+            'cache.{}.size'.format(namespace or 'default'),
+            size,
+            size_buckets
+        )
+        metrics.histogram(
+            'cache.{}.stored_size'.format(namespace or 'default'),
+            len(data),
+            size_buckets
+        )
+
+        if len(data) <= chunk_size:
+            entries[key] = data
+            continue
+
+        # The chunks of every write have their own keys, so that
+        # concurrent writes never mix
+        token = uuid.uuid4().hex
+        chunk_keys = []
+
+        for index, start in enumerate(range(0, len(data), chunk_size)):
+            chunk_key = '{0}_{1}_{2}'.format(key, token, index)
+            entries[chunk_key] = data[start:start + chunk_size]
+            chunk_keys.append(chunk_key)
+
+        entries[key] = manifest_prefix + json.dumps(chunk_keys).encode('utf-8')
+        _count(namespace, 'chunked')
+
+    cache.set_many(entries, timeout)
+
+
+def load_values(keys, namespace=None, pickled=False):
+    """Get values from the shared cache.
+
+    Args:
+        keys (list of str): The (hashed) keys.
+        namespace (str, optional): Defaults to None. See `Cache`.
+        pickled (bool, optional): Defaults to False. Whether to return
+            the values pickled (bytes).
+
+    Returns:
+        dict: Mapping of the keys found to their values. Values with a
+            missing chunk are not found.
+    """
+
+    found = cache.get_many(keys) if len(keys) != 0 else {}
+    manifests = {}
+
+    for key, data in found.items():
+        if type(data) is bytes and data.startswith(manifest_prefix):
+            manifests[key] = json.loads(data[len(manifest_prefix):].decode('utf-8'))
+
+    chunk_keys = [
+        chunk_key
+        for chunk_keys in manifests.values()
+        for chunk_key in chunk_keys
+    ]
+    chunks = cache.get_many(chunk_keys) if len(chunk_keys) != 0 else {}
+    values = {}
+
+    for key, data in found.items():
+        if key in manifests:
+            parts = [chunks.get(chunk_key) for chunk_key in manifests[key]]
+
+            if any(part is None for part in parts):
+                _count(namespace, 'missing_chunks')
+                continue
+
+            data = b''.join(parts)
+
+        values[key] = decode_value(data, pickled)
+
+    return values
+
+
+# The lease value of a key whose value was computed but not stored
+_unstored = 'unstored'
+
+
+def coalesce(key, lookup, compute, save, namespace=None):
+    """Compute a missing value once across the workers.
+
+    The first worker missing the value takes a lease on the key (an
+    atomic `add` on the shared cache), computes and saves the value. The
+    others wait for the value instead of computing it too. They compute
+    it themselves if the lease is released without a value or if the
+    value is not there after the configured wait timeout.
+
+    If `save` returns False (the value was not stored, e.g. it is too
+    large), the lease is kept for its timeout as a mark that the value
+    is not worth waiting for: the waiting workers, and the workers missing
+    it later, compute it without waiting.
+
+    Args:
+        key (str): The (hashed) key of the value.
+        lookup (callable): Reads the value (None if missing).
+        compute (callable): Computes the value.
+        save (callable): Saves a computed value, returns False if it was
+            not stored.
+        namespace (str, optional): Defaults to None. See `Cache`.
+
+    Returns:
+        any: The value.
+    """
+
+    config = settings.SINGLE_FLIGHT
+
+    if not config['ENABLED']:
+        result = compute()
+        save(result)
+        return result
+
+    lease_key = 'lease_' + key
+    token = uuid.uuid4().hex
+    acquired = cache.add(lease_key, token, config['LEASE_TIMEOUT'])
+    contended = not acquired
+
+    # Wait for the worker holding the lease (if the shared cache is
+    # unavailable there is no lease to wait for)
+    # ---------------------------------------------
+    if not acquired and cache.get(lease_key) not in (None, _unstored):
+        deadline = time.monotonic() + config['WAIT_TIMEOUT']
+        interval = config['INTERVAL']
+
+        while time.monotonic() < deadline:
+            time.sleep(interval)
+            result = lookup()
+
+            if result is not None:
+                _count(namespace, 'coalesced')
+                return result
+
+            if cache.get(lease_key) == _unstored:
+                break
+
+            # Released without a value (e.g. it failed), take over
+            if cache.get(lease_key) is None:
+                acquired = cache.add(lease_key, token, config['LEASE_TIMEOUT'])
+
+                if acquired or cache.get(lease_key) is None:
+                    break
+
+            interval = min(interval * 2, config['MAX_INTERVAL'])
+        else:
+            _count(namespace, 'lease_timeouts')
+
+    # Compute the value
+    # ---------------------------------------------
+    stored = None
+
+    try:
+        # The holder of the lease may have saved the value and released
+        # the lease since the value was last read
+        if contended:
+            result = lookup()
+
+            if result is not None:
+                _count(namespace, 'coalesced')
+                return result
+
+        result = compute()
+
+        if result is not None:
+            stored = save(result)
+
+        return result
+    finally:
+        if acquired and cache.get(lease_key) == token:
+            if stored is False:
+                cache.set(lease_key, _unstored, config['LEASE_TIMEOUT'])
+            else:
+                cache.delete(lease_key)
+
+
+# Generations
+# =============================================
+
+def _initial_generation():
+    # A generation evicted from the shared cache starts again from the
+    # current time, never from a value already used
+    return int(time.time() * 1e6)
+
+
+# Generations read from the shared cache, by key: (expiry, generation)
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+def _remember_generation(key, generation):
+    ttl = settings.LOCAL_CACHE['GENERATION_TTL']
+
+    with _generations_lock:
+        _generations[key] = (time.monotonic() + ttl, generation)
+
+
+def get_generations(names, fresh=False):
+    """Get the current generations of cache namespaces.
+
+    The keys of a namespace include its generation, so bumping the
+    generation makes all of them unreachable at once. Generations are
+    kept in the process for the configured TTL, so that local cache hits
+    need no round trip; the bumps of the process are seen right away.
+
+    Args:
+        names (list of str): The namespace names.
+        fresh (bool, optional): Defaults to False. Whether to read all the
+            generations from the shared cache.
+
+    Returns:
+        list of int: The generations, in the order of the names.
+    """
+
+    keys = ['generation_' + name for name in names]
+    now = time.monotonic()
+    generations = {}
+
+    with _generations_lock:
+        for key in keys:
+            entry = _generations.get(key)
+
+            if not fresh and entry is not None and entry[0] >= now:
+                generations[key] = entry[1]
+
+    missing = [key for key in keys if key not in generations]
+    found = cache.get_many(missing) if len(missing) != 0 else {}
+
+    for key in missing:
+        generation = found.get(key)
+
+        if generation is None:
+            cache.add(key, _initial_generation(), None)
+
+            # None if the shared cache is unavailable
+            generation = cache.get(key) or 0
+
+        generations[key] = generation
+        _remember_generation(key, generation)
+
+    return [generations[key] for key in keys]
+
+
+def bump_generation(name):
+    """Move a cache namespace to its next generation.
+
+    Args:
+        name (str): The namespace name.
+
+    Returns:
+        int: The new generation.
+    """
+
+    key = 'generation_' + name
+
+    try:
+        generation = cache.incr(key)
+    except ValueError:
+        generation = _initial_generation()
+        cache.set(key, generation, None)
+
+    _remember_generation(key, generation)
+    Metrics().increment('cache.generations.bumps')
+
+    return generation
+
+
+def from_cache(text, namespace=None):
     digest = get_hash(text)
-    return cache.get(digest)
+    local_cache = get_local_cache()
+    result = local_cache.get(digest)
+
+    if result is not None:
+        _count(namespace, 'local_hits')
+        return result
+
+    # The local cache keeps the pickled value as read
+    data = load_values([digest], namespace, pickled=True).get(digest)
+
+    if data is None:
+        _count(namespace, 'misses')
+        return None
 
+    _count(namespace, 'hits')
+    local_cache.set_data(digest, data)
 
-def save_cache(text, data):
+    return pickle.loads(data)
+
+
+def save_cache(text, data, namespace=None):
     digest = get_hash(text)
-    cache.set(digest, data, None)
+    store_values({digest: data}, None, namespace)
+    get_local_cache().set(digest, data)
 
 
 def caching(*name):
@@ -69,45 +546,147 @@ def caching(*name):
             else:
                 ext_key = ext_key[0]
 
-            # Get result from cache (if stored)
-            # ---------------------------------------------
-            key = self.cache.base_key + str(ext_key)
-
-            result = from_cache(key)
-
             fn_cache_enabled = kwargs.get('enable_cache')
             if fn_cache_enabled is None:
                 fn_cache_enabled = True
 
-            if self.cache.enabled and fn_cache_enabled and result is not None:
-                return result
-
-            # Compute result without cache
+            # Compute result without any lookup if disabled
             # ---------------------------------------------
-            result = func(self, *args, **kwargs)
+            if not self.cache.enabled or not fn_cache_enabled:
+                return func(self, *args, **kwargs)
 
-            # Save result in cache if enabled
+            # Get result from cache (if stored)
             # ---------------------------------------------
-            if self.cache.enabled and fn_cache_enabled:
-                save_cache(key, result)
+            key = self.cache.get_key(str(ext_key))
+            namespace = self.cache.namespace
+
+            result = from_cache(key, namespace)
+
+            if result is not None:
+                return result
 
-            return result
+            # Compute and save result (once across the workers)
+            # ---------------------------------------------
+            digest = get_hash(key)
+
+            return coalesce(
+                digest,
+                lambda: load_values([digest], namespace).get(digest),
+                lambda: func(self, *args, **kwargs),
+                lambda result: save_cache(key, result, namespace),
+                namespace
+            )
         return wrapped_f
     return wrap
 
 
 class Cache:
-    def __init__(self, enabled=False, base_key=None):
+    """The cache settings of an object using the `caching` decorator.
+
+    Args:
+        enabled (bool, optional): Defaults to False. Whether to cache.
+        base_key (str, optional): Defaults to None. The prefix of the keys.
+        namespace (str, optional): Defaults to None. The name the hits and
+            misses are counted under (`cache.<namespace>.<counter>`).
+        generations (list of str, optional): Defaults to None. The
+            generations the keys belong to (see `get_generations`).
+    """
+
+    def __init__(
+        self,
+        enabled=False,
+        base_key=None,
+        namespace=None,
+        generations=None
+    ):
         self.enabled = enabled
         self.base_key = base_key
+        self.namespace = namespace
+        self.generations = generations
+
+    def get_key(self, key, generations=None):
+        """Get the full key of an entry, in the current generations.
+
+        Args:
+            key (str): The key.
+            generations (list of int, optional): Defaults to None. The
+                generations (see `get_generations`), read if None.
+
+        Returns:
+            str: The key with the base key and the generations.
+        """
+
+        if not self.generations:
+            return self.base_key + key
+
+        if generations is None:
+            generations = get_generations(self.generations)
+
+        return '{0}g{1}_{2}'.format(
+            self.base_key,
+            '_'.join(str(generation) for generation in generations),
+            key
+        )
 
     def get(self, key):
-        key = self.base_key + key
-        return from_cache(key)
+        return from_cache(self.get_key(key), self.namespace)
 
     def put(self, key, data):
-        key = self.base_key + key
-        save_cache(key, data)
+        save_cache(self.get_key(key), data, self.namespace)
+
+    def get_many(self, keys):
+        """Get several entries in a single cache round trip.
+
+        The entries of the local cache are not requested.
+
+        Args:
+            keys (list of str): The keys.
+
+        Returns:
+            dict: Mapping of the keys found to their values.
+        """
+
+        local_cache = get_local_cache()
+        base_key = self.get_key('')
+        digests = {get_hash(base_key + key): key for key in keys}
+        result = {}
+
+        for digest, key in digests.items():
+            data = local_cache.get(digest)
+
+            if data is not None:
+                result[key] = data
+
+        missing = [digest for digest, key in digests.items() if key not in result]
+        found = load_values(missing, self.namespace, pickled=True)
+
+        for digest, data in found.items():
+            local_cache.set_data(digest, data)
+            result[digests[digest]] = pickle.loads(data)
+
+        _count(self.namespace, 'local_hits', len(result) - len(found))
+        _count(self.namespace, 'hits', len(found))
+        _count(self.namespace, 'misses', len(missing) - len(found))
+
+        return result
+
+    def put_many(self, mapping):
+        """Save several entries in a single cache round trip.
+
+        Args:
+            mapping (dict): Mapping of keys to values.
+        """
+
+        base_key = self.get_key('')
+        digests = {
+            get_hash(base_key + key): data
+            for key, data in mapping.items()
+        }
+        store_values(digests, None, self.namespace)
+        local_cache = get_local_cache()
+
+        for digest, data in digests.items():
+            local_cache.set(digest, data)
 
 
 class CachingException(BaseLtiException):
@@ -134,3 +713,10 @@ class CachingException(BaseLtiException):
             code='CCH_INVALID_KEY',
             description='The key is invalid or it cannot be found.'
         )
+
+    @staticmethod
+    def invalid_backend(name):
+        return CachingException(
+            code='CCH_INVALID_BACKEND',
+            description='Invalid cache backend: {}.'.format(name)
+        )
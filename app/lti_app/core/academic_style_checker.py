@@ -37,7 +37,8 @@ class Checker:
         self.tools = Tools()
         self.cache = Cache(
             enabled=enable_cache,
-            base_key='academic_style_checker'
+            base_key='academic_style_checker',
+            namespace='academic_style_checker'
         )
 
     @caching('informal_phrases')
@@ -6,6 +6,8 @@ import xml.etree.ElementTree as ET
 import requests
 from django.conf import settings
 
+from lti_app.core import transport
+
 
 class CanvasApiClient:
     """The Canvas LMS API client"""
@@ -32,37 +34,126 @@ class CanvasApiClient:
 
 
 class CoreNlpClient:
-    def __init__(self):
-        host = settings.STANFORD_CORENLP['HOST']
-        port = settings.STANFORD_CORENLP['PORT']
-        self.endpoint = 'http://{0}:{1}'.format(host, port)
+    """The Stanford CoreNLP server client.
+
+    Requests are spread over the configured CoreNLP servers
+    (`settings.STANFORD_CORENLP['BACKENDS']`) through the pooled
+    transports of the current process.
+
+    Args:
+        backends (list of str, optional): Defaults to None. The servers
+            as `host:port` strings. If None the configured servers are used.
+    """
+
+    def __init__(self, backends=None):
+        config = settings.STANFORD_CORENLP
 
-    def run(self, text, annotators):
-        params = {
-            'properties': json.dumps({
-                'annotators': ','.join(annotators),
-                'outputFormat': 'json'
-            })
-        }
+        if backends is None:
+            backends = config.get('BACKENDS') or [
+                '{0}:{1}'.format(config['HOST'], config['PORT'])
+            ]
 
-        text = text.encode('utf-8')
+        self.endpoints = [
+            backend if '://' in backend else 'http://' + backend
+            for backend in backends
+        ]
+        self.balancer = transport.LoadBalancer(
+            self.endpoints,
+            **transport.get_options(config)
+        )
 
-        response = requests.post(self.endpoint, data=text, params=params)
+    def _post(self, text, properties):
+        params = {'properties': json.dumps(properties)}
+
+        return self.balancer.post(data=text.encode('utf-8'), params=params)
+
+    def run(self, text, annotators, properties=None):
+        """Annotate a text.
+
+        Args:
+            text (str): The text to annotate.
+            annotators (list of str): The CoreNLP annotators to run.
+            properties (dict, optional): Defaults to None. Additional
+                CoreNLP properties.
+
+        Returns:
+            dict: The annotated document as returned by the JSON outputter.
+        """
+
+        response = self._post(text, {
+            **(properties or {}),
+            'annotators': ','.join(annotators),
+            'outputFormat': 'json'
+        })
 
         return response.json()
 
+    def run_serialized(self, text, annotators, properties=None):
+        """Annotate a text using the protobuf serializer.
+
+        Args:
+            text (str): The text to annotate.
+            annotators (list of str): The CoreNLP annotators to run.
+            properties (dict, optional): Defaults to None. Additional
+                CoreNLP properties.
+
+        Returns:
+            bytes: The length-delimited protobuf `Document`.
+        """
+
+        response = self._post(text, {
+            **(properties or {}),
+            'annotators': ','.join(annotators),
+            'outputFormat': 'serialized',
+            'serializer': 'edu.stanford.nlp.pipeline.ProtobufAnnotationSerializer'
+        })
+
+        return response.content
+
+    def run_async(self, text, annotators, properties=None):
+        """Annotate a text in the background.
+
+        See `run` for the arguments.
+
+        Returns:
+            concurrent.futures.Future: The future annotated document.
+        """
+
+        return transport.submit(self.run, text, annotators, properties)
+
 
 class LanguageToolClient:
+    """The LanguageTool server client.
+
+    Requests go through the pooled transport of the current process.
+    """
+
     def __init__(self):
         host = settings.LANGUAGETOOL['HOST']
         port = settings.LANGUAGETOOL['PORT']
         self.endpoint = 'http://{0}:{1}/v2/check'.format(host, port)
+        self.transport_options = transport.get_options(settings.LANGUAGETOOL)
 
     def check(self, text):
-        response = requests.post(self.endpoint, data={
+        response = transport.get_transport(
+            self.endpoint,
+            **self.transport_options
+        ).post(data={
             'text': text,
             'language': 'en-GB',
             'disabledRules': 'EN_QUOTES',
         })
 
         return response.json().get('matches', [])
+
+    def check_async(self, text):
+        """Check a text in the background.
+
+        Args:
+            text (str): The text to check.
+
+        Returns:
+            concurrent.futures.Future: The future list of matches.
+        """
+
+        return transport.submit(self.check, text)
@@ -1,6 +1,10 @@
 """Provides the paraphrase analyzers."""
 
-import copy
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
 
 from lti_app import strings
 from lti_app.core import (
@@ -10,7 +14,35 @@ from lti_app.core import (
     plagiarism_checker,
     semantics_checker
 )
-from lti_app.core.text_processing import processing_graphs, processors
+from lti_app.core.text_processing import parser, processing_graphs, processors
+from lti_app.helpers import flatten
+
+
+def process_excerpt(excerpt, parser_profile, parse_level, eager_keys):
+    """Process the excerpt of an assignment.
+
+    Args:
+        excerpt (str): The excerpt to paraphrase.
+        parser_profile (str): The CoreNLP parser profile.
+        parse_level (str): The annotation level.
+        eager_keys (iterable of str): The document keys to compute now.
+
+    Returns:
+        Document: The processed excerpt.
+    """
+
+    text_processor = processors.TextProcessor(
+        processing_graphs.default_graph,
+        processing_graphs.text_cleaner
+    )
+
+    return text_processor.run(
+        excerpt,
+        parser_profile=parser_profile,
+        parse_level=parse_level,
+        eager_keys=eager_keys,
+        enable_cache=True
+    )
 
 
 class DefaultChecker:
@@ -26,6 +58,16 @@ class DefaultChecker:
         excerpt (str): The excerpt to paraphrase.
         supporting_excerpts (str): Paraphrase excerpts examples.
         reference (str): The reference to cite in the text.
+        checks (dict, optional): Defaults to None. The checks to run.
+        parser_profile (str, optional): Defaults to None. The CoreNLP
+            parser profile. If None the configured default is used.
+        text_document (Document, optional): Defaults to None. The
+            already processed text.
+        excerpt_document (Document, optional): Defaults to None. The
+            already processed excerpt.
+        compiled (CompiledAssignment, optional): Defaults to None. The
+            compiled assignment (see `lti_app.core.compiler`), providing
+            the processed excerpt and the other shared artefacts.
     """
 
     default_checks = {
@@ -36,11 +78,54 @@ class DefaultChecker:
         'semantics': 1
     }
 
-    def __init__(self, text, excerpt, supporting_excerpts, reference, checks=None):
+    # The parse data read by each check
+    required_parse_data = {
+        'citation': [],
+        'grammar': [strings.tagged_tokens, strings.constituencies],
+        'plagiarism': [strings.tokens],
+        'academic_style': [strings.tagged_tokens, strings.dependencies],
+        'semantics': [strings.tagged_tokens, strings.constituencies]
+    }
+
+    # The document keys read by each check, the other keys are only
+    # computed if requested
+    required_keys = {
+        'citation': [],
+        'grammar': [
+            strings.cleaned_text,
+            strings.languagetool_matches,
+            strings.parse_data
+        ],
+        'plagiarism': [strings.stems],
+        'academic_style': [
+            strings.cleaned_text,
+            strings.parse_data,
+            strings.stems
+        ],
+        'semantics': [strings.parse_data, strings.predicate_patterns]
+    }
+
+    def __init__(
+        self,
+        text,
+        excerpt,
+        supporting_excerpts,
+        reference,
+        checks=None,
+        parser_profile=None,
+        text_document=None,
+        excerpt_document=None,
+        compiled=None
+    ):
         self.text = text
         self.excerpt = excerpt
         self.supporting_excerpts = supporting_excerpts
         self.reference = reference
+        self.compiled = compiled
+        self.parser_profile = (
+            parser_profile
+            or settings.STANFORD_CORENLP.get('PARSER_PROFILE')
+        )
         self.data = {}
 
         # Setup the checks to run
@@ -50,6 +135,9 @@ class DefaultChecker:
         else:
             self.checks = checks.copy()
 
+        # Only request the annotators needed by the enabled checks
+        self.parse_level, self.eager_keys = self.plan_checks(self.checks)
+
         # Run text processor
         # ---------------------------------------------
 
@@ -57,17 +145,14 @@ class DefaultChecker:
         # clean the text from citations
         self.citation_checker = citation_checker.Checker(
             self.text,
-            self.reference
+            self.reference,
+            None if compiled is None else compiled.parsed_reference
         )
 
-        processing_graph = copy.deepcopy(processing_graphs.default_graph)
+        processing_graph = processing_graphs.default_graph
 
         # If the citation check is enabled...
-        if (
-            self.checks.get('citation')
-            and self.reference is not None
-            and self.reference != ''
-        ):
+        if self.removes_citations(self.checks, self.reference):
             # ... use the citation remover as the root
             self.data[strings.citation_check] = self.citation_checker.run()
             root = processing_graphs.citation_remover
@@ -81,19 +166,35 @@ class DefaultChecker:
             root
         )
 
-        # Submitted text processing
-        self.text_document = self.text_processor.run(
-            self.text,
-            citation_check=self.data.get(strings.citation_check),
-            enable_cache=False
-        )
+        # Submitted text processing (the LanguageTool request overlaps
+        # with the parsing when the grammar check is enabled)
+        if text_document is None:
+            text_document = self.text_processor.run(
+                self.text,
+                citation_check=self.data.get(strings.citation_check),
+                parser_profile=self.parser_profile,
+                parse_level=self.parse_level,
+                eager_keys=self.eager_keys,
+                languagetool=self.requests_languagetool(self.checks),
+                enable_cache=False
+            )
+
+        self.text_document = text_document
 
         # Excerpt text processing
-        self.text_processor.graph_root = processing_graphs.text_cleaner
-        self.excerpt_document = self.text_processor.run(
-            self.excerpt,
-            enable_cache=True
-        )
+        if excerpt_document is None and compiled is not None:
+            excerpt_document = compiled.excerpt_document
+            self.supporting_excerpts = compiled.supporting_excerpts
+
+        if excerpt_document is None:
+            excerpt_document = process_excerpt(
+                self.excerpt,
+                self.parser_profile,
+                self.parse_level,
+                self.eager_keys
+            )
+
+        self.excerpt_document = excerpt_document
 
         # Initialize checkers
         # -------------------
@@ -105,7 +206,11 @@ class DefaultChecker:
             self.text_document,
             self.excerpt_document,
             self.supporting_excerpts,
-            enable_cache=True
+            enable_cache=True,
+            vectors=None if compiled is None else compiled.vectors,
+            matrix_similarity=(
+                None if compiled is None else compiled.matrix_similarity
+            )
         )
         self.grammar_checker = grammar_checker.Checker(
             self.text_document
@@ -115,6 +220,50 @@ class DefaultChecker:
             self.excerpt_document
         )
 
+    @classmethod
+    def plan_checks(cls, checks):
+        """Get what the processing of a text needs for some checks.
+
+        Args:
+            checks (dict): The checks to run.
+
+        Returns:
+            tuple: The parse level and the set of document keys to
+                compute eagerly.
+        """
+
+        parse_level = parser.plan_level(flatten([
+            required
+            for check, required in cls.required_parse_data.items()
+            if checks.get(check)
+        ]))
+        eager_keys = set(flatten([
+            required
+            for check, required in cls.required_keys.items()
+            if checks.get(check)
+        ]))
+
+        return parse_level, eager_keys
+
+    @staticmethod
+    def removes_citations(checks, reference):
+        """Whether the citations are removed before processing a text."""
+
+        return bool(
+            checks.get('citation')
+            and reference is not None
+            and reference != ''
+        )
+
+    @staticmethod
+    def requests_languagetool(checks):
+        """Whether the LanguageTool request is sent during processing."""
+
+        return (
+            bool(checks.get('grammar'))
+            and settings.LANGUAGETOOL.get('CONCURRENT', True)
+        )
+
     def run(self):
         """Run the checker
 
@@ -139,3 +288,225 @@ class DefaultChecker:
             self.data[strings.grammar_check] = self.grammar_checker.run()
 
         return self.data
+
+
+# The arguments shared by the checks of each running batch checker. The
+# pool processes are forked after the arguments of their batch checker are
+# registered, so the arguments are not sent with every submission (there
+# is no pool initializer before Python 3.7).
+_shared_kwargs = {}
+
+
+def _run_checker(key, kwargs):
+    # Runs in the process pool of the batch checker
+    return DefaultChecker(**_shared_kwargs[key], **kwargs).run()
+
+
+class BatchChecker:
+    """Runs the default checker on many paraphrases of the same excerpt.
+
+    The excerpt is compiled once (see `compiler.compile_assignment`) and
+    the compiled assignment is shared by the checks of every submission,
+    the pool processes receive it once. The submissions are processed in
+    batches: the sentences of a batch are parsed in batched CoreNLP
+    requests (through the sentence cache, whatever its setting) and its
+    LanguageTool requests are in flight together. The checks of a batch
+    then run in a pool of processes while the next batch is processed, so
+    at most two batches are held in memory.
+
+    Args:
+        excerpt (str): The excerpt to paraphrase.
+        supporting_excerpts (str): Paraphrase excerpts examples.
+        reference (str): The reference to cite in the texts.
+        checks (dict, optional): Defaults to None. The checks to run.
+        parser_profile (str, optional): Defaults to None. The CoreNLP
+            parser profile. If None the configured default is used.
+        batch_size (int, optional): Defaults to None. The number of
+            submissions processed at once. If None the configured size
+            is used.
+        processes (int, optional): Defaults to None. The number of
+            processes running the checks, 0 runs them in the calling
+            process. If None the configured number is used.
+    """
+
+    def __init__(
+        self,
+        excerpt,
+        supporting_excerpts,
+        reference,
+        checks=None,
+        parser_profile=None,
+        batch_size=None,
+        processes=None
+    ):
+        config = settings.TEXT_PROCESSING
+
+        self.excerpt = excerpt
+        self.supporting_excerpts = supporting_excerpts
+        self.reference = reference
+        self.parser_profile = (
+            parser_profile
+            or settings.STANFORD_CORENLP.get('PARSER_PROFILE')
+        )
+        self.batch_size = max(
+            1,
+            config['BATCH_SIZE'] if batch_size is None else batch_size
+        )
+        self.processes = (
+            config['BATCH_PROCESSES'] if processes is None else processes
+        )
+
+        if checks is None:
+            self.checks = DefaultChecker.default_checks.copy()
+        else:
+            self.checks = checks.copy()
+
+        self.parse_level, self.eager_keys = DefaultChecker.plan_checks(
+            self.checks
+        )
+
+        if DefaultChecker.removes_citations(self.checks, self.reference):
+            root = processing_graphs.citation_remover
+        else:
+            root = processing_graphs.text_cleaner
+
+        self.text_processor = processors.TextProcessor(
+            processing_graphs.default_graph,
+            root
+        )
+
+        # The compiler imports this module
+        from lti_app.core import compiler
+
+        self.compiled = compiler.compile_assignment(
+            self.excerpt,
+            self.supporting_excerpts,
+            self.reference,
+            self.checks,
+            self.parser_profile
+        )
+
+    def process_batch(self, texts):
+        """Process a batch of submitted texts.
+
+        Args:
+            texts (list of str): The texts.
+
+        Returns:
+            list of Document: The processed texts.
+        """
+
+        if self.text_processor.graph_root == processing_graphs.citation_remover:
+            text_kwargs = [
+                {
+                    strings.citation_check: citation_checker.Checker(
+                        text,
+                        self.reference,
+                        self.compiled.parsed_reference
+                    ).run()
+                }
+                for text in texts
+            ]
+        else:
+            text_kwargs = None
+
+        # LanguageTool checks one text per request, the requests of the
+        # batch are sent together
+        return self.text_processor.run_many(
+            texts,
+            eager_keys=self.eager_keys,
+            text_kwargs=text_kwargs,
+            parser_profile=self.parser_profile,
+            parse_level=self.parse_level,
+            sentence_cache=True,
+            languagetool=bool(self.checks.get('grammar')),
+            enable_cache=False
+        )
+
+    def _get_shared_kwargs(self):
+        return {
+            'excerpt': self.excerpt,
+            'supporting_excerpts': self.supporting_excerpts,
+            'reference': self.reference,
+            'checks': self.checks,
+            'parser_profile': self.parser_profile,
+            'compiled': self.compiled
+        }
+
+    def _get_checker_kwargs(self, text, text_document):
+        # Futures cannot be sent to another process (the matches are only
+        # computed when the grammar check needs them)
+        matches = text_document.data.get(strings.languagetool_matches)
+
+        if isinstance(matches, Future):
+            text_document.data[strings.languagetool_matches] = matches.result()
+
+        return {'text': text, 'text_document': text_document}
+
+    def run(self, texts):
+        """Check the submitted texts.
+
+        Args:
+            texts (iterable of str): The texts, read one batch at a time.
+
+        Yields:
+            dict: The data of each text (see `DefaultChecker.run`), in
+                the order of the texts.
+        """
+
+        texts = iter(texts)
+        key = uuid.uuid4().hex
+        pool = None
+        pending = []
+
+        _shared_kwargs[key] = self._get_shared_kwargs()
+
+        if self.processes > 0:
+            pool = ProcessPoolExecutor(max_workers=self.processes)
+
+        try:
+            while True:
+                batch = list(islice(texts, self.batch_size))
+
+                if len(batch) == 0:
+                    break
+
+                documents = self.process_batch(batch)
+
+                if pool is None:
+                    for text, document in zip(batch, documents):
+                        yield _run_checker(
+                            key,
+                            self._get_checker_kwargs(text, document)
+                        )
+                    continue
+
+                for document in documents:
+                    document.drop_lazy()
+
+                submitted = [
+                    pool.submit(
+                        _run_checker,
+                        key,
+                        self._get_checker_kwargs(text, document)
+                    )
+                    for text, document in zip(batch, documents)
+                ]
+                del documents
+
+                # The previous batch was checked while this one was processed
+                for future in pending:
+                    yield future.result()
+
+                pending = submitted
+
+            for future in pending:
+                yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+            if pool is not None:
+                pool.shutdown()
+
+            _shared_kwargs.pop(key, None)
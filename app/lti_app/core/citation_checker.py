@@ -11,11 +11,14 @@ class Checker:
     Args:
         text (string): The text submitted by the student.
         reference (string): The reference to cite in the text.
+        parsed_reference (dict, optional): Defaults to None. The reference
+            parsed in advance (see `parse_reference`).
     """
 
-    def __init__(self, text, reference):
+    def __init__(self, text, reference, parsed_reference=None):
         self.text = text
         self.reference = reference
+        self.parsed_reference = parsed_reference
 
     def _get_citation_regexps(self, authors, year):
         authors_regex = r'(?:' + re.escape(authors)
@@ -57,12 +60,12 @@ class Checker:
             '(' + authors + ' ' + year + ')'
         ]
 
-    def run(self):
-        """Run the checker.
+    def parse_reference(self):
+        """Parse the reference.
 
         Returns:
-            dict: A dictionary containing the result, correct citations,
-            and the extracted authors
+            dict: The authors, the year, the last names as cited and the
+                citation regular expressions.
         """
 
         # Extract reference components
@@ -102,13 +105,31 @@ class Checker:
                 elif index != len(authors) - 1:
                     lastnames_citation += ', '
 
-        # Get citation regular expressions and
-        # match them against the text
+        return {
+            'authors': authors,
+            'year': year,
+            'lastnames_citation': lastnames_citation,
+            'regexps': self._get_citation_regexps(lastnames_citation, year)
+        }
+
+    def run(self):
+        """Run the checker.
+
+        Returns:
+            dict: A dictionary containing the result, correct citations,
+            and the extracted authors
+        """
+
+        # Get the reference components and citation
+        # regular expressions (parsed in advance if given)
         # ---------------------------------------------
-        regexps = self._get_citation_regexps(
-            lastnames_citation,
-            year
-        )
+        if self.parsed_reference is None:
+            self.parsed_reference = self.parse_reference()
+
+        authors = self.parsed_reference['authors']
+        year = self.parsed_reference['year']
+        lastnames_citation = self.parsed_reference['lastnames_citation']
+        regexps = self.parsed_reference['regexps']
 
         # Match in text and parenthetical patterns
         in_text_regex = regexps.get('in_text')
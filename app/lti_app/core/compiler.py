@@ -0,0 +1,272 @@
+"""Provides the compiled assignments.
+
+A compiled assignment holds what every submission of an assignment shares:
+the processed excerpt, the split supporting excerpts, the parsed reference
+and the TF-IDF index of the excerpts. It is built by a background job when
+the assignment is saved and loaded by the analysis jobs in one fetch.
+
+Compiled assignments are keyed by a fingerprint of the fields they are
+built from (and of `version`), so editing the excerpt, the reference or
+the supporting excerpts makes the jobs use a new one. They can also be
+keyed by a cache generation of the assignment, so that bumping it drops
+them at once.
+"""
+
+import json
+
+from django.conf import settings
+
+from lti_app.caching import coalesce, get_hash, load_values, store_values
+from lti_app.core import citation_checker, semantics_checker
+from lti_app.core.checkers import DefaultChecker, process_excerpt
+from lti_app.core.exceptions import CitationException
+from lti_app.core.text_processing.tools import Tools
+from lti_app.metrics import Metrics
+
+
+# Bump when the compiled assignments change
+version = 1
+namespace = 'compiled_assignment'
+
+
+class CompiledAssignment:
+    """The artefacts shared by the submissions of an assignment.
+
+    Args:
+        fingerprint (str): The fingerprint of the assignment fields.
+        excerpt_document (Document): The processed excerpt.
+        supporting_excerpts (list of str): The supporting excerpts.
+        parsed_reference (dict): The parsed reference or None if it is
+            missing or malformed.
+        vectors (tuple): The dictionary and vectors of the excerpts.
+        matrix_similarity (tuple): The TF-IDF model and index of the
+            excerpts.
+    """
+
+    def __init__(
+        self,
+        fingerprint,
+        excerpt_document,
+        supporting_excerpts,
+        parsed_reference,
+        vectors,
+        matrix_similarity
+    ):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.excerpt_document = excerpt_document
+        self.supporting_excerpts = supporting_excerpts
+        self.parsed_reference = parsed_reference
+        self.vectors = vectors
+        self.matrix_similarity = matrix_similarity
+
+
+def _get_options(checks, parser_profile):
+    if checks is None:
+        checks = DefaultChecker.default_checks
+
+    parser_profile = (
+        parser_profile
+        or settings.STANFORD_CORENLP.get('PARSER_PROFILE')
+    )
+    parse_level, _ = DefaultChecker.plan_checks(checks)
+
+    return parser_profile, parse_level
+
+
+def get_fingerprint(
+    excerpt,
+    supporting_excerpts,
+    reference,
+    checks=None,
+    parser_profile=None
+):
+    """Get the fingerprint of a compiled assignment.
+
+    The checks only matter through the annotation level they need. The
+    resolved parser configuration is included, so that editing a parser
+    profile in the settings compiles the assignments again.
+
+    See `compile_assignment` for the arguments.
+
+    Returns:
+        str: The fingerprint.
+    """
+
+    parser_profile, parse_level = _get_options(checks, parser_profile)
+    parser = Tools().parser
+    annotators, properties = parser.get_annotators(parser_profile, parse_level)
+
+    return get_hash(json.dumps([
+        version,
+        excerpt,
+        supporting_excerpts,
+        reference,
+        parser_profile,
+        parse_level,
+        annotators,
+        properties,
+        parser.output_format
+    ], sort_keys=True))
+
+
+def compile_assignment(
+    excerpt,
+    supporting_excerpts,
+    reference,
+    checks=None,
+    parser_profile=None
+):
+    """Compile an assignment.
+
+    Args:
+        excerpt (str): The excerpt to paraphrase.
+        supporting_excerpts (str): Paraphrase excerpts examples.
+        reference (str): The reference to cite.
+        checks (dict, optional): Defaults to None. The checks to run.
+        parser_profile (str, optional): Defaults to None. The CoreNLP
+            parser profile. If None the configured default is used.
+
+    Returns:
+        CompiledAssignment: The compiled assignment.
+    """
+
+    fingerprint = get_fingerprint(
+        excerpt,
+        supporting_excerpts,
+        reference,
+        checks,
+        parser_profile
+    )
+    parser_profile, parse_level = _get_options(checks, parser_profile)
+
+    # Every entity is computed, lazy ones would not be stored
+    excerpt_document = process_excerpt(
+        excerpt,
+        parser_profile,
+        parse_level,
+        None
+    )
+
+    parsed_reference = None
+
+    if reference:
+        try:
+            parsed_reference = citation_checker.Checker(
+                '',
+                reference
+            ).parse_reference()
+        except CitationException:
+            pass
+
+    semantics = semantics_checker.Checker(
+        None,
+        excerpt_document,
+        supporting_excerpts
+    )
+
+    return CompiledAssignment(
+        fingerprint,
+        excerpt_document,
+        semantics.supporting_excerpts,
+        parsed_reference,
+        (semantics.dictionary, semantics.vectors_corpus),
+        semantics.get_matrix_similarity()
+    )
+
+
+def _get_key(fingerprint, generation):
+    if generation is None:
+        return 'compiled_assignment_' + fingerprint
+
+    return 'compiled_assignment_{0}_{1}'.format(generation, fingerprint)
+
+
+def build(
+    excerpt,
+    supporting_excerpts,
+    reference,
+    checks=None,
+    parser_profile=None,
+    generation=None
+):
+    """Compile an assignment and store it.
+
+    See `compile_assignment` for the other arguments.
+
+    Args:
+        generation (str, optional): Defaults to None. The cache generation
+            of the assignment.
+
+    Returns:
+        str: The fingerprint of the compiled assignment.
+    """
+
+    compiled = compile_assignment(
+        excerpt,
+        supporting_excerpts,
+        reference,
+        checks,
+        parser_profile
+    )
+    store_values(
+        {_get_key(compiled.fingerprint, generation): compiled},
+        None,
+        namespace
+    )
+    Metrics().increment('compiled_assignments.builds')
+
+    return compiled.fingerprint
+
+
+def load(
+    excerpt,
+    supporting_excerpts,
+    reference,
+    checks=None,
+    parser_profile=None,
+    generation=None
+):
+    """Load a compiled assignment.
+
+    If it was not built yet (or was evicted) it is compiled, once across
+    the workers, and stored.
+
+    See `compile_assignment` for the other arguments.
+
+    Args:
+        generation (str, optional): Defaults to None. The cache generation
+            of the assignment.
+
+    Returns:
+        CompiledAssignment: The compiled assignment.
+    """
+
+    key = _get_key(get_fingerprint(
+        excerpt,
+        supporting_excerpts,
+        reference,
+        checks,
+        parser_profile
+    ), generation)
+    compiled = load_values([key], namespace).get(key)
+
+    if compiled is not None:
+        Metrics().increment('compiled_assignments.hits')
+        return compiled
+
+    Metrics().increment('compiled_assignments.misses')
+
+    return coalesce(
+        key,
+        lambda: load_values([key], namespace).get(key),
+        lambda: compile_assignment(
+            excerpt,
+            supporting_excerpts,
+            reference,
+            checks,
+            parser_profile
+        ),
+        lambda compiled: store_values({key: compiled}, None, namespace),
+        namespace
+    )
@@ -38,6 +38,22 @@ class TextProcessingException(BaseLtiException):
             description='The document is missing the key: {}'.format(key)
         )
 
+    @staticmethod
+    def lazy_keys(keys):
+        return TextProcessingException(
+            code='TXT_LAZY_KEYS',
+            description='The document has lazy keys, it cannot be serialized: {}'.format(
+                ', '.join(sorted(keys))
+            )
+        )
+
+    @staticmethod
+    def dropped_key(key):
+        return TextProcessingException(
+            code='TXT_DROPPED_KEY',
+            description='The lazy key was dropped from the document: {}'.format(key)
+        )
+
     @staticmethod
     def invalid_processor_type(accepted_type):
         return TextProcessingException(
@@ -45,9 +61,77 @@ class TextProcessingException(BaseLtiException):
             description='The supplied processor is not of type {}'.format(accepted_type.__name__)
         )
 
+    @staticmethod
+    def invalid_parser_profile(name):
+        return TextProcessingException(
+            code='TXT_INVALID_PARSER_PROFILE',
+            description='The parser profile does not exist: {}'.format(name)
+        )
+
+    @staticmethod
+    def invalid_annotation_level(level):
+        return TextProcessingException(
+            code='TXT_INVALID_ANNOTATION_LEVEL',
+            description='The annotation level does not exist: {}'.format(level)
+        )
+
+    @staticmethod
+    def invalid_matching_strategy(name):
+        return TextProcessingException(
+            code='TXT_INVALID_MATCHING_STRATEGY',
+            description='Invalid predicate matching strategy: {}.'.format(name)
+        )
+
     @staticmethod
     def invalid_graph():
         return TextProcessingException(
             code='TXT_INVALID_GRAPH',
             description='The processing graph is invalid.'
         )
+
+
+class ApiException(BaseLtiException):
+    code = 'API_GENERIC'
+    description = 'Generic API error.'
+
+    def __init__(self, code=None, description=None):
+        BaseLtiException.__init__(self, code, description)
+
+    @staticmethod
+    def generic():
+        return ApiException()
+
+    @staticmethod
+    def service_unavailable(endpoint):
+        return ApiException(
+            code='API_SERVICE_UNAVAILABLE',
+            description='The service at {} is unavailable.'.format(endpoint)
+        )
+
+    @staticmethod
+    def connection_failed(endpoint):
+        return ApiException(
+            code='API_CONNECTION_FAILED',
+            description='Could not connect to the service at {}.'.format(endpoint)
+        )
+
+    @staticmethod
+    def no_endpoint_available(endpoints):
+        return ApiException(
+            code='API_NO_ENDPOINT_AVAILABLE',
+            description='None of the endpoints is available: {}'.format(', '.join(endpoints))
+        )
+
+    @staticmethod
+    def circuit_open(endpoint):
+        return ApiException(
+            code='API_CIRCUIT_OPEN',
+            description='The service at {} is failing, requests are suspended.'.format(endpoint)
+        )
+
+    @staticmethod
+    def not_ready(probes):
+        return ApiException(
+            code='API_NOT_READY',
+            description='The services did not warm up in time: {}'.format(', '.join(probes))
+        )
@@ -2,6 +2,7 @@
 
 import re
 import string
+from concurrent.futures import Future
 
 from nltk import WhitespaceTokenizer
 from nltk.tree import ParentedTree
@@ -469,8 +470,14 @@ class Checker:
         """
 
         cleaned_text = self.text_document.get(strings.cleaned_text)
+        lt_check = self.text_document.get(strings.languagetool_matches)
+
+        # Wait for the request sent during text processing, if any
+        if isinstance(lt_check, Future):
+            lt_check = lt_check.result()
+        elif lt_check is None:
+            lt_check = self.tools.languagetool.check(cleaned_text)
 
-        lt_check = self.tools.languagetool.check(cleaned_text)
         lt_check = self.languagetool_check_post_process(lt_check)
         auxiliary_do_negated_mistakes = self.get_auxiliary_do_negated_mistakes()
 
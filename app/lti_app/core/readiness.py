@@ -0,0 +1,163 @@
+"""Provides the warm-up and readiness checks of the NLP services.
+
+A freshly started CoreNLP server loads its models on the first request
+using them, which can take many seconds. Workers therefore warm up every
+CoreNLP server (once per parser profile and annotation level) and
+LanguageTool before taking jobs, and only start once each warm-up request
+is answered within budget.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from lti_app.core.api import CoreNlpClient, LanguageToolClient
+from lti_app.core.exceptions import ApiException
+from lti_app.core.text_processing import parser
+from lti_app.metrics import Metrics, publish
+
+
+warm_up_text = 'The students paraphrase the excerpt. They do not copy it.'
+report_key = 'readiness_report'
+
+
+def _probe(func, *args):
+    started_at = time.monotonic()
+
+    try:
+        func(*args)
+    except ApiException as e:
+        return {'ok': False, 'duration': time.monotonic() - started_at, 'error': e.code}
+
+    return {'ok': True, 'duration': time.monotonic() - started_at}
+
+
+def get_probes():
+    """Get the warm-up probes of the configured services.
+
+    Returns:
+        dict: Mapping of probe name to a function running the probe.
+    """
+
+    probes = {}
+    profiles = settings.STANFORD_CORENLP.get('PARSER_PROFILES', {})
+    pipelines = [
+        (name, profile.get('annotators'), profile.get('properties'))
+        for name, profile in sorted(profiles.items())
+    ] + [
+        (level, annotators, {})
+        for level, annotators in parser.annotation_levels
+        if annotators is not None
+    ]
+
+    for endpoint in CoreNlpClient().endpoints:
+        client = CoreNlpClient(backends=[endpoint])
+
+        for name, annotators, properties in pipelines:
+            probes['corenlp {0} {1}'.format(endpoint, name)] = (
+                lambda client=client, annotators=annotators, properties=properties: _probe(
+                    client.run,
+                    warm_up_text,
+                    annotators,
+                    properties
+                )
+            )
+
+    languagetool_client = LanguageToolClient()
+    probes['languagetool ' + languagetool_client.endpoint] = (
+        lambda: _probe(languagetool_client.check, warm_up_text)
+    )
+
+    return probes
+
+
+def warm_up(budget=None):
+    """Run every warm-up probe once.
+
+    The durations are reported as `readiness.<probe>` gauges and the
+    report and the metrics are stored in the cache for the monitoring
+    endpoints.
+
+    Args:
+        budget (float, optional): Defaults to None. The maximum duration
+            of a probe in seconds. If None the configured budget is used.
+
+    Returns:
+        dict: The report, with `ready` set if all the probes succeeded
+            within budget.
+    """
+
+    if budget is None:
+        budget = settings.READINESS['BUDGET']
+
+    metrics = Metrics()
+    probes = {}
+
+    for name, probe in get_probes().items():
+        result = probe()
+        result['ok'] = result['ok'] and result['duration'] <= budget
+        probes[name] = result
+        metrics.gauge('readiness.' + name, result['duration'])
+
+    report = {
+        'ready': all(result['ok'] for result in probes.values()),
+        'probes': probes,
+        'checked_at': time.time()
+    }
+    cache.set(report_key, report, None)
+    publish()
+
+    return report
+
+
+def wait_until_ready(budget=None, timeout=None, interval=None):
+    """Warm up the services until they are ready.
+
+    Args:
+        budget (float, optional): Defaults to None. See `warm_up`.
+        timeout (float, optional): Defaults to None. Seconds to wait in
+            total. If None the configured timeout is used.
+        interval (float, optional): Defaults to None. Seconds between
+            attempts. If None the configured interval is used.
+
+    Raises:
+        ApiException: If the services are not ready in time.
+
+    Returns:
+        dict: The last report.
+    """
+
+    config = settings.READINESS
+    timeout = config['TIMEOUT'] if timeout is None else timeout
+    interval = config['INTERVAL'] if interval is None else interval
+    started_at = time.monotonic()
+
+    while True:
+        report = warm_up(budget)
+        Metrics().increment('readiness.attempts')
+
+        if report['ready']:
+            report['waited'] = time.monotonic() - started_at
+            Metrics().gauge('readiness.waited', report['waited'])
+            cache.set(report_key, report, None)
+            return report
+
+        if time.monotonic() - started_at + interval > timeout:
+            raise ApiException.not_ready([
+                name
+                for name, result in report['probes'].items()
+                if not result['ok']
+            ])
+
+        time.sleep(interval)
+
+
+def get_report():
+    """Get the latest readiness report.
+
+    Returns:
+        dict: The report or None if the services were never warmed up.
+    """
+
+    return cache.get(report_key)
@@ -16,17 +16,248 @@ import itertools
 import re
 from functools import wraps
 
+import numpy as np
+from django.conf import settings
 from gensim import corpora, models, similarities
 from nltk import word_tokenize
 from predpatt import PredPatt
+from scipy.optimize import linear_sum_assignment
 
 from lti_app import strings
 from lti_app.caching import Cache, caching
+from lti_app.core import synonyms
+from lti_app.core.exceptions import TextProcessingException
 from lti_app.core.text_helpers import are_synonyms, clean_text, is_punctuation
 from lti_app.core.text_processing.tools import Tools
 from lti_app.helpers import flatten
 
 
+def split_supporting_excerpts(supporting_excerpts):
+    """Split the supporting excerpts (one per line).
+
+    Args:
+        supporting_excerpts (str or list): The supporting excerpts.
+
+    Returns:
+        list of str: The excerpts.
+    """
+
+    if supporting_excerpts is None:
+        return []
+
+    if type(supporting_excerpts) is list:
+        return supporting_excerpts
+
+    return [
+        line.strip()
+        for line in clean_text(supporting_excerpts).splitlines()
+        if line.strip() != ''
+    ]
+
+
+# The weights of the predicate similarity
+similarity_weights = {
+    'target_same_rel': 1.2,
+    'target_diff_rel': 1.05,
+    'argument': 1
+}
+
+
+def is_target_negated(target):
+    tokens = [token.text for token in target.tokens]
+    return 'not' in tokens or "n't" in tokens
+
+
+class PredicateFeatures:
+    """The integer-encoded features of predicate patterns.
+
+    Words are encoded by the ids of their stems (see
+    `lti_app.core.synonyms.get_id`) and of their synonym groups. The
+    arguments of all the predicates are flattened, `arg_owners` giving the
+    predicate of each argument.
+
+    Args:
+        pred_args (list of dict): The predicate patterns.
+        stemmer (object): The stemmer.
+    """
+
+    def __init__(self, pred_args, stemmer):
+        stems = {}
+
+        def stem(word):
+            if word not in stems:
+                stems[word] = stemmer.stem(word)
+
+            return stems[word]
+
+        targets = [d['target'] for d in pred_args]
+        args = [
+            (owner, stem(arg.root.text))
+            for owner, d in enumerate(pred_args)
+            for arg in d['args']
+        ]
+
+        self.size = len(pred_args)
+        self.target_stems = self._encode([stem(t.root.text) for t in targets])
+        self.target_groups = [synonyms.get_groups(t.root.text) for t in targets]
+        self.negated = np.array(
+            [is_target_negated(target) for target in targets],
+            dtype=bool
+        )
+        self.gov_rels = self._encode([str(t.root.gov_rel) for t in targets])
+        self.arg_stems = self._encode([arg for _, arg in args])
+        self.arg_groups = [synonyms.get_groups(arg) for _, arg in args]
+        self.arg_owners = np.array([owner for owner, _ in args], dtype=np.int64)
+        self.num_args = np.bincount(self.arg_owners, minlength=self.size)
+
+    @staticmethod
+    def _encode(words):
+        return np.array(
+            [synonyms.get_id(word) for word in words],
+            dtype=np.uint64
+        ).reshape(len(words))
+
+    def owners_matrix(self):
+        """Get the (predicate × argument) ownership matrix."""
+
+        matrix = np.zeros((self.size, len(self.arg_owners)))
+        matrix[self.arg_owners, np.arange(len(self.arg_owners))] = 1
+
+        return matrix
+
+
+def _share_group_matrix(groups1, groups2):
+    # (i, j) is whether groups1[i] and groups2[j] intersect
+    columns = {}
+
+    for groups in itertools.chain(groups1, groups2):
+        for group in groups.tolist():
+            columns.setdefault(group, len(columns))
+
+    def incidence(groups_list):
+        matrix = np.zeros((len(groups_list), len(columns)), dtype=np.float32)
+
+        for row, groups in enumerate(groups_list):
+            matrix[row, [columns[group] for group in groups.tolist()]] = 1
+
+        return matrix
+
+    return incidence(groups1) @ incidence(groups2).T > 0
+
+
+def similarity_matrix(features1, features2):
+    """Compute the similarity of every pair of predicates.
+
+    Vectorised version of `Checker._tuple_similarity`: the targets must
+    have the same stem or be synonyms (and be both negated or not), the
+    arguments of both predicates are compared pairwise.
+
+    Args:
+        features1 (PredicateFeatures): The text predicates.
+        features2 (PredicateFeatures): The excerpt predicates.
+
+    Returns:
+        numpy.ndarray: The similarities, rounded to 2 decimals.
+    """
+
+    if features1.size == 0 or features2.size == 0:
+        return np.zeros((features1.size, features2.size))
+
+    # Targets
+    # ---------------------------------------------
+    same_target = (
+        (features1.target_stems[:, None] == features2.target_stems[None, :])
+        | _share_group_matrix(features1.target_groups, features2.target_groups)
+    ) & (features1.negated[:, None] == features2.negated[None, :])
+    same_rel = features1.gov_rels[:, None] == features2.gov_rels[None, :]
+
+    target_weights = np.where(
+        same_rel,
+        similarity_weights['target_same_rel'],
+        similarity_weights['target_diff_rel']
+    )
+
+    # Arguments
+    # ---------------------------------------------
+    same_arg = (
+        (features1.arg_stems[:, None] == features2.arg_stems[None, :])
+        | _share_group_matrix(features1.arg_groups, features2.arg_groups)
+    )
+    shared_args = (
+        features1.owners_matrix()
+        @ same_arg.astype(float)
+        @ features2.owners_matrix().T
+    )
+
+    similarity = (
+        np.where(same_target, target_weights, 0.0)
+        + similarity_weights['argument'] * shared_args
+    )
+    norm_factor = (
+        np.where(same_target, target_weights, similarity_weights['target_same_rel'])
+        + np.outer(features1.num_args, features2.num_args)
+    )
+
+    # Rounded like `Checker._tuple_similarity`: np.round scales by 100
+    # first and can round the other way (e.g. 0.025)
+    ratios = similarity / norm_factor
+
+    return np.array(
+        [round(ratio, 2) for ratio in ratios.ravel().tolist()]
+    ).reshape(ratios.shape)
+
+
+def match_greedy(matrix):
+    """Pair the rows and columns of a similarity matrix greedily.
+
+    The most similar remaining pair is taken until a side runs out (the
+    first one in row-major order on ties).
+
+    Args:
+        matrix (numpy.ndarray): The similarity matrix.
+
+    Returns:
+        list of tuple: The (row, column) pairs, in the order they are taken.
+    """
+
+    remaining = np.array(matrix, dtype=float)
+    pairs = []
+
+    for _ in range(min(remaining.shape)):
+        row, column = np.unravel_index(np.argmax(remaining), remaining.shape)
+        pairs.append((int(row), int(column)))
+        remaining[row, :] = -np.inf
+        remaining[:, column] = -np.inf
+
+    return pairs
+
+
+def match_optimal(matrix):
+    """Pair the rows and columns of a similarity matrix optimally.
+
+    The pairs maximise the total similarity (Hungarian algorithm).
+
+    Args:
+        matrix (numpy.ndarray): The similarity matrix.
+
+    Returns:
+        list of tuple: The (row, column) pairs.
+    """
+
+    if min(matrix.shape) == 0:
+        return []
+
+    rows, columns = linear_sum_assignment(-np.asarray(matrix, dtype=float))
+
+    return [(int(row), int(column)) for row, column in zip(rows, columns)]
+
+
+matching_strategies = {
+    'greedy': match_greedy,
+    'optimal': match_optimal
+}
+
+
 class Checker:
     """Implements the default semantics checker.
 
@@ -34,6 +265,18 @@ class Checker:
         text_document (Document): The text submitted by the student.
         excerpt_document (Document): The assignment's excerpt.
         supporting_excerpts (str): Paraphrase excerpts examples.
+        vectors (tuple, optional): Defaults to None. The dictionary and
+            the vectors of the excerpts (see `get_vectors`), computed if
+            None.
+        matrix_similarity (tuple, optional): Defaults to None. The TF-IDF
+            model and index of the excerpts (see `get_matrix_similarity`),
+            computed if None.
+        matching (str, optional): Defaults to None. How the text and
+            excerpt predicates are paired (see `matching_strategies`). If
+            None the configured strategy is used.
+
+    Raises:
+        TextProcessingException: If the matching strategy does not exist.
     """
 
     def __init__(
@@ -41,34 +284,59 @@ class Checker:
         text_document,
         excerpt_document,
         supporting_excerpts,
-        enable_cache=False
+        enable_cache=False,
+        vectors=None,
+        matrix_similarity=None,
+        matching=None
     ):
+        matching = matching or settings.SEMANTICS['MATCHING']
+
+        if matching not in matching_strategies:
+            raise TextProcessingException.invalid_matching_strategy(matching)
+
+        self.match = matching_strategies[matching]
         self.text_document = text_document
         self.excerpt_document = excerpt_document
-
-        if supporting_excerpts is None:
-            self.supporting_excerpts = []
-        elif type(supporting_excerpts) is list:
-            self.supporting_excerpts = supporting_excerpts
-        elif type(supporting_excerpts) is str:
-            self.supporting_excerpts = [
-                line.strip()
-                for line in clean_text(supporting_excerpts).splitlines()
-                if line.strip() != ''
-            ]
+        self.supporting_excerpts = split_supporting_excerpts(supporting_excerpts)
+        self.matrix_similarity = matrix_similarity
 
         self.cache = Cache(
             enabled=enable_cache,
-            base_key=self.excerpt_document.text + ''.join(self.supporting_excerpts)
+            base_key=self.excerpt_document.text + ''.join(self.supporting_excerpts),
+            namespace='semantics_checker'
         )
 
         # Load document vectors
-        documents = [self.excerpt_document.text] + self.supporting_excerpts
-        self.dictionary, self.vectors_corpus = self._docs_to_vectors(documents)
+        if vectors is None:
+            vectors = self.get_vectors()
+
+        self.dictionary, self.vectors_corpus = vectors
 
         # Load tools
         self.tools = Tools()
 
+    def get_vectors(self):
+        """Get the dictionary and the vectors of the excerpts.
+
+        Returns:
+            tuple: The gensim dictionary and the bag-of-words vectors.
+        """
+
+        documents = [self.excerpt_document.text] + self.supporting_excerpts
+        return self._docs_to_vectors(documents)
+
+    def get_matrix_similarity(self):
+        """Get the TF-IDF model and similarity index of the excerpts.
+
+        Returns:
+            tuple: The TF-IDF model and the similarity index.
+        """
+
+        if self.matrix_similarity is None:
+            self.matrix_similarity = self._load_matrix_similarity()
+
+        return self.matrix_similarity
+
     @caching('docs_to_vectors')
     def _docs_to_vectors(self, documents):
         def tokenize_document(document):
@@ -100,16 +368,11 @@ class Checker:
         return tfidf, index
 
     def _is_target_negated(self, target):
-        tokens = [token.text for token in target.tokens]
-        return 'not' in tokens or "n't" in tokens
+        return is_target_negated(target)
 
     def _tuple_similarity(self, t1, t2):
         similarity = 0.0
-        weights = {
-            'target_same_rel': 1.2,
-            'target_diff_rel': 1.05,
-            'argument': 1
-        }
+        weights = similarity_weights
         weight_key = 'target_same_rel'
         default_weight_target = 1.3
         num_args_shared = 0
@@ -192,38 +455,45 @@ class Checker:
 
         return round(similarity / norm_factor, 2)
 
-    def run(self):
-        # 1. Predicate patterns method
-        # ---------------------------------------------
+    def get_similarity_matrix(self, text_pred_args, excerpt_pred_args):
+        """Compute the similarity of every text and excerpt predicate.
 
-        pairs = []
-        text_pred_args = self.text_document.get(strings.predicate_patterns)[:]
-        excerpt_pred_args = self.excerpt_document.get(strings.predicate_patterns)[:]
+        The predicates are encoded once (see `PredicateFeatures`) and
+        compared all at once (see `similarity_matrix`).
 
-        while len(text_pred_args) > 0 and len(excerpt_pred_args) > 0:
-            similarity_results = []
+        Args:
+            text_pred_args (list of dict): The text predicate patterns.
+            excerpt_pred_args (list of dict): The excerpt predicate patterns.
 
-            for d_text in text_pred_args:
-                for d_excerpt in excerpt_pred_args:
-                    similarity = self._tuple_similarity(d_text, d_excerpt)
-                    similarity_results.append((d_text, d_excerpt, similarity))
+        Returns:
+            numpy.ndarray: The similarities, with a row per text predicate
+                and a column per excerpt predicate.
+        """
 
-            best_pair = max(similarity_results, key=lambda item: item[2])
+        return similarity_matrix(
+            PredicateFeatures(text_pred_args, self.tools.stemmer),
+            PredicateFeatures(excerpt_pred_args, self.tools.stemmer)
+        )
 
-            pairs.append(best_pair)
+    def run(self):
+        # 1. Predicate patterns method
+        # ---------------------------------------------
 
-            text_pred_args.remove(best_pair[0])
-            excerpt_pred_args.remove(best_pair[1])
+        matrix = self.get_similarity_matrix(
+            self.text_document.get(strings.predicate_patterns),
+            self.excerpt_document.get(strings.predicate_patterns)
+        )
+        pairs = self.match(matrix)
 
         if len(pairs) == 0:
             pp_method_result = 0.0
         else:
-            pp_method_result = sum([sim for _, _, sim in pairs]) / len(pairs)
+            pp_method_result = sum([float(matrix[i, j]) for i, j in pairs]) / len(pairs)
 
         # 2. Vector similarity method
         # ---------------------------------------------
 
-        tfidf, index = self._load_matrix_similarity()
+        tfidf, index = self.get_matrix_similarity()
         parse_data = self.text_document.get(strings.parse_data)
 
         tokens = [
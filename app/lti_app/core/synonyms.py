@@ -0,0 +1,206 @@
+"""Provides the precomputed WordNet synonym index.
+
+Two words are synonyms when the synsets of the first and of the second
+share a lemma name. Each lemma name is a synonym group, identified by the
+64-bit hash of the name, and the index maps every WordNet lemma to the
+sorted ids of the groups of its synsets. Checking whether two words are
+synonyms is then an intersection of two small sorted arrays.
+
+The index is stored as three NumPy arrays, loaded through memory maps so
+that the worker processes share the same pages:
+- `keys.npy`: the sorted hashes of the lemmas;
+- `offsets.npy`: where the groups of each lemma start in `groups.npy`;
+- `groups.npy`: the concatenated sorted group ids.
+
+Words missing from the index (e.g. inflected forms) are looked up in
+WordNet, as are all the words if the index was not built.
+"""
+
+import hashlib
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from nltk.corpus import wordnet as wn
+
+
+filenames = ('keys.npy', 'offsets.npy', 'groups.npy')
+
+
+def get_id(name):
+    """Get the integer id of a lemma or synonym group name.
+
+    Args:
+        name (str): The name.
+
+    Returns:
+        int: The unsigned 64-bit hash of the name.
+    """
+
+    digest = hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def compute_groups(word):
+    """Compute the synonym groups of a word from WordNet.
+
+    Args:
+        word (str): The word.
+
+    Returns:
+        numpy.ndarray: The sorted group ids (uint64).
+    """
+
+    return np.unique(np.array(
+        [
+            get_id(lemma)
+            for synset in wn.synsets(word)
+            for lemma in synset.lemma_names()
+        ],
+        dtype=np.uint64
+    ))
+
+
+def build_index(directory, lemmas=None):
+    """Build the synonym index.
+
+    Args:
+        directory (str): The directory of the index, created if needed.
+        lemmas (iterable of str, optional): Defaults to None. The lemmas
+            to index. If None every WordNet lemma is indexed.
+
+    Returns:
+        int: The number of lemmas indexed.
+    """
+
+    if lemmas is None:
+        lemmas = wn.all_lemma_names()
+
+    entries = sorted(
+        (get_id(lemma), compute_groups(lemma))
+        for lemma in set(lemma.lower() for lemma in lemmas)
+    )
+    keys = np.array([key for key, _ in entries], dtype=np.uint64)
+    offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(groups) for _, groups in entries])
+    groups = (
+        np.concatenate([groups for _, groups in entries])
+        if len(entries) != 0
+        else np.array([], dtype=np.uint64)
+    )
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Readers never see a partial index
+    for filename, array in zip(filenames, (keys, offsets, groups)):
+        path = os.path.join(directory, filename)
+        np.save(path + '.tmp.npy', array)
+        os.replace(path + '.tmp.npy', path)
+
+    return len(entries)
+
+
+class SynonymIndex:
+    """A synonym index built by `build_index`.
+
+    Args:
+        directory (str): The directory of the index.
+    """
+
+    def __init__(self, directory):
+        self.keys, self.offsets, self.groups = (
+            np.load(os.path.join(directory, filename), mmap_mode='r')
+            for filename in filenames
+        )
+
+    def get_groups(self, word):
+        """Get the synonym groups of a word.
+
+        Args:
+            word (str): The word.
+
+        Returns:
+            numpy.ndarray: The sorted group ids or None if the word is not
+                in the index.
+        """
+
+        key = np.uint64(get_id(word.lower()))
+        position = np.searchsorted(self.keys, key)
+
+        if position == len(self.keys) or self.keys[position] != key:
+            return None
+
+        return self.groups[self.offsets[position]:self.offsets[position + 1]]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Get the synonym index of the current process.
+
+    Returns:
+        SynonymIndex: The index or None if it was not built.
+    """
+
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            directory = settings.SYNONYM_INDEX['DIRECTORY']
+
+            if all(
+                os.path.exists(os.path.join(directory, filename))
+                for filename in filenames
+            ):
+                _index = SynonymIndex(directory)
+            else:
+                _index = False
+
+        return _index or None
+
+
+@lru_cache(maxsize=65536)
+def get_groups(word):
+    """Get the synonym groups of a word, from the index if possible.
+
+    Args:
+        word (str): The word.
+
+    Returns:
+        numpy.ndarray: The sorted group ids.
+    """
+
+    index = get_index()
+    groups = index.get_groups(word) if index is not None else None
+
+    if groups is None:
+        groups = compute_groups(word)
+
+    return groups
+
+
+def share_group(groups1, groups2):
+    """Check whether two sorted arrays of group ids intersect.
+
+    Args:
+        groups1 (numpy.ndarray): The first group ids.
+        groups2 (numpy.ndarray): The second group ids.
+
+    Returns:
+        bool: Whether a group id is in both arrays.
+    """
+
+    if len(groups1) == 0 or len(groups2) == 0:
+        return False
+
+    if len(groups1) > len(groups2):
+        groups1, groups2 = groups2, groups1
+
+    positions = np.searchsorted(groups2, groups1)
+    positions[positions == len(groups2)] = 0
+
+    return bool(np.any(groups2[positions] == groups1))
@@ -9,6 +9,8 @@ from nltk import WhitespaceTokenizer
 from nltk.corpus import stopwords, wordnet as wn
 from nltk.parse.stanford import StanfordParser, StanfordDependencyParser
 
+from lti_app.core import synonyms
+
 
 def load_stanford_parser():
     """Loads the Stanford parsers
@@ -83,11 +85,23 @@ def get_synonyms(word):
 
 
 def are_synonyms(word1, word2):
-    syn_t = get_synonyms(word1)
-    syn_e = get_synonyms(word2)
-    synonyms = syn_t & syn_e
+    """Checks if two words are synonyms.
+
+    Their synsets must share a lemma name. The lookups go through the
+    precomputed synonym index (see `lti_app.core.synonyms`).
+
+    Args:
+        word1 (str): The first word.
+        word2 (str): The second word.
 
-    return len(synonyms) > 0
+    Returns:
+        bool: Whether the words are synonyms.
+    """
+
+    return synonyms.share_group(
+        synonyms.get_groups(word1),
+        synonyms.get_groups(word2)
+    )
 
 
 def are_hierarchically_related(word1, word2):
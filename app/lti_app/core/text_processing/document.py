@@ -1,6 +1,16 @@
+import threading
+
+from lti_app.core.exceptions import TextProcessingException
+
+
 class Document:
     """Represents a document with raw text and processed entities.
 
+    Entities can be lazy: they are computed the first time they are
+    requested and then kept. The keys computed so far, eagerly or lazily,
+    are listed in `materialised`. A document with lazy entities cannot be
+    serialized, they must be requested or dropped (see `drop_lazy`) first.
+
     Args:
         text (string): The raw text.
         data (dict, optional): The processed data.
@@ -12,6 +22,13 @@ class Document:
 
         self.text = text
         self.data = data
+        self.lazy = {}
+        self.dropped = set()
+        self.lock = threading.RLock()
+        self.materialised = []
+        self.digests = {}
+        self.timings = {}
+        self.critical_path = ([], 0.0)
 
     def __str__(self):
         return str(self.data)
@@ -22,17 +39,53 @@ class Document:
     def __eq__(self, other):
         return self.text == other.text and self.data == other.data
 
+    def __getstate__(self):
+        # Lazy entries (and the lock) cannot be serialized
+        if len(self.lazy) != 0:
+            raise TextProcessingException.lazy_keys(self.lazy)
+
+        state = self.__dict__.copy()
+        state.pop('lock')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def _materialise(self, key):
+        with self.lock:
+            compute = self.lazy.get(key)
+
+            # Computed by another thread in the meantime
+            if compute is None:
+                return
+
+            self.data[key] = compute()
+            self.lazy.pop(key)
+            self.materialised.append(key)
+
     def get(self, key, d=None):
         """Get the document entity given its key.
 
+        A lazy entity is computed on the first call.
+
         Args:
             key (str): The key for the document entity.
             d (any, optional): Defaults to None. The default value
 
+        Raises:
+            TextProcessingException: If the lazy entity was dropped.
+
         Returns:
             any: The data value.
         """
 
+        if key in self.dropped:
+            raise TextProcessingException.dropped_key(key)
+
+        if key in self.lazy:
+            self._materialise(key)
+
         return self.data.get(key, d)
 
     def put(self, key, data):
@@ -44,3 +97,25 @@ class Document:
         """
 
         self.data[key] = data
+        self.materialised.append(key)
+
+    def put_lazy(self, key, compute):
+        """Add a lazy entity to the document.
+
+        Args:
+            key (str): The key associated with the value.
+            compute (callable): Computes the value (no arguments).
+        """
+
+        self.lazy[key] = compute
+
+    def drop_lazy(self):
+        """Drop the lazy entities not computed so far.
+
+        Requesting a dropped entity raises an exception instead of
+        returning the default value.
+        """
+
+        with self.lock:
+            self.dropped.update(self.lazy)
+            self.lazy = {}
@@ -1,27 +1,703 @@
+"""Provides the CoreNLP parser."""
+
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
 from nltk.tree import ParentedTree
 
 from lti_app import strings
+from lti_app.caching import Cache
 from lti_app.core.api import CoreNlpClient
+from lti_app.core.exceptions import TextProcessingException
+from lti_app.helpers import flatten
+from lti_app.metrics import Metrics
+
+
+# Protobuf Decoding
+# =============================================
+
+def _tree_to_string(tree):
+    if len(tree.child) == 0:
+        return tree.value
+
+    return '({0} {1})'.format(
+        tree.value,
+        ' '.join(_tree_to_string(child) for child in tree.child)
+    )
+
+
+def _decode_dependencies(graph, tokens):
+    def gloss(index):
+        return tokens[index - 1]['word']
+
+    dependencies = [
+        {
+            'dep': 'ROOT',
+            'governor': 0,
+            'governorGloss': 'ROOT',
+            'dependent': root,
+            'dependentGloss': gloss(root)
+        }
+        for root in graph.root
+    ]
+
+    for edge in sorted(graph.edge, key=lambda edge: edge.target):
+        dependencies.append({
+            'dep': edge.dep,
+            'governor': edge.source,
+            'governorGloss': gloss(edge.source),
+            'dependent': edge.target,
+            'dependentGloss': gloss(edge.target)
+        })
+
+    return dependencies
+
+
+def decode_sentence(sentence):
+    """Decode a protobuf sentence into the CoreNLP JSON structure.
+
+    Only the fields read by the pipeline are decoded.
+
+    Args:
+        sentence (corenlp_protobuf.Sentence): The protobuf sentence.
+
+    Returns:
+        dict: The sentence as produced by the JSON outputter.
+    """
+
+    tokens = [
+        {
+            'index': index,
+            'word': token.word,
+            'originalText': token.originalText,
+            'lemma': token.lemma,
+            'characterOffsetBegin': token.beginChar,
+            'characterOffsetEnd': token.endChar,
+            'pos': token.pos,
+            'before': token.before,
+            'after': token.after
+        }
+        for index, token in enumerate(sentence.token, 1)
+    ]
+
+    data = {
+        'index': sentence.sentenceIndex,
+        'tokens': tokens
+    }
+
+    if sentence.HasField('parseTree'):
+        data['parse'] = _tree_to_string(sentence.parseTree)
+
+    if sentence.HasField('basicDependencies'):
+        data['basicDependencies'] = _decode_dependencies(
+            sentence.basicDependencies,
+            tokens
+        )
+
+    return data
+
+
+def decode_sentences(data):
+    """Decode a serialized CoreNLP document.
+
+    Args:
+        data (bytes): The length-delimited protobuf `Document`.
+
+    Returns:
+        list of dict: The sentences in the CoreNLP JSON structure.
+    """
+
+    # Only needed with the serialized output format
+    from corenlp_protobuf import Document, parseFromDelimitedString
+
+    document = Document()
+    parseFromDelimitedString(document, data)
+
+    return [decode_sentence(sentence) for sentence in document.sentence]
+
+
+# Sentences
+# =============================================
+
+def normalize_sentence(sentence):
+    return ' '.join(sentence.split())
+
+
+def get_offset_map(sentence):
+    """Map the character offsets of a normalized sentence to the sentence.
+
+    See `normalize_sentence`. The space joining two words is mapped to the
+    start of the whitespace between them.
+
+    Args:
+        sentence (str): The sentence.
+
+    Returns:
+        list of int: The offset in the sentence of every character of the
+            normalized sentence, followed by the end offset of the last word.
+    """
+
+    offsets = []
+    end = 0
+
+    for match in re.finditer(r'\S+', sentence):
+        if len(offsets) > 0:
+            offsets.append(end)
+
+        offsets.extend(range(match.start(), match.end()))
+        end = match.end()
+
+    offsets.append(end)
+
+    return offsets
+
+
+def chunk_sentences(sentences, max_size):
+    """Group consecutive sentences into size-bounded chunks.
+
+    A sentence longer than `max_size` gets a chunk of its own.
+
+    Args:
+        sentences (list of str): The sentences.
+        max_size (int): The maximum number of characters per chunk.
+
+    Returns:
+        list of list of str: The chunks.
+    """
+
+    chunks = []
+    chunk = []
+    chunk_size = 0
+
+    for sentence in sentences:
+        if len(chunk) > 0 and chunk_size + len(sentence) + 1 > max_size:
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+
+        chunk.append(sentence)
+        chunk_size += len(sentence) + 1
+
+    if len(chunk) > 0:
+        chunks.append(chunk)
+
+    return chunks
+
+
+def shift_sentence(sentence, index, offset, offset_map=None):
+    """Place an annotated sentence inside a document.
+
+    Args:
+        sentence (dict): The sentence annotated on its own.
+        index (int): The sentence index in the document.
+        offset (int): The character offset of the sentence in the document.
+        offset_map (list of int, optional): Defaults to None. The map of
+            the offsets if the sentence was annotated normalized (see
+            `get_offset_map`).
+
+    Returns:
+        dict: A copy of the sentence with document-level indices.
+    """
+
+    def begin(value):
+        if offset_map is not None:
+            value = offset_map[min(value, len(offset_map) - 1)]
+
+        return value + offset
+
+    def end(value):
+        if offset_map is not None and value > 0:
+            value = offset_map[min(value, len(offset_map)) - 1] + 1
+
+        return value + offset
+
+    tokens = [
+        {
+            **token,
+            'characterOffsetBegin': begin(token.get('characterOffsetBegin', 0)),
+            'characterOffsetEnd': end(token.get('characterOffsetEnd', 0))
+        }
+        for token in sentence.get('tokens', [])
+    ]
+
+    return {**sentence, 'index': index, 'tokens': tokens}
+
+
+def restore_whitespace(sentences, text):
+    """Set the whitespace around the tokens from the text.
+
+    Args:
+        sentences (list of dict): The sentences placed in the text (see
+            `shift_sentence`), modified in place.
+        text (str): The text.
+    """
+
+    tokens = [
+        token
+        for sentence in sentences
+        for token in sentence.get('tokens', [])
+        if 'before' in token or 'after' in token
+    ]
+    previous_end = 0
+
+    for token, next_token in zip(tokens, tokens[1:] + [None]):
+        next_begin = (
+            len(text)
+            if next_token is None
+            else next_token['characterOffsetBegin']
+        )
+        token['before'] = text[previous_end:token['characterOffsetBegin']]
+        token['after'] = text[token['characterOffsetEnd']:next_begin]
+        previous_end = token['characterOffsetEnd']
+
+
+# Annotation Levels
+# =============================================
+
+# Each level provides the parse data of the previous ones. The
+# constituencies are produced with the annotators of the parser profile.
+annotation_levels = [
+    (strings.tokens, ['tokenize', 'ssplit']),
+    (strings.tagged_tokens, ['tokenize', 'ssplit', 'pos']),
+    (strings.dependencies, ['tokenize', 'ssplit', 'pos', 'depparse']),
+    (strings.constituencies, None)
+]
+
+
+def plan_level(required):
+    """Get the cheapest annotation level providing the required parse data.
+
+    Args:
+        required (iterable of str): The required parse data keys
+            (`tokens`, `tagged_tokens`, `dependencies`, `constituencies`).
+
+    Returns:
+        str: The annotation level.
+    """
+
+    required = set(required)
+    level = strings.tokens
+
+    for name, _ in annotation_levels:
+        if name in required:
+            level = name
+
+    return level
+
+
+# Parser
+# =============================================
+
+def build_parse_data(sentences):
+    """Build the parse data from annotated sentences.
+
+    Args:
+        sentences (list of dict): The sentences in the CoreNLP JSON structure.
+
+    Returns:
+        dict: The constituencies, dependencies and tagged tokens.
+    """
+
+    constituencies = []
+    dependencies = []
+    tagged_tokens = []
+
+    # The constituencies and dependencies are None for sentences
+    # annotated at a lower level
+    for sentence in sentences:
+        parse = sentence.get('parse')
+        constituencies.append(
+            ParentedTree.fromstring(parse) if parse is not None else None
+        )
+        dependencies.append(sentence.get('basicDependencies'))
+        tagged_tokens.append(sentence.get('tokens'))
+
+    return {
+        strings.constituencies: constituencies,
+        strings.dependencies: dependencies,
+        strings.tagged_tokens: tagged_tokens
+    }
 
 
 class Parser:
-    def __init__(self):
+    """Parses texts using the CoreNLP server.
+
+    With the sentence cache enabled, parsed sentences are cached by their
+    normalised content and only the sentences which are not cached yet are
+    sent to CoreNLP. This makes resubmissions (and sentences shared by
+    several students) cheap. The texts are still split into sentences by
+    CoreNLP, which only costs a tokenizer request.
+
+    With chunking enabled, texts longer than `chunk_size` characters are
+    split at sentence boundaries and the chunks are sent concurrently (at
+    most `chunk_concurrency` at a time), so the latency of long texts
+    follows the slowest chunk rather than the whole text.
+
+    Args:
+        output_format (str, optional): Defaults to None. Either `json` or
+            `serialized` (protobuf). If None the configured format is used.
+        sentence_cache (bool, optional): Defaults to None. Whether to use
+            the sentence cache. If None the configured value is used.
+        chunk_size (int, optional): Defaults to None. The maximum chunk
+            size in characters (0 disables chunking). If None the
+            configured value is used.
+        chunk_concurrency (int, optional): Defaults to None. The maximum
+            number of concurrent chunk requests. If None the configured
+            value is used.
+    """
+
+    def __init__(
+        self,
+        output_format=None,
+        sentence_cache=None,
+        chunk_size=None,
+        chunk_concurrency=None
+    ):
+        config = settings.STANFORD_CORENLP
+
         self.client = CoreNlpClient()
+        self.output_format = output_format or config.get('OUTPUT_FORMAT', 'json')
+        self.sentence_cache = (
+            config.get('SENTENCE_CACHE', False)
+            if sentence_cache is None
+            else sentence_cache
+        )
+        self.chunk_size = (
+            config.get('CHUNK_SIZE', 0)
+            if chunk_size is None
+            else chunk_size
+        )
+        self.chunk_concurrency = (
+            config.get('CHUNK_CONCURRENCY', 1)
+            if chunk_concurrency is None
+            else chunk_concurrency
+        )
+        self.cache = Cache(
+            enabled=self.sentence_cache,
+            base_key='parser_sentence_',
+            namespace='parser_sentence'
+        )
+        self.metrics = Metrics()
 
-    def parse(self, text):
-        data = self.client.run(text, ['parse'])
-        sentences = data.get('sentences')
-        constituencies = []
-        dependencies = []
-        tagged_tokens = []
-
-        for sentence in sentences:
-            constituencies.append(ParentedTree.fromstring(sentence.get('parse')))
-            dependencies.append(sentence.get('basicDependencies'))
-            tagged_tokens.append(sentence.get('tokens'))
-
-        return {
-            strings.constituencies: constituencies,
-            strings.dependencies: dependencies,
-            strings.tagged_tokens: tagged_tokens
-        }
+    def annotate(self, text, annotators, properties=None):
+        """Annotate a text.
+
+        Args:
+            text (str): The text to annotate.
+            annotators (list of str): The CoreNLP annotators to run.
+            properties (dict, optional): Defaults to None. Additional
+                CoreNLP properties.
+
+        Returns:
+            list of dict: The sentences in the CoreNLP JSON structure.
+        """
+
+        if self.output_format == 'serialized':
+            return decode_sentences(
+                self.client.run_serialized(text, annotators, properties)
+            )
+
+        return self.client.run(text, annotators, properties).get('sentences')
+
+    def annotate_sentences(self, sentences, annotators, properties=None):
+        """Annotate already split sentences (in chunks if enabled).
+
+        Args:
+            sentences (list of str): The sentences (without line breaks).
+            annotators (list of str): The CoreNLP annotators to run.
+            properties (dict, optional): Defaults to None. Additional
+                CoreNLP properties.
+
+        Returns:
+            list of dict: One annotated sentence per input sentence (with
+                offsets relative to the sentence) or None if CoreNLP split
+                them differently.
+        """
+
+        if self.chunk_size > 0:
+            chunks = chunk_sentences(sentences, self.chunk_size)
+        else:
+            chunks = [sentences]
+
+        if len(chunks) <= 1:
+            return self._annotate_lines(sentences, annotators, properties)
+
+        def annotate_chunk(chunk):
+            started_at = time.monotonic()
+            annotated = self._annotate_lines(chunk, annotators, properties)
+            self.metrics.observe(
+                'parser.chunk_latency',
+                time.monotonic() - started_at
+            )
+
+            return annotated
+
+        self.metrics.increment('parser.chunks', len(chunks))
+        max_workers = max(1, min(self.chunk_concurrency, len(chunks)))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(annotate_chunk, chunks))
+
+        if any(result is None for result in results):
+            return None
+
+        return flatten(results)
+
+    def _annotate_lines(self, sentences, annotators, properties):
+        if len(sentences) == 0:
+            return []
+
+        annotated = self.annotate(
+            '\n'.join(sentences),
+            annotators,
+            {**(properties or {}), 'ssplit.eolonly': 'true'}
+        )
+
+        if len(annotated) != len(sentences):
+            return None
+
+        relative_sentences = []
+        offset = 0
+
+        for sentence, text in zip(annotated, sentences):
+            relative_sentences.append(shift_sentence(sentence, 0, -offset))
+            offset += len(text) + 1
+
+        return relative_sentences
+
+    def _config_key(self, annotators, properties):
+        return json.dumps([annotators, properties], sort_keys=True)
+
+    def split_sentences(self, text, properties=None):
+        """Split a text into sentences as CoreNLP does.
+
+        Only the tokenizer and the sentence splitter run, with the same
+        properties as the annotation of the whole text, so that the
+        sentences annotated one by one are those of the whole text.
+
+        Args:
+            text (str): The text.
+            properties (dict, optional): Defaults to None. Additional
+                CoreNLP properties.
+
+        Returns:
+            list of tuple: The (start, end) character spans of the sentences.
+        """
+
+        return [
+            (
+                sentence['tokens'][0]['characterOffsetBegin'],
+                sentence['tokens'][-1]['characterOffsetEnd']
+            )
+            for sentence in self.annotate(text, ['tokenize', 'ssplit'], properties)
+            if len(sentence.get('tokens', [])) > 0
+        ]
+
+    def annotate_incrementally(self, text, annotators, properties=None):
+        """Annotate a text re-using the cached sentences.
+
+        See `annotate` for the arguments and return value.
+        """
+
+        spans = self.split_sentences(text, properties)
+        config_key = self._config_key(annotators, properties)
+        keys = [
+            config_key + normalize_sentence(text[start:end])
+            for start, end in spans
+        ]
+        cached = self.cache.get_many(list(set(keys)))
+
+        missing = {}
+        for key in keys:
+            if key not in cached:
+                missing[key] = key[len(config_key):]
+
+        hits = sum(1 for key in keys if key in cached)
+        self.metrics.increment('parser.sentence_cache.hits', hits)
+        self.metrics.increment('parser.sentence_cache.misses', len(keys) - hits)
+
+        annotated = self.annotate_sentences(
+            list(missing.values()),
+            annotators,
+            properties
+        )
+
+        if annotated is None:
+            self.metrics.increment('parser.sentence_cache.fallbacks')
+            return self.annotate(text, annotators, properties)
+
+        parsed = dict(zip(missing.keys(), annotated))
+        self.cache.put_many(parsed)
+        parsed.update(cached)
+
+        # The sentences are annotated normalized, the offsets are mapped
+        # back to the text
+        sentences = [
+            shift_sentence(
+                parsed[key],
+                index,
+                start,
+                get_offset_map(text[start:end])
+            )
+            for index, (key, (start, end)) in enumerate(zip(keys, spans))
+        ]
+        restore_whitespace(sentences, text)
+
+        return sentences
+
+    def prefetch(self, texts, profile=None, level=None):
+        """Parse the sentences of several texts in batched requests.
+
+        The parsed sentences are stored in the sentence cache, so that
+        parsing any of the texts afterwards with the sentence cache (even if
+        it is disabled in the settings, see `parse`) only reads the cache.
+        The sentences shared by several texts are parsed once.
+
+        Args:
+            texts (list of str): The texts to parse.
+            profile (str, optional): Defaults to None. See `parse`.
+            level (str, optional): Defaults to None. See `parse`.
+
+        Returns:
+            int: The number of sentences parsed.
+        """
+
+        annotators, properties = self.get_annotators(profile, level)
+        config_key = self._config_key(annotators, properties)
+        keys = set(
+            config_key + normalize_sentence(text[start:end])
+            for text in texts
+            for start, end in self.split_sentences(text, properties)
+        )
+        cached = self.cache.get_many(list(keys))
+        missing = sorted(key for key in keys if key not in cached)
+
+        annotated = self.annotate_sentences(
+            [key[len(config_key):] for key in missing],
+            annotators,
+            properties
+        )
+
+        # The texts are parsed one by one later on
+        if annotated is None:
+            self.metrics.increment('parser.sentence_cache.fallbacks')
+            return 0
+
+        self.cache.put_many(dict(zip(missing, annotated)))
+        self.metrics.increment('parser.prefetched', len(missing))
+
+        return len(missing)
+
+    def annotate_in_chunks(self, text, annotators, properties=None):
+        """Annotate a long text in concurrent, sentence-aligned chunks.
+
+        See `annotate` for the arguments and return value.
+        """
+
+        spans = self.split_sentences(text, properties)
+        annotated = self.annotate_sentences(
+            [normalize_sentence(text[start:end]) for start, end in spans],
+            annotators,
+            properties
+        )
+
+        if annotated is None:
+            return self.annotate(text, annotators, properties)
+
+        # The sentences are annotated normalized, the offsets are mapped
+        # back to the text
+        sentences = [
+            shift_sentence(
+                sentence,
+                index,
+                start,
+                get_offset_map(text[start:end])
+            )
+            for index, (sentence, (start, end)) in enumerate(zip(annotated, spans))
+        ]
+        restore_whitespace(sentences, text)
+
+        return sentences
+
+    def get_profile(self, name=None):
+        """Get a parser profile.
+
+        Args:
+            name (str, optional): Defaults to None. The profile name.
+                If None the configured default profile is used.
+
+        Raises:
+            TextProcessingException: If the profile does not exist.
+
+        Returns:
+            tuple: The annotators and CoreNLP properties of the profile.
+        """
+
+        config = settings.STANFORD_CORENLP
+        name = name or config.get('PARSER_PROFILE')
+        profile = config.get('PARSER_PROFILES', {}).get(name)
+
+        if profile is None:
+            raise TextProcessingException.invalid_parser_profile(name)
+
+        return profile.get('annotators'), profile.get('properties')
+
+    def get_annotators(self, profile=None, level=None):
+        """Get the annotators needed for an annotation level.
+
+        Args:
+            profile (str, optional): Defaults to None. The parser profile
+                (used for the constituencies).
+            level (str, optional): Defaults to None. The annotation level.
+                If None the constituencies are produced.
+
+        Raises:
+            TextProcessingException: If the profile or the level does
+                not exist.
+
+        Returns:
+            tuple: The annotators and CoreNLP properties.
+        """
+
+        level = level or strings.constituencies
+        levels = dict(annotation_levels)
+
+        if level not in levels:
+            raise TextProcessingException.invalid_annotation_level(level)
+
+        if levels[level] is None:
+            return self.get_profile(profile)
+
+        return levels[level], {}
+
+    def parse(self, text, profile=None, level=None, sentence_cache=None):
+        """Parse a text.
+
+        Args:
+            text (str): The text to parse.
+            profile (str, optional): Defaults to None. The parser profile.
+            level (str, optional): Defaults to None. The annotation level
+                (see `plan_level`). If None the text is fully parsed.
+            sentence_cache (bool, optional): Defaults to None. Whether to
+                use the sentence cache. If None the parser setting is used.
+
+        Returns:
+            dict: The constituencies, dependencies and tagged tokens.
+        """
+
+        annotators, properties = self.get_annotators(profile, level)
+
+        if sentence_cache is None:
+            sentence_cache = self.sentence_cache
+
+        if sentence_cache:
+            sentences = self.annotate_incrementally(text, annotators, properties)
+        elif self.chunk_size > 0 and len(text) > self.chunk_size:
+            sentences = self.annotate_in_chunks(text, annotators, properties)
+        else:
+            sentences = self.annotate(text, annotators, properties)
+
+        return build_parse_data(sentences)
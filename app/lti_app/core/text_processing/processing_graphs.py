@@ -3,6 +3,7 @@
 
 import hashlib
 import re
+import threading
 from functools import wraps
 
 from django.core.cache import cache
@@ -12,7 +13,8 @@ from predpatt.util.ud import dep_v1
 
 from .tools import Tools
 from lti_app import strings
-from lti_app.caching import Cache, caching
+from lti_app.artifacts import artifact_key, get_store
+from lti_app.caching import Cache, get_hash
 from lti_app.core.exceptions import TextProcessingException
 from lti_app.core.text_helpers import clean_text, is_punctuation
 from lti_app.helpers import chunks, flatten
@@ -22,12 +24,31 @@ from lti_app.helpers import chunks, flatten
 # =============================================
 
 class ProcessorNode:
-    """Base class for nodes in a text processing graph."""
+    """Base class for nodes in a text processing graph.
+
+    A node reads the output of its predecessor (`input_key`) or, if it
+    declares named inputs (`inputs`, a mapping of names to document
+    keys), receives their values as the `inputs` keyword argument.
+
+    Nodes are shared by all the jobs of a process, so the state of a run
+    (the cache settings) is kept per thread.
+
+    When caching is enabled the outputs are stored as artefacts keyed by
+    the digest of the inputs and the name, `version` and `options` of the
+    node. Bump `version` whenever a change of the node changes its output.
+
+    Attributes:
+        version (int): The version of the node implementation.
+        cacheable (bool): Whether the outputs can be stored.
+    """
+
+    version = 1
+    cacheable = True
 
     def __init__(self, **kwargs):
         self.attrs = kwargs
         self.tools = Tools()
-        self.cache = None
+        self.local = threading.local()
 
     def __eq__(self, other):
         return self.attrs == other.attrs
@@ -35,28 +56,83 @@ class ProcessorNode:
     def __hash__(self):
         return hash(str(self.attrs))
 
+    def __deepcopy__(self, memo):
+        # Nodes are shared, copying a graph only copies its structure
+        return self
+
+    @property
+    def cache(self):
+        return getattr(self.local, 'cache', None)
+
+    @cache.setter
+    def cache(self, value):
+        self.local.cache = value
+
     def _process(self, **kwargs):
         raise NotImplementedError()
 
+    def options(self, **kwargs):
+        """Get the options of a run changing the output of the node.
+
+        Returns:
+            dict: The options (JSON serializable).
+        """
+
+        return {}
+
+    def prefetch(self, batch, **kwargs):
+        """Prepare the processing of several documents at once.
+
+        Called by `TextProcessor.run_many` before the documents are
+        processed one by one. Nodes relying on a remote service override
+        it to batch their requests.
+
+        Args:
+            batch (list of dict): The `document` and `input_key` (or
+                `inputs`) keyword arguments of each document.
+        """
+
+        pass
+
     def process(self, **kwargs):
         """Process the text."""
 
         document = kwargs.get('document')
         enable_cache = kwargs.get('enable_cache')
+        input_digest = kwargs.get('input_digest') or get_hash(document.text)
+        parser_profile = kwargs.get('parser_profile')
+        parse_level = kwargs.get('parse_level')
 
+        # Nodes using the `caching` decorator cache by the digest of the
+        # node inputs. Parse-derived outputs also depend on the parser
+        # profile and level.
         self.cache = Cache(
             enabled=enable_cache,
-            base_key=document.text
+            base_key=input_digest + (parser_profile or '') + (parse_level or ''),
+            namespace=self.attrs.get('name')
         )
 
-        return self._process(**kwargs)
+        if not enable_cache or not self.cacheable:
+            return self._process(**kwargs)
+
+        store = get_store()
+        key = artifact_key(
+            input_digest,
+            self.attrs.get('name'),
+            self.version,
+            self.options(**kwargs)
+        )
+        return store.get_or_compute(
+            key,
+            lambda: self._process(**kwargs),
+            self.attrs.get('name')
+        )
 
 
 class TextCleaner(ProcessorNode):
     def __init__(self, name='text_cleaner', out=strings.cleaned_text):
         ProcessorNode.__init__(self, name=name, out=out)
 
-    @caching(['attrs', 'name'])
     def _process(self, **kwargs):
         document = kwargs.get('document')
         return clean_text(document.text)
@@ -66,7 +142,14 @@ class CitationRemover(ProcessorNode):
     def __init__(self, name='citation_remover', out=strings.cleaned_text):
         ProcessorNode.__init__(self, name=name, out=out)
 
-    @caching(['attrs', 'name'])
+    def options(self, **kwargs):
+        citation_check = kwargs.get(strings.citation_check) or {}
+
+        return {
+            'authors': citation_check.get('authors'),
+            'year': citation_check.get('year')
+        }
+
     def _process(self, **kwargs):
         document = kwargs.get('document')
         citation_check = kwargs.get(strings.citation_check)
@@ -112,7 +195,6 @@ class SentenceTokenizer(ProcessorNode):
     def __init__(self, name='sentence_tokenizer', out=strings.sentences):
         ProcessorNode.__init__(self, name=name, out=out)
 
-    @caching(['attrs', 'name'])
     def _process(self, **kwargs):
         document = kwargs.get('document')
         input_key = kwargs.get('input_key')
@@ -128,7 +210,23 @@ class Parser(ProcessorNode):
     def __init__(self, name='parser', out=strings.parse_data):
         ProcessorNode.__init__(self, name=name, out=out)
 
-    @caching(['attrs', 'name'])
+    def options(self, **kwargs):
+        # The resolved configuration, so that editing a profile in the
+        # settings never serves the parses of its previous definition
+        parser = self.tools.parser
+        annotators, properties = parser.get_annotators(
+            kwargs.get('parser_profile'),
+            kwargs.get('parse_level')
+        )
+
+        return {
+            'parser_profile': kwargs.get('parser_profile'),
+            'parse_level': kwargs.get('parse_level'),
+            'annotators': annotators,
+            'properties': properties,
+            'output_format': parser.output_format
+        }
+
     def _process(self, **kwargs):
         document = kwargs.get('document')
         input_key = kwargs.get('input_key')
@@ -137,7 +235,66 @@ class Parser(ProcessorNode):
         if text is None:
             raise TextProcessingException.missing_key(input_key)
 
-        return self.tools.parser.parse(text)
+        return self.tools.parser.parse(
+            text,
+            kwargs.get('parser_profile'),
+            kwargs.get('parse_level'),
+            kwargs.get('sentence_cache')
+        )
+
+    def prefetch(self, batch, **kwargs):
+        # Parse the sentences of the batch in batched requests, the
+        # documents then read them from the sentence cache
+        sentence_cache = kwargs.get('sentence_cache')
+
+        if sentence_cache is None:
+            sentence_cache = self.tools.parser.sentence_cache
+
+        if not sentence_cache:
+            return
+
+        self.tools.parser.prefetch(
+            [
+                arguments.get('document').get(arguments.get('input_key'))
+                for arguments in batch
+            ],
+            kwargs.get('parser_profile'),
+            kwargs.get('parse_level')
+        )
+
+
+class LanguageToolRequester(ProcessorNode):
+    """Sends the cleaned text to LanguageTool in the background.
+
+    The node runs before the parser, so that the LanguageTool request is
+    in flight while CoreNLP parses the text. Its output is a future
+    resolved by the grammar checker, or None unless the
+    `languagetool` keyword argument is set.
+    """
+
+    # The output is a pending request
+    cacheable = False
+
+    def __init__(
+        self,
+        name='languagetool_requester',
+        out=strings.languagetool_matches
+    ):
+        ProcessorNode.__init__(self, name=name, out=out)
+
+    def _process(self, **kwargs):
+        document = kwargs.get('document')
+        input_key = kwargs.get('input_key')
+
+        if not kwargs.get('languagetool'):
+            return None
+
+        cleaned_text = document.get(input_key)
+
+        if cleaned_text is None:
+            raise TextProcessingException.missing_key(input_key)
+
+        return self.tools.languagetool.check_async(cleaned_text)
 
 
 class PredicatePatternsMatcher(ProcessorNode):
@@ -148,10 +305,24 @@ class PredicatePatternsMatcher(ProcessorNode):
     ):
         ProcessorNode.__init__(self, name=name, out=out)
 
+    def options(self, **kwargs):
+        return {
+            'resolve_relcl': True,  # relative clauses
+            'resolve_appos': True,  # appositional modifiers
+            'resolve_amod': True,   # adjectival modifiers
+            'resolve_conj': True,   # conjuction
+            'resolve_poss': True,   # possessives
+            'ud': dep_v1.VERSION    # the version of UD
+        }
+
     def _get_pred_patterns(self, sentences, opts):
         pred_patt = []
 
         for sentence in sentences:
+            # Not parsed at the constituency level
+            if sentence is None:
+                continue
+
             pp = PredPatt.from_constituency(str(sentence), opts=opts, cacheable=False)
 
             for predicate in pp.instances:
@@ -162,25 +333,11 @@ class PredicatePatternsMatcher(ProcessorNode):
 
         return pred_patt
 
-    @caching(['attrs', 'name'])
     def _process(self, **kwargs):
         document = kwargs.get('document')
         input_key = kwargs.get('input_key')
 
-        resolve_relcl = True    # relative clauses
-        resolve_appos = True    # appositional modifiers
-        resolve_amod = True     # adjectival modifiers
-        resolve_conj = True     # conjuction
-        resolve_poss = True     # possessives
-        ud = dep_v1.VERSION     # the version of UD
-        opts = PredPattOpts(
-            resolve_relcl=resolve_relcl,
-            resolve_appos=resolve_appos,
-            resolve_amod=resolve_amod,
-            resolve_conj=resolve_conj,
-            resolve_poss=resolve_poss,
-            ud=ud
-        )
+        opts = PredPattOpts(**self.options())
         parse_tree = document.get(input_key)
 
         if parse_tree is None:
@@ -194,7 +351,6 @@ class Stemmer(ProcessorNode):
     def __init__(self, name='stemmer', out=strings.stems):
         ProcessorNode.__init__(self, name=name, out=out)
 
-    @caching(['attrs', 'name'])
     def _process(self, **kwargs):
         document = kwargs.get('document')
         input_key = kwargs.get('input_key')
@@ -218,6 +374,7 @@ class Stemmer(ProcessorNode):
 text_cleaner = TextCleaner()
 citation_remover = CitationRemover()
 sentence_tokenizer = SentenceTokenizer()
+languagetool_requester = LanguageToolRequester()
 parser = Parser()
 predicate_patterns_matcher = PredicatePatternsMatcher()
 stemmer = Stemmer()
@@ -227,8 +384,9 @@ stemmer = Stemmer()
 # =============================================
 
 default_graph = {
-    text_cleaner: [parser],
-    citation_remover: [parser],
+    text_cleaner: [languagetool_requester, parser],
+    citation_remover: [languagetool_requester, parser],
+    languagetool_requester: [],
     parser: [predicate_patterns_matcher, stemmer],
     predicate_patterns_matcher: [],
     stemmer: []
@@ -1,26 +1,321 @@
 """Provides text processing routines."""
 
-import copy
+import threading
+import time
 from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from types import MappingProxyType
+
+from django.conf import settings
 
 from .document import Document
 from .processing_graphs import ProcessorNode
+from lti_app.artifacts import artifact_key
+from lti_app.caching import get_hash
 from lti_app.core.exceptions import TextProcessingException
+from lti_app.metrics import Metrics
+
+
+def critical_path(timings, predecessors):
+    """Get the longest chain of dependent nodes of a run.
+
+    Args:
+        timings (dict): Mapping of node name to its `duration`.
+        predecessors (dict): Mapping of node name to the names of the
+            nodes it depends on.
+
+    Returns:
+        tuple: The node names along the path and its duration.
+    """
+
+    paths = {}
+
+    def longest(name):
+        if name not in paths:
+            chains = [longest(pred) for pred in predecessors.get(name, [])]
+            names, duration = max(chains, key=lambda c: c[1], default=([], 0.0))
+            paths[name] = (names + [name], duration + timings[name]['duration'])
+
+        return paths[name]
+
+    return max(
+        (longest(name) for name in timings),
+        key=lambda c: c[1],
+        default=([], 0.0)
+    )
+
+
+def output_digest(data, input_digest, processor, options):
+    """Get the digest identifying the output of a processor.
+
+    Texts are identified by their content, so that e.g. two raw texts
+    cleaned into the same text share the artefacts derived from it. Other
+    outputs are identified like artefacts, by the processor (its name,
+    version and options) and its inputs.
+
+    Args:
+        data (any): The output.
+        input_digest (str): The digest of the processor inputs.
+        processor (ProcessorNode): The processor.
+        options (dict): The options of the run (see
+            `ProcessorNode.options`).
+
+    Returns:
+        str: The digest.
+    """
+
+    if type(data) is str:
+        return get_hash(data)
+
+    return artifact_key(
+        input_digest,
+        processor.attrs.get('name'),
+        processor.version,
+        options
+    )
+
+
+def get_inputs(plan, document, processor):
+    """Get the inputs of a processor whose predecessors are done.
+
+    Returns:
+        tuple: The digest of the inputs and the `input_key` or `inputs`
+            keyword argument of the processor.
+    """
+
+    declared = plan.inputs.get(processor)
+
+    if declared is None:
+        input_key = plan.input_keys[processor]
+        return document.digests[input_key], {'input_key': input_key}
+
+    input_digest = get_hash(''.join(
+        name + ':' + document.digests[key] + ';'
+        for name, key in declared
+    ))
+    inputs = {name: document.get(key) for name, key in declared}
+
+    return input_digest, {'inputs': inputs}
+
+
+class ProcessingPlan:
+    """An immutable execution plan of a processing graph.
+
+    The plan holds the processors reachable from the root in topological
+    order, with their predecessors, successors and input keys. Edges into
+    the root are ignored, like the root, every processor runs once.
+
+    A processor reads the output of the predecessor which reached it
+    first (its input key), unless it declares named inputs with the
+    `inputs` attribute (a mapping of names to document keys). It then
+    also depends on the reachable processors producing those keys.
+
+    Args:
+        processing_graph (dict): The processing graph.
+        graph_root (ProcessorNode): The graph root.
+
+    Raises:
+        TextProcessingException: If a processor has the wrong type or the
+            reachable processors form a cycle.
+    """
+
+    def __init__(self, processing_graph, graph_root):
+        if graph_root not in processing_graph:
+            raise TextProcessingException.invalid_graph()
+
+        # Visit all reachable processors in the graph
+        reachable = [graph_root]
+        marked = {graph_root}
+        predecessors = {graph_root: []}
+        queue = deque([graph_root])
+
+        while len(queue) != 0:
+            processor = queue.popleft()
+
+            if not isinstance(processor, ProcessorNode):
+                raise TextProcessingException.invalid_processor_type(ProcessorNode)
+
+            for next_processor in processing_graph.get(processor, []):
+                if next_processor == graph_root:
+                    continue
+
+                predecessors.setdefault(next_processor, []).append(processor)
+
+                if next_processor not in marked:
+                    marked.add(next_processor)
+                    reachable.append(next_processor)
+                    queue.append(next_processor)
+
+        # Depend on the producers of the declared inputs
+        producers = {}
+        inputs = {}
+
+        for processor in reachable:
+            producers.setdefault(processor.attrs.get('out'), []).append(processor)
+
+        for processor in reachable[1:]:
+            declared = processor.attrs.get('inputs')
+
+            if not declared:
+                continue
+
+            inputs[processor] = tuple(sorted(declared.items()))
+
+            for name, key in inputs[processor]:
+                if key not in producers:
+                    raise TextProcessingException.missing_key(key)
+
+                for producer in producers[key]:
+                    if producer not in predecessors[processor]:
+                        predecessors[processor].append(producer)
+
+        successors = {processor: [] for processor in reachable}
+
+        for processor in reachable:
+            for predecessor in predecessors[processor]:
+                successors[predecessor].append(processor)
+
+        # Sort the processors topologically
+        waiting = {
+            processor: len(predecessors[processor])
+            for processor in reachable
+        }
+        order = []
+        queue = deque([graph_root])
+
+        while len(queue) != 0:
+            processor = queue.popleft()
+            order.append(processor)
+
+            for next_processor in successors[processor]:
+                waiting[next_processor] -= 1
+
+                if waiting[next_processor] == 0:
+                    queue.append(next_processor)
+
+        if len(order) != len(reachable):
+            raise TextProcessingException.invalid_graph()
+
+        self.root = graph_root
+        self.order = tuple(order)
+        self.predecessors = MappingProxyType({
+            processor: tuple(preds)
+            for processor, preds in predecessors.items()
+        })
+        self.successors = MappingProxyType({
+            processor: tuple(targets)
+            for processor, targets in successors.items()
+        })
+        self.inputs = MappingProxyType(inputs)
+        self.producers = MappingProxyType({
+            key: tuple(processors)
+            for key, processors in producers.items()
+        })
+
+        # The input of a processor is the output of the predecessor
+        # which reached it first
+        self.input_keys = MappingProxyType({
+            processor: preds[0].attrs.get('out')
+            for processor, preds in predecessors.items()
+            if len(preds) > 0
+        })
+
+    def __len__(self):
+        return len(self.order)
+
+    def required(self, keys):
+        """Get the processors needed to produce some document keys.
+
+        Args:
+            keys (iterable of str): The keys. Keys which no processor
+                produces are ignored.
+
+        Returns:
+            frozenset: The producers of the keys and their ancestors.
+        """
+
+        required = set()
+        stack = [
+            producer
+            for key in keys
+            for producer in self.producers.get(key, ())
+        ]
+
+        while len(stack) != 0:
+            processor = stack.pop()
+
+            if processor not in required:
+                required.add(processor)
+                stack.extend(self.predecessors[processor])
+
+        return frozenset(required)
+
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def compile_plan(processing_graph, graph_root):
+    """Get the plan of a shared processing graph.
+
+    Plans are compiled once per process and graph. The graph must not
+    be modified afterwards.
+
+    Args:
+        processing_graph (dict): The processing graph.
+        graph_root (ProcessorNode): The graph root.
+
+    Returns:
+        ProcessingPlan: The plan.
+    """
+
+    key = (id(processing_graph), graph_root)
+    entry = _plans.get(key)
+
+    # Keeping the graph alive guarantees that its id is not reused
+    if entry is not None and entry[0] is processing_graph:
+        return entry[1]
+
+    with _plans_lock:
+        plan = ProcessingPlan(processing_graph, graph_root)
+        _plans[key] = (processing_graph, plan)
+
+    return plan
 
 
 class TextProcessor:
     """Implements a text processor using the graph pattern.
 
+    The nodes reachable from the root run on a thread pool as soon as all
+    of their predecessors are done, so independent nodes (e.g. the parser
+    and the LanguageTool requester) overlap. The outputs are merged into
+    the document by the calling thread.
+
+    The processing graph is shared and its plan compiled once per
+    process. The first change made through the processor (e.g.
+    `add_processor`) gives it a private copy of the graph.
+
     Args:
         processing_graph (dict):
             The processing graph to use.
         graph_root (ProcessorNode):
             The graph root on which to start processing.
+        max_workers (int, optional): Defaults to None. The number of
+            nodes run at the same time. If None the configured number
+            is used.
     """
 
-    def __init__(self, processing_graph, graph_root):
-        self.graph = copy.deepcopy(processing_graph)
+    def __init__(self, processing_graph, graph_root, max_workers=None):
+        self.graph = processing_graph
         self.graph_root = graph_root
+        self.owns_graph = False
+        self.plans = {}
+        self.max_workers = (
+            max_workers
+            or settings.TEXT_PROCESSING.get('MAX_WORKERS', 1)
+        )
+        self.metrics = Metrics()
 
         if self.graph_root not in self.graph:
             raise TextProcessingException.invalid_graph()
@@ -38,6 +333,7 @@ class TextProcessor:
         if not isinstance(key, ProcessorNode):
             raise TypeError()
 
+        self._own_graph()
         self.graph[key] = value
 
     def __contains__(self, item):
@@ -46,17 +342,43 @@ class TextProcessor:
     def __len__(self):
         return len(self.graph)
 
-    def _process(self, document, processor, **kwargs):
-        out_key = processor.attrs.get('out')
+    def _own_graph(self):
+        # Copy on write, the shared graph is never modified
+        if not self.owns_graph:
+            self.graph = {
+                node: list(targets)
+                for node, targets in self.graph.items()
+            }
+            self.owns_graph = True
 
-        if not isinstance(processor, ProcessorNode):
-            raise TextProcessingException.invalid_processor_type(ProcessorNode)
+        self.plans.clear()
 
+    def _process(self, document, processor, **kwargs):
+        started_at = time.perf_counter()
         data = processor.process(
             document=document,
             **kwargs
         )
-        document.put(out_key, data)
+
+        return data, started_at, time.perf_counter()
+
+    def get_plan(self):
+        """Get the plan for the current graph and root.
+
+        Returns:
+            ProcessingPlan: The plan.
+        """
+
+        if not self.owns_graph:
+            return compile_plan(self.graph, self.graph_root)
+
+        plan = self.plans.get(self.graph_root)
+
+        if plan is None:
+            plan = ProcessingPlan(self.graph, self.graph_root)
+            self.plans[self.graph_root] = plan
+
+        return plan
 
     def add_processor(self, node):
         if node in self.graph:
@@ -65,12 +387,14 @@ class TextProcessor:
         if not isinstance(node, ProcessorNode):
             raise TextProcessingException.invalid_processor_type(ProcessorNode)
 
+        self._own_graph()
         self.graph[node] = []
 
     def remove_processor(self, node):
         if node not in self.graph:
             return
 
+        self._own_graph()
         self.graph.pop(node, None)
 
         for source, targets in self.graph.items():
@@ -84,41 +408,216 @@ class TextProcessor:
         if target in self.graph[source]:
             return
 
+        self._own_graph()
         self.graph[source].append(target)
 
-    def run(self, text, **kwargs):
+    def _materialise(self, document, plan, processor, started_at, kwargs):
+        # Compute (lazily) the inputs first
+        for predecessor in plan.predecessors[processor]:
+            document.get(predecessor.attrs.get('out'))
+
+        input_digest, inputs = get_inputs(plan, document, processor)
+        data, node_started_at, node_ended_at = self._process(
+            document,
+            processor,
+            input_digest=input_digest,
+            **inputs,
+            **kwargs
+        )
+        self._record(
+            document,
+            processor,
+            data,
+            input_digest,
+            node_started_at - started_at,
+            node_ended_at - started_at,
+            kwargs
+        )
+
+        return data
+
+    def _record(self, document, processor, data, input_digest, start, end, kwargs):
+        name = processor.attrs.get('name')
+
+        document.digests[processor.attrs.get('out')] = output_digest(
+            data,
+            input_digest,
+            processor,
+            processor.options(**kwargs)
+        )
+        document.timings[name] = {
+            'start': start,
+            'end': end,
+            'duration': end - start
+        }
+        self.metrics.observe('text_processing.' + name, end - start)
+
+    def run(self, text, eager_keys=None, **kwargs):
         """Run the processor.
 
+        The digest of every output is stored in `document.digests`, the
+        wall time of every node in `document.timings` and the longest
+        chain of dependent nodes in `document.critical_path`.
+
+        If `eager_keys` is given, only the processors needed for those
+        keys run now. The outputs of the others are lazy document
+        entities, computed the first time they are requested.
+
         Args:
             text (str): The raw text to process.
+            eager_keys (iterable of str, optional): Defaults to None. The
+                keys to compute now. If None all the keys are computed.
+
+        Raises:
+            TextProcessingException: If the reachable processors form a
+                cycle.
 
         Returns:
             Document: The processed document.
         """
 
+        plan = self.get_plan()
         document = Document(text)
-        marked = []
-        queue = deque()
-
-        # Root processing
-        self._process(document, self.graph_root, **kwargs)
-        queue.append(self.graph_root)
-        marked.append(self.graph_root)
 
-        # Visit all reachable processors in the graph
-        while len(queue) != 0:
-            processor = queue.popleft()
-
-            for next_processor in self.graph.get(processor):
-                if next_processor not in marked:
-                    self._process(
+        if eager_keys is None:
+            eager = frozenset(plan.order)
+        else:
+            eager = plan.required(eager_keys) | {plan.root}
+
+        waiting = {
+            processor: len(plan.predecessors[processor])
+            for processor in plan.order
+        }
+        input_digests = {}
+        started_at = time.perf_counter()
+        futures = {}
+
+        for processor in plan.order:
+            if processor not in eager:
+                document.put_lazy(
+                    processor.attrs.get('out'),
+                    partial(self._materialise, document, plan, processor, started_at, kwargs)
+                )
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def submit(processor, input_digest, **extra):
+                input_digests[processor] = input_digest
+                future = executor.submit(
+                    self._process,
+                    document,
+                    processor,
+                    input_digest=input_digest,
+                    **extra,
+                    **kwargs
+                )
+                futures[future] = processor
+
+            # Root processing
+            submit(plan.root, get_hash(text))
+
+            while len(futures) != 0:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    processor = futures.pop(future)
+                    data, node_started_at, node_ended_at = future.result()
+
+                    document.put(processor.attrs.get('out'), data)
+                    self._record(
                         document,
-                        next_processor,
-                        input_key=processor.attrs.get('out'),
-                        **kwargs
+                        processor,
+                        data,
+                        input_digests[processor],
+                        node_started_at - started_at,
+                        node_ended_at - started_at,
+                        kwargs
                     )
 
-                    marked.append(next_processor)
-                    queue.append(next_processor)
+                    # Run the processors whose inputs are all ready
+                    for next_processor in plan.successors[processor]:
+                        waiting[next_processor] -= 1
+
+                        if waiting[next_processor] == 0 and next_processor in eager:
+                            input_digest, inputs = get_inputs(
+                                plan,
+                                document,
+                                next_processor
+                            )
+                            submit(next_processor, input_digest, **inputs)
+
+        # The critical path of the eager processing
+        self._set_critical_path(document, plan)
 
         return document
+
+    def run_many(self, texts, eager_keys=None, text_kwargs=None, **kwargs):
+        """Run the processor on a batch of texts.
+
+        The root runs first for every text. Then, in plan order, each
+        processor prefetches for the whole batch (see
+        `ProcessorNode.prefetch`) before running for every document, so
+        that for example the sentences of all the texts are parsed in
+        batched requests.
+
+        Args:
+            texts (list of str): The raw texts to process.
+            eager_keys (iterable of str, optional): Defaults to None. See
+                `run`.
+            text_kwargs (list of dict, optional): Defaults to None. The
+                keyword arguments specific to each text.
+
+        Raises:
+            TextProcessingException: If the reachable processors form a
+                cycle.
+
+        Returns:
+            list of Document: The processed documents.
+        """
+
+        plan = self.get_plan()
+
+        if eager_keys is None:
+            eager = frozenset(plan.order)
+        else:
+            eager = plan.required(eager_keys)
+
+        if text_kwargs is None:
+            text_kwargs = [{}] * len(texts)
+
+        # Only the root runs now, the other processors are lazy
+        documents = [
+            self.run(text, eager_keys=[], **{**kwargs, **extra})
+            for text, extra in zip(texts, text_kwargs)
+        ]
+
+        for processor in plan.order:
+            if processor == plan.root or processor not in eager:
+                continue
+
+            batch = []
+
+            for document in documents:
+                for predecessor in plan.predecessors[processor]:
+                    document.get(predecessor.attrs.get('out'))
+
+                _, inputs = get_inputs(plan, document, processor)
+                batch.append({'document': document, **inputs})
+
+            processor.prefetch(batch, **kwargs)
+
+            for document in documents:
+                document.get(processor.attrs.get('out'))
+
+        for document in documents:
+            self._set_critical_path(document, plan)
+
+        return documents
+
+    def _set_critical_path(self, document, plan):
+        document.critical_path = critical_path(document.timings, {
+            processor.attrs.get('name'): [
+                predecessor.attrs.get('name')
+                for predecessor in plan.predecessors[processor]
+            ]
+            for processor in plan.order
+        })
@@ -0,0 +1,521 @@
+"""Provides the pooled HTTP transport used by the API clients.
+
+Every process keeps one transport per endpoint. A transport owns a
+keep-alive connection pool, applies connect/read timeouts, retries
+failed connections with exponential backoff and trips a circuit breaker
+when the remote service keeps failing, so that callers fail fast instead
+of waiting on a saturated or restarting server.
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from lti_app.core.exceptions import ApiException
+from lti_app.metrics import Metrics
+
+
+class CircuitBreaker:
+    """Implements the circuit breaker pattern.
+
+    The breaker is `closed` while the service works. After
+    `failure_threshold` consecutive failures it opens and rejects requests
+    for `reset_timeout` seconds. Then it becomes `half_open` and lets a
+    single trial request through: a success closes the breaker again,
+    a failure re-opens it.
+
+    Args:
+        failure_threshold (int): Consecutive failures before opening.
+        reset_timeout (float): Seconds to wait before a trial request.
+    """
+
+    closed = 'closed'
+    open = 'open'
+    half_open = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._state = self.closed
+
+    def _refresh(self):
+        if (
+            self._state == self.open
+            and time.monotonic() - self.opened_at >= self.reset_timeout
+        ):
+            self._state = self.half_open
+            self.trial_in_flight = False
+
+    @property
+    def state(self):
+        with self.lock:
+            self._refresh()
+            return self._state
+
+    def is_available(self):
+        """Check whether a request would currently be let through.
+
+        Returns:
+            bool: True if the breaker is closed or ready for a trial.
+        """
+
+        with self.lock:
+            self._refresh()
+
+            return (
+                self._state == self.closed
+                or (self._state == self.half_open and not self.trial_in_flight)
+            )
+
+    def allow_request(self):
+        """Ask permission to send a request.
+
+        Returns:
+            bool: Whether the request can be sent.
+        """
+
+        with self.lock:
+            self._refresh()
+
+            if self._state == self.closed:
+                return True
+
+            if self._state == self.half_open and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self._state = self.closed
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+
+            if (
+                self._state == self.half_open
+                or self.failures >= self.failure_threshold
+            ):
+                self._state = self.open
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+
+
+def _make_retry(max_retries, backoff_factor):
+    options = {
+        'total': max_retries,
+        'connect': max_retries,
+        # A read timeout means the server is busy with the request,
+        # sending it again would only add to the load.
+        'read': False,
+        'status': max_retries,
+        'status_forcelist': (502, 503, 504),
+        'backoff_factor': backoff_factor,
+        'raise_on_status': False
+    }
+
+    # Annotation requests are idempotent so POST can be retried as well
+    # (urllib3 1.26 renamed `method_whitelist` to `allowed_methods`).
+    if hasattr(Retry, 'DEFAULT_ALLOWED_METHODS'):
+        options['allowed_methods'] = False
+    else:
+        options['method_whitelist'] = False
+
+    return Retry(**options)
+
+
+class HttpTransport:
+    """A pooled, keep-alive HTTP transport for a single endpoint.
+
+    Args:
+        endpoint (str): The base URL of the service.
+        connect_timeout (float): Seconds to wait for a connection.
+        read_timeout (float): Seconds to wait for the response.
+        max_retries (int): Retries for connection errors and 502-504s.
+        backoff_factor (float): The exponential backoff factor.
+        pool_maxsize (int): The maximum number of pooled connections.
+        failure_threshold (int): Consecutive failures before the
+            circuit breaker opens.
+        reset_timeout (float): Seconds before the circuit breaker
+            lets a trial request through.
+    """
+
+    def __init__(
+        self,
+        endpoint,
+        connect_timeout=2.0,
+        read_timeout=20.0,
+        max_retries=2,
+        backoff_factor=0.5,
+        pool_maxsize=10,
+        failure_threshold=5,
+        reset_timeout=30.0
+    ):
+        self.endpoint = endpoint
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_maxsize = pool_maxsize
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.metrics = Metrics()
+        self.lock = threading.Lock()
+        self.outstanding = 0
+
+        self.adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=_make_retry(max_retries, backoff_factor)
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+    def acquire(self):
+        """Mark a request as outstanding."""
+
+        with self.lock:
+            self.outstanding += 1
+
+    def release(self):
+        """Mark an outstanding request as completed."""
+
+        with self.lock:
+            self.outstanding -= 1
+
+    def request(self, method, path='', **kwargs):
+        """Send a request through the pool.
+
+        Args:
+            method (str): The HTTP method.
+            path (str, optional): Defaults to ''. Appended to the endpoint.
+            **kwargs: Passed to `requests.Session.request`.
+
+        Raises:
+            ApiException: If the circuit is open or the service failed.
+
+        Returns:
+            requests.Response: The HTTP response.
+        """
+
+        self.acquire()
+
+        try:
+            return self.send(method, path, **kwargs)
+        finally:
+            self.release()
+
+    def send(self, method, path='', **kwargs):
+        """Send a request without tracking it as outstanding.
+
+        See `request` for the arguments.
+        """
+
+        if not self.breaker.allow_request():
+            self.metrics.increment('transport.rejected')
+            raise ApiException.circuit_open(self.endpoint)
+
+        kwargs.setdefault('timeout', self.timeout)
+        started_at = time.monotonic()
+
+        try:
+            response = self.session.request(
+                method,
+                self.endpoint + path,
+                **kwargs
+            )
+        except requests.ConnectionError:
+            self.breaker.record_failure()
+            self.metrics.increment('transport.failures')
+            raise ApiException.connection_failed(self.endpoint)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            self.metrics.increment('transport.failures')
+            raise ApiException.service_unavailable(self.endpoint)
+
+        self.metrics.observe(
+            'transport.latency',
+            time.monotonic() - started_at
+        )
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            self.metrics.increment('transport.failures')
+            raise ApiException.service_unavailable(self.endpoint)
+
+        self.breaker.record_success()
+
+        return response
+
+    def post(self, path='', **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def get(self, path='', **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def stats(self):
+        """Get the pool and circuit breaker statistics.
+
+        Pool hits are requests served by an already open connection,
+        misses are requests which had to open a new one.
+
+        Returns:
+            dict: The statistics.
+        """
+
+        requests_count = 0
+        connections_count = 0
+        idle_connections = 0
+        pools = self.adapter.poolmanager.pools
+
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+
+            if pool is None:
+                continue
+
+            requests_count += pool.num_requests
+            connections_count += pool.num_connections
+            idle_connections += pool.pool.qsize() if pool.pool else 0
+
+        return {
+            'outstanding': self.outstanding,
+            'pool_maxsize': self.pool_maxsize,
+            'pool_idle': idle_connections,
+            'pool_hits': requests_count - connections_count,
+            'pool_misses': connections_count,
+            'breaker_state': self.breaker.state,
+            'breaker_failures': self.breaker.failures
+        }
+
+
+class LoadBalancer:
+    """Spreads requests over several endpoints of the same service.
+
+    Each request goes to the available endpoint with the fewest
+    outstanding requests (ties are broken randomly so that separate
+    processes do not all pick the same endpoint). An endpoint whose
+    circuit breaker is open is ejected until the breaker lets a trial
+    request through; a successful trial re-admits it. If an endpoint
+    cannot be reached or is ejected while the request is routed,
+    the request fails over to the next candidate.
+
+    Args:
+        endpoints (list of str): The base URLs of the service.
+        **options: The `HttpTransport` options.
+    """
+
+    failover_codes = ['API_CIRCUIT_OPEN', 'API_CONNECTION_FAILED']
+
+    def __init__(self, endpoints, **options):
+        self.endpoints = endpoints
+        self.options = options
+
+    def _choose(self, transports, tried):
+        with _selection_lock:
+            candidates = [
+                transport
+                for transport in transports
+                if transport not in tried and transport.breaker.is_available()
+            ]
+
+            if len(candidates) == 0:
+                return None
+
+            random.shuffle(candidates)
+            transport = min(candidates, key=lambda t: t.outstanding)
+            transport.acquire()
+
+            return transport
+
+    def request(self, method, path='', **kwargs):
+        """Send a request to the least loaded available endpoint.
+
+        See `HttpTransport.request` for the arguments.
+        """
+
+        transports = [
+            get_transport(endpoint, **self.options)
+            for endpoint in self.endpoints
+        ]
+        tried = []
+        last_exception = None
+
+        while True:
+            transport = self._choose(transports, tried)
+
+            if transport is None:
+                if last_exception is not None:
+                    raise last_exception
+
+                raise ApiException.no_endpoint_available(self.endpoints)
+
+            try:
+                return transport.send(method, path, **kwargs)
+            except ApiException as e:
+                if e.code not in self.failover_codes:
+                    raise
+
+                Metrics().increment('transport.failovers')
+                tried.append(transport)
+                last_exception = e
+            finally:
+                transport.release()
+
+    def post(self, path='', **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def get(self, path='', **kwargs):
+        return self.request('GET', path, **kwargs)
+
+
+# Per-process Registry
+# =============================================
+
+_transports = {}
+_transports_lock = threading.Lock()
+_selection_lock = threading.Lock()
+_executors = {}
+_executors_lock = threading.Lock()
+
+# The number of requests to the NLP services a process can have in
+# flight in the background
+async_workers = 8
+
+
+def get_transport(endpoint, **options):
+    """Get the transport of the current process for an endpoint.
+
+    Transports are keyed by process ID so that a forked child never
+    shares pooled sockets with its parent. The RQ worker runs the jobs in
+    its own process (see the `RQ` setting), so they all share its pools.
+
+    Args:
+        endpoint (str): The base URL of the service.
+        **options: The `HttpTransport` options used on creation.
+
+    Returns:
+        HttpTransport: The transport.
+    """
+
+    key = (os.getpid(), endpoint)
+    transport = _transports.get(key)
+
+    if transport is not None:
+        return transport
+
+    with _transports_lock:
+        transport = _transports.get(key)
+
+        if transport is None:
+            for stale_key in [k for k in _transports if k[0] != key[0]]:
+                _transports.pop(stale_key, None)
+
+            transport = HttpTransport(endpoint, **options)
+            _transports[key] = transport
+
+    return transport
+
+
+def get_executor():
+    """Get the I/O thread pool of the current process.
+
+    Like the transports, the pool is keyed by process ID since the
+    threads of a parent process do not survive a fork.
+
+    Returns:
+        ThreadPoolExecutor: The thread pool.
+    """
+
+    pid = os.getpid()
+    executor = _executors.get(pid)
+
+    if executor is not None:
+        return executor
+
+    with _executors_lock:
+        executor = _executors.get(pid)
+
+        if executor is None:
+            for stale_pid in [p for p in _executors if p != pid]:
+                _executors.pop(stale_pid, None)
+
+            executor = ThreadPoolExecutor(
+                max_workers=async_workers,
+                thread_name_prefix='transport'
+            )
+            _executors[pid] = executor
+
+    return executor
+
+
+def submit(func, *args, **kwargs):
+    """Run a blocking call on the I/O thread pool.
+
+    Args:
+        func (callable): The call, usually an API client method.
+        *args: Passed to `func`.
+        **kwargs: Passed to `func`.
+
+    Returns:
+        concurrent.futures.Future: The future result of the call.
+    """
+
+    return get_executor().submit(func, *args, **kwargs)
+
+
+def get_options(config):
+    """Get the transport options from a service settings dictionary.
+
+    Args:
+        config (dict): E.g. `settings.STANFORD_CORENLP`.
+
+    Returns:
+        dict: The `HttpTransport` options.
+    """
+
+    keys = {
+        'CONNECT_TIMEOUT': 'connect_timeout',
+        'READ_TIMEOUT': 'read_timeout',
+        'MAX_RETRIES': 'max_retries',
+        'BACKOFF_FACTOR': 'backoff_factor',
+        'POOL_MAXSIZE': 'pool_maxsize',
+        'BREAKER_THRESHOLD': 'failure_threshold',
+        'BREAKER_RESET_TIMEOUT': 'reset_timeout'
+    }
+
+    return {
+        option: config[key]
+        for key, option in keys.items()
+        if key in config
+    }
+
+
+def get_stats():
+    """Get the statistics of the transports in the current process.
+
+    Returns:
+        dict: Mapping of endpoint to transport statistics.
+    """
+
+    pid = os.getpid()
+
+    return {
+        endpoint: transport.stats()
+        for (transport_pid, endpoint), transport in list(_transports.items())
+        if transport_pid == pid
+    }
+
+
+Metrics().register('transports', get_stats)
@@ -0,0 +1,33 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lti_app.core import synonyms
+
+
+class Command(BaseCommand):
+    help = 'Build the precomputed WordNet synonym index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default=None)
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Build the index even if it exists.'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory'] or settings.SYNONYM_INDEX['DIRECTORY']
+        exists = all(
+            os.path.exists(os.path.join(directory, filename))
+            for filename in synonyms.filenames
+        )
+
+        if exists and not options['force']:
+            self.stdout.write('The synonym index already exists')
+            return
+
+        count = synonyms.build_index(directory)
+
+        self.stdout.write(self.style.SUCCESS('Indexed {} lemmas'.format(count)))
@@ -0,0 +1,29 @@
+import django_rq
+from django.core.management.base import BaseCommand
+
+from lti_app.assignments import services
+
+
+class Command(BaseCommand):
+    help = 'Warm the cached entries of every assignment in the background.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--invalidate',
+            action='store_true',
+            help='Move every assignment to a new cache generation first.'
+        )
+
+    def handle(self, *args, **options):
+        service = services.AssignmentService()
+
+        if options['invalidate']:
+            service.invalidate()
+
+        count = 0
+
+        for assignment in service.repository.get_all(enable_cache=False):
+            django_rq.enqueue(service.warm, assignment.id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS('Enqueued {} assignments'.format(count)))
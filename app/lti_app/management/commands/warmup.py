@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lti_app.core import readiness
+from lti_app.core.exceptions import ApiException
+
+
+class Command(BaseCommand):
+    help = 'Warm up the NLP services and wait until they are ready.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=float, default=None)
+        parser.add_argument('--timeout', type=float, default=None)
+        parser.add_argument('--interval', type=float, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            report = readiness.wait_until_ready(
+                budget=options['budget'],
+                timeout=options['timeout'],
+                interval=options['interval']
+            )
+        except ApiException as e:
+            raise CommandError(str(e))
+
+        for name, result in sorted(report['probes'].items()):
+            self.stdout.write('{0}: {1:.2f}s'.format(name, result['duration']))
+
+        self.stdout.write(self.style.SUCCESS('Ready after {:.2f}s'.format(report['waited'])))
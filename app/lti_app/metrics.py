@@ -0,0 +1,247 @@
+"""Provides in-process metrics for monitoring."""
+
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from rq import get_current_job
+
+from lti_app.helpers import Singleton
+
+
+reports_key = 'metrics_reports'
+
+
+class Metrics(metaclass=Singleton):
+    """Thread-safe registry of counters, gauges, timings and histograms.
+
+    Metrics live in the memory of the current process. Collectors can be
+    registered to compute values lazily whenever a snapshot is taken.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.timings = {}
+        self.histograms = {}
+        self.collectors = {}
+
+    def __deepcopy__(self, memo):
+        # The registry is process-wide (and holds a lock), copies share it
+        return self
+
+    def __reduce__(self):
+        # Unpickled (e.g. in an RQ worker) as the registry of that process
+        return (Metrics, ())
+
+    def increment(self, name, value=1):
+        """Increment a counter.
+
+        Args:
+            name (str): The counter name.
+            value (int, optional): Defaults to 1. The increment.
+        """
+
+        with self.lock:
+            self.counters[name] += value
+
+    def gauge(self, name, value):
+        """Set a gauge to the given value.
+
+        Args:
+            name (str): The gauge name.
+            value (any): The current value.
+        """
+
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        """Record an observation (e.g. a duration in seconds).
+
+        Args:
+            name (str): The timing name.
+            value (float): The observed value.
+        """
+
+        with self.lock:
+            timing = self.timings.get(name)
+
+            if timing is None:
+                timing = {'count': 0, 'total': 0.0, 'min': value, 'max': value}
+                self.timings[name] = timing
+
+            timing['count'] += 1
+            timing['total'] += value
+            timing['min'] = min(timing['min'], value)
+            timing['max'] = max(timing['max'], value)
+
+    def histogram(self, name, value, bounds):
+        """Count an observation in the bucket of its upper bound.
+
+        Args:
+            name (str): The histogram name.
+            value (float): The observed value.
+            bounds (list of float): The sorted upper bounds of the buckets.
+                Larger values are counted in the `inf` bucket.
+        """
+
+        bucket = next(
+            (str(bound) for bound in bounds if value <= bound),
+            'inf'
+        )
+
+        with self.lock:
+            histogram = self.histograms.get(name)
+
+            if histogram is None:
+                histogram = {
+                    'count': 0,
+                    'total': 0,
+                    'buckets': {
+                        str(bound): 0
+                        for bound in list(bounds) + ['inf']
+                    }
+                }
+                self.histograms[name] = histogram
+
+            histogram['count'] += 1
+            histogram['total'] += value
+            histogram['buckets'][bucket] += 1
+
+    def register(self, name, collector):
+        """Register a collector evaluated on every snapshot.
+
+        Args:
+            name (str): The key under which the collected data is reported.
+            collector (callable): A function with no arguments.
+        """
+
+        with self.lock:
+            self.collectors[name] = collector
+
+    def snapshot(self):
+        """Take a snapshot of all the metrics.
+
+        Returns:
+            dict: The counters, gauges, timings, histograms and collected
+                data.
+        """
+
+        with self.lock:
+            data = {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'timings': {
+                    name: dict(timing)
+                    for name, timing in self.timings.items()
+                },
+                'histograms': {
+                    name: {**histogram, 'buckets': dict(histogram['buckets'])}
+                    for name, histogram in self.histograms.items()
+                }
+            }
+            collectors = list(self.collectors.items())
+
+        for name, collector in collectors:
+            data[name] = collector()
+
+        return data
+
+    def reset(self):
+        """Reset counters, gauges, timings and histograms (collectors are
+        kept)."""
+
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.timings.clear()
+            self.histograms.clear()
+
+
+def counters_delta(before, after):
+    """Get the counters which changed between two snapshots.
+
+    Args:
+        before (dict): The earlier counters.
+        after (dict): The later counters.
+
+    Returns:
+        dict: Mapping of the changed counters to their increments.
+    """
+
+    return {
+        name: value - before.get(name, 0)
+        for name, value in after.items()
+        if value != before.get(name, 0)
+    }
+
+
+def hit_ratio(counters, prefix):
+    """Get the hit ratio given `<prefix>.hits` and `<prefix>.misses` counters.
+
+    Returns:
+        float: The ratio or None if there were no lookups.
+    """
+
+    hits = counters.get(prefix + '.hits', 0)
+    misses = counters.get(prefix + '.misses', 0)
+
+    if hits + misses == 0:
+        return None
+
+    return hits / (hits + misses)
+
+
+def report_to_job(key, value):
+    """Store a value in the meta data of the current RQ job (if any).
+
+    Args:
+        key (str): The meta data key.
+        value (any): The value.
+    """
+
+    job = get_current_job()
+
+    if job is None:
+        return
+
+    job.meta[key] = value
+    job.save_meta()
+
+
+def publish():
+    """Publish the metrics of the current process to the cache.
+
+    The web process does no NLP requests, so the monitoring endpoint
+    reads the metrics the workers publish after their jobs. A report
+    published at the same time by another process can be lost until
+    that process publishes again.
+    """
+
+    now = time.time()
+    max_age = settings.MONITORING['REPORT_MAX_AGE']
+    reports = {
+        name: report
+        for name, report in (cache.get(reports_key) or {}).items()
+        if now - report['published_at'] <= max_age
+    }
+    name = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+    reports[name] = {**Metrics().snapshot(), 'published_at': now}
+    cache.set(reports_key, reports, None)
+
+
+def get_reports():
+    """Get the metrics the processes published.
+
+    Returns:
+        dict: Mapping of `<hostname>:<pid>` to the metrics snapshot of
+            that process.
+    """
+
+    return cache.get(reports_key) or {}
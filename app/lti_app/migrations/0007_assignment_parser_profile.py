@@ -0,0 +1,18 @@
+# Generated by Django 2.0.6 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lti_app', '0006_auto_20180829_1100'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='parser_profile',
+            field=models.CharField(choices=[('fast', 'Fast (shift-reduce)'), ('accurate', 'Accurate (PCFG)')], max_length=20, null=True),
+        ),
+    ]
@@ -11,6 +11,11 @@ TYPES = (
     ('G', 'Graded')
 )
 
+PARSER_PROFILES = (
+    ('fast', 'Fast (shift-reduce)'),
+    ('accurate', 'Accurate (PCFG)')
+)
+
 
 class Assignment(models.Model):
     course_id = models.CharField(max_length=20)
@@ -37,5 +42,12 @@ class Assignment(models.Model):
     academic_style_check = models.BooleanField(default=True)
     semantics_check = models.IntegerField(default=1)
 
+    # Text processing
+    parser_profile = models.CharField(
+        max_length=20,
+        choices=PARSER_PROFILES,
+        null=True
+    )
+
     def __str__(self):
         return self.course_id + ':' + self.assignment_id
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+
+urlpatterns = [
+    path('', views.index, name='monitoring_index'),
+    path('ready/', views.ready, name='monitoring_ready'),
+]
@@ -0,0 +1,68 @@
+import hmac
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponseForbidden, JsonResponse
+from django.views.decorators.http import require_GET
+
+from lti_app import metrics
+from lti_app.core import readiness
+
+
+def require_token(view):
+    """Only let requests with the monitoring token through.
+
+    The token is sent in the `Authorization: Token <token>` header. If no
+    token is configured every request is rejected.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = settings.MONITORING['TOKEN']
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+
+        if not token or not hmac.compare_digest(
+            header.encode(),
+            ('Token ' + token).encode()
+        ):
+            return HttpResponseForbidden()
+
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@require_GET
+@require_token
+def index(request):
+    """Expose the metrics the worker processes published.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: The metrics snapshots, by process.
+    """
+
+    return JsonResponse(metrics.get_reports())
+
+
+@require_GET
+@require_token
+def ready(request):
+    """Expose the latest readiness report of the NLP services.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: The report, with status 503 unless the services
+            are ready.
+    """
+
+    report = readiness.get_report()
+
+    if report is None:
+        return JsonResponse({'ready': False}, status=503)
+
+    return JsonResponse(report, status=200 if report['ready'] else 503)
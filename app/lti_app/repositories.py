@@ -1,29 +1,268 @@
 """Provides base repository classes."""
 
-from .caching import caching, Cache
+import json
+
+from django.db.models.signals import post_delete, post_save
+
+from .caching import (
+    bump_generation,
+    from_cache,
+    get_generations,
+    get_hash,
+    save_cache,
+    Cache
+)
+
+
+def invalidate(model, model_id=None):
+    """Invalidate the cached rows and lookups of a model.
+
+    Args:
+        model (Model): The model class.
+        model_id (int, optional): Defaults to None. The primary key of the
+            row to invalidate. If None every row is invalidated.
+    """
+
+    name = model.__name__
+
+    if model_id is None:
+        bump_generation(name)
+    else:
+        bump_generation(name + '_queries')
+        bump_generation('{0}_{1}'.format(name, model_id))
+
+
+def _on_save(sender, instance, **kwargs):
+    invalidate(sender, instance.pk)
 
 
 class CrudRepository:
+    """A repository caching the rows of a model.
+
+    Rows are cached as compact snapshots (the values of their concrete
+    fields), read back as model instances without querying the database.
+    Lookups (`get_by`) cache the primary keys of the matching rows, whose
+    missing snapshots are then fetched in a single query.
+
+    The cached entries belong to cache generations (see
+    `lti_app.caching.get_generations`):
+    - every entry to the generation of the model;
+    - the lookups to the generation of the model queries;
+    - the snapshot of a row to the generation of the row.
+    Saving (or deleting) a row, `create` and `update` bump the generation
+    of the row and of the queries, so that a write never leaves stale
+    entries behind.
+
+    Args:
+        model (Model): The model class.
+    """
+
     def __init__(self, model):
         self.model = model
-        self.cache = Cache(enabled=True, base_key='query_{}_'.format(self.model.__name__))
+        self.generation = model.__name__
+        self.fields = [field.attname for field in model._meta.concrete_fields]
 
-    @caching('get_all')
-    def get_all(self, enable_cache=True):
-        return self.model.objects.all()
+        # Snapshots of another schema are never read
+        schema = get_hash(json.dumps(self.fields))[:8]
+
+        self.cache = Cache(
+            enabled=True,
+            base_key='rows_{0}_{1}_'.format(self.generation, schema),
+            namespace='rows_{}'.format(self.generation)
+        )
+        self.lookups = Cache(
+            enabled=True,
+            base_key='lookups_{}_'.format(self.generation),
+            namespace='lookups_{}'.format(self.generation),
+            generations=[self.generation, self.generation + '_queries']
+        )
+
+        for signal in (post_save, post_delete):
+            signal.connect(
+                _on_save,
+                sender=model,
+                weak=False,
+                dispatch_uid='repository_' + self.generation
+            )
+
+    def _row_generation(self, model_id):
+        return '{0}_{1}'.format(self.generation, model_id)
+
+    def get_generation(self, model_id):
+        """Get the generation of a row.
+
+        Args:
+            model_id (int): The primary key.
+
+        Returns:
+            str: The generation, changed by any write of the row and by
+                `invalidate`.
+        """
+
+        return '_'.join(
+            str(generation)
+            for generation in get_generations([
+                self.generation,
+                self._row_generation(model_id)
+            ])
+        )
+
+    def invalidate(self, model_id=None):
+        """Invalidate the cached entries of the model.
+
+        Args:
+            model_id (int, optional): Defaults to None. The primary key of
+                the row to invalidate. If None every row is invalidated.
+        """
+
+        invalidate(self.model, model_id)
+
+    # Snapshots
+    # =============================================
+
+    def _snapshot(self, obj):
+        return tuple(getattr(obj, field) for field in self.fields)
+
+    def _from_snapshot(self, snapshot):
+        return self.model.from_db(None, self.fields, snapshot)
+
+    def _get_row_keys(self, ids, fresh=False):
+        generations = get_generations(
+            [self.generation] + [self._row_generation(id) for id in ids],
+            fresh
+        )
+
+        return {
+            '{0}_{1}_{2}'.format(generations[0], generation, id): id
+            for id, generation in zip(ids, generations[1:])
+        }
+
+    def _cache_rows(self, rows, row_keys):
+        # The keys are built before the rows are read, so that a write in
+        # between moves the stale snapshots to a past generation
+        snapshots = {row.pk: self._snapshot(row) for row in rows}
+
+        self.cache.put_many({
+            key: snapshots[id]
+            for key, id in row_keys.items()
+            if id in snapshots
+        })
+
+    # Queries
+    # =============================================
+
+    def get_many(self, ids, enable_cache=True):
+        """Get rows by primary key.
+
+        The rows missing from the cache are fetched in a single query.
+
+        Args:
+            ids (list of int): The primary keys.
+            enable_cache (bool, optional): Defaults to True. Whether to
+                read and save the cache.
+
+        Returns:
+            dict: Mapping of the primary keys found to the model instances.
+        """
+
+        ids = list(dict.fromkeys(ids))
+
+        if not enable_cache or not self.cache.enabled:
+            return {
+                row.pk: row
+                for row in self.model.objects.filter(pk__in=ids)
+            }
+
+        row_keys = self._get_row_keys(ids)
+        rows = {
+            row_keys[key]: self._from_snapshot(snapshot)
+            for key, snapshot in self.cache.get_many(list(row_keys)).items()
+        }
+        missing = [id for id in ids if id not in rows]
+
+        if len(missing) != 0:
+            fetched = list(self.model.objects.filter(pk__in=missing))
+            self._cache_rows(fetched, row_keys)
+            rows.update((row.pk, row) for row in fetched)
+
+        return rows
 
-    @caching('get_by_id_{}', 0)
     def get_by_id(self, id, enable_cache=True):
-        return self.model.objects.get(pk=id)
+        row = self.get_many([id], enable_cache).get(id)
+
+        if row is None:
+            raise self.model.DoesNotExist(
+                '{0} matching query does not exist.'.format(self.generation)
+            )
+
+        return row
 
-    @caching('get_by_{}', 0)
     def get_by(self, fields, enable_cache=True):
-        return self.model.objects.all().filter(**fields)
+        """Get the rows matching the given field values.
+
+        Args:
+            fields (dict): The field values.
+            enable_cache (bool, optional): Defaults to True. Whether to
+                read and save the cache.
+
+        Returns:
+            list of Model: The matching rows, ordered by primary key.
+        """
+
+        if not enable_cache or not self.lookups.enabled:
+            return list(self.model.objects.filter(**fields).order_by('pk'))
+
+        generations = get_generations(self.lookups.generations)
+        key = self.lookups.get_key(
+            json.dumps(fields, sort_keys=True, default=str),
+            generations
+        )
+        ids = from_cache(key, self.lookups.namespace)
+
+        if ids is None:
+            rows = list(self.model.objects.filter(**fields).order_by('pk'))
+
+            # Any write of the rows bumps the generation of the queries: if
+            # it did not change since the lookup key was built, the rows
+            # read are not older than their keys
+            row_keys = self._get_row_keys([row.pk for row in rows], fresh=True)
+
+            if get_generations(self.lookups.generations, fresh=True) == generations:
+                self._cache_rows(rows, row_keys)
+                save_cache(key, [row.pk for row in rows], self.lookups.namespace)
+
+            return rows
+
+        rows = self.get_many(ids)
+
+        return [rows[id] for id in ids if id in rows]
+
+    def get_first_by(self, fields, enable_cache=True):
+        """Get the first row matching the given field values.
+
+        See `get_by` for the arguments.
+
+        Returns:
+            Model: The first matching row or None if there is none.
+        """
+
+        rows = self.get_by(fields, enable_cache)
+
+        return rows[0] if len(rows) != 0 else None
+
+    def get_all(self, enable_cache=True):
+        return self.get_by({}, enable_cache)
+
+    # Writes
+    # =============================================
 
     def create(self, fields):
+        # Invalidated by the post_save signal
         obj = self.model(**fields)
         obj.save()
         return obj
 
     def update(self, model_id, fields):
+        # Bulk updates send no post_save signal
         self.model.objects.filter(id=model_id).update(**fields)
+        self.invalidate(model_id)
@@ -2,6 +2,7 @@ from .exceptions import BaseLtiException
 
 
 class BaseRequestForm:
+    choices_str = 'choices'
     default_str = 'default'
     get_str = 'get'
     required_str = 'required'
@@ -43,6 +44,14 @@ class BaseRequestForm:
         if self._is_falsy(value) and schema.get(self.required_str):
             self.errors.append(error_message.format(name))
 
+    def _assert_choice(self, name, value, schema):
+        error_message = 'The field {} must be one of: {}.'
+
+        choices = schema.get(self.choices_str)
+
+        if choices is not None and not self._is_falsy(value) and value not in choices:
+            self.errors.append(error_message.format(name, ', '.join(choices)))
+
     def _assert_type(self, name, value, schema):
         error_message = 'The field {} is not of type {}.'
 
@@ -80,6 +89,7 @@ class BaseRequestForm:
 
         self._assert_required(name, value, schema)
         self._assert_type(name, value, schema)
+        self._assert_choice(name, value, schema)
 
         if get is not None and callable(get):
             data[name] = get(name, value, self.form_data)
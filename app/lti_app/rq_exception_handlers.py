@@ -1,5 +1,11 @@
 import django_rq
 
+from lti_app import metrics
+
+
+def publish_metrics(job, *exc_info):
+    metrics.publish()
+    return True
 
 def inflate_exception(job, exc_type, exc_value, traceback):
     job.meta['exception'] = exc_value
@@ -9,6 +9,7 @@ semantics_check = 'semantics_check'
 # Text processing
 # =============================================
 cleaned_text = 'cleaned_text'
+languagetool_matches = 'languagetool_matches'
 stems = 'stems'
 parse_data = 'parse_data'
 constituencies = 'constituencies'
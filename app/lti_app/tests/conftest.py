@@ -1,6 +1,7 @@
 import os
 
 import django
+import pytest
 from django.conf import settings
 
 
@@ -9,4 +10,19 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scriba.settings.local')
 
 def pytest_configure():
     settings.DEBUG = False
+
+    # The repository tests create their tables, no server is needed
+    settings.DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+    }
     django.setup()
+
+
+@pytest.fixture(autouse=True)
+def clear_local_caches():
+    # The local cache outlives the cache settings overridden by a test
+    from lti_app import caching
+
+    yield
+    caching._local_caches.clear()
+    caching._generations.clear()
@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+import pytest
+
+from lti_app.core.exceptions import TextProcessingException
+from lti_app.core.semantics_checker import Checker, match_greedy, match_optimal
+
+
+# Utility/Global Entities
+# =============================================
+
+def legacy_greedy(matrix):
+    # The pairing of the semantics checker before the similarity matrix
+    pairs = []
+    rows = list(range(matrix.shape[0]))
+    columns = list(range(matrix.shape[1]))
+
+    while len(rows) > 0 and len(columns) > 0:
+        results = [(i, j, matrix[i, j]) for i in rows for j in columns]
+        best_pair = max(results, key=lambda item: item[2])
+        pairs.append(best_pair[:2])
+        rows.remove(best_pair[0])
+        columns.remove(best_pair[1])
+
+    return pairs
+
+
+def total(matrix, pairs):
+    return sum(matrix[i, j] for i, j in pairs)
+
+
+# Data Providers
+# =============================================
+
+def random_matrices():
+    generator = random.Random(1)
+
+    # Rounded like the predicate similarities, so that there are ties
+    return [
+        np.round(np.array([
+            [generator.choice([0, 0.25, 0.33, 0.5, 1]) for _ in range(columns)]
+            for _ in range(rows)
+        ]).reshape(rows, columns), 2)
+        for rows, columns in [(0, 3), (1, 1), (3, 5), (6, 2), (8, 8), (20, 15)]
+    ]
+
+
+# Tests
+# =============================================
+
+@pytest.mark.parametrize('matrix', random_matrices())
+def test_matching(matrix):
+    greedy_pairs = match_greedy(matrix)
+    optimal_pairs = match_optimal(matrix)
+
+    # Greedy matching is unchanged, ties included
+    assert greedy_pairs == legacy_greedy(matrix)
+
+    assert len(optimal_pairs) == len(greedy_pairs) == min(matrix.shape)
+    assert len(set(i for i, _ in optimal_pairs)) == len(optimal_pairs)
+    assert len(set(j for _, j in optimal_pairs)) == len(optimal_pairs)
+    assert total(matrix, optimal_pairs) >= total(matrix, greedy_pairs) - 1e-9
+
+
+def test_optimal_matching():
+    matrix = np.array([
+        [0.9, 0.8],
+        [0.8, 0.1]
+    ])
+
+    assert total(matrix, match_greedy(matrix)) == pytest.approx(1.0)
+    assert total(matrix, match_optimal(matrix)) == pytest.approx(1.6)
+
+
+def test_invalid_matching():
+    with pytest.raises(TextProcessingException) as exc_info:
+        Checker(None, None, None, matching='unknown')
+    assert exc_info.value.code == 'TXT_INVALID_MATCHING_STRATEGY'
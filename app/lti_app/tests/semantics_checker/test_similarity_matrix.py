@@ -0,0 +1,117 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from django.test import override_settings
+
+from lti_app.core import synonyms
+from lti_app.core.semantics_checker import Checker, PredicateFeatures, similarity_matrix
+from lti_app.core.text_processing.tools import Tools
+from ..utils import FakeWordNet
+
+
+# Utility/Global Entities
+# =============================================
+
+@pytest.fixture
+def wordnet(monkeypatch, tmpdir):
+    monkeypatch.setattr(synonyms, 'wn', FakeWordNet())
+    monkeypatch.setattr(synonyms, '_index', None)
+    synonyms.get_groups.cache_clear()
+
+    with override_settings(SYNONYM_INDEX={'DIRECTORY': str(tmpdir)}):
+        yield
+
+    synonyms.get_groups.cache_clear()
+
+
+def token(text, gov_rel=None):
+    return SimpleNamespace(text=text, gov_rel=gov_rel)
+
+
+def predicate(target, gov_rel, args, negated=False):
+    root = token(target, gov_rel)
+    tokens = [root, token('not')] if negated else [root]
+
+    return {
+        'target': SimpleNamespace(root=root, tokens=tokens),
+        'args': [SimpleNamespace(root=token(text, rel)) for text, rel in args]
+    }
+
+
+def tuple_similarity(d1, d2):
+    checker = Checker.__new__(Checker)
+    checker.tools = Tools()
+
+    return checker._tuple_similarity(d1, d2)
+
+
+# Data Providers
+# =============================================
+
+def random_predicates(generator, count):
+    words = ['car', 'auto', 'drive', 'drives', 'ride', 'pupil', 'students', 'student', 'tree', 'excerpt']
+    relations = ['root', 'ccomp', 'xcomp']
+    arg_relations = ['nsubj', 'nsubjpass', 'dobj']
+
+    return [
+        predicate(
+            generator.choice(words),
+            generator.choice(relations),
+            [
+                (generator.choice(words), generator.choice(arg_relations))
+                for _ in range(generator.randint(0, 3))
+            ],
+            negated=generator.random() < 0.2
+        )
+        for _ in range(count)
+    ]
+
+
+# Tests
+# =============================================
+
+def test_similarity_matrix(wordnet):
+    generator = random.Random(1)
+    stemmer = Tools().stemmer
+
+    for count1, count2 in [(0, 4), (1, 1), (5, 7), (30, 20)]:
+        pred_args1 = random_predicates(generator, count1)
+        pred_args2 = random_predicates(generator, count2)
+
+        matrix = similarity_matrix(
+            PredicateFeatures(pred_args1, stemmer),
+            PredicateFeatures(pred_args2, stemmer)
+        )
+        expected = np.array([
+            [tuple_similarity(d1, d2) for d2 in pred_args2]
+            for d1 in pred_args1
+        ]).reshape(count1, count2)
+
+        # Same weights, normalisation and rounding as the pairwise similarity
+        np.testing.assert_array_equal(matrix, expected)
+
+
+def test_similarity_weights(wordnet):
+    stemmer = Tools().stemmer
+    pred_args1 = [
+        predicate('drives', 'root', [('pupil', 'nsubj'), ('car', 'dobj')]),
+        predicate('drive', 'root', [], negated=True)
+    ]
+    pred_args2 = [
+        predicate('ride', 'root', [('students', 'nsubj'), ('auto', 'dobj')]),
+        predicate('ride', 'ccomp', [('tree', 'nsubj')])
+    ]
+
+    matrix = similarity_matrix(
+        PredicateFeatures(pred_args1, stemmer),
+        PredicateFeatures(pred_args2, stemmer)
+    )
+
+    # Synonym targets with the same relation and two shared arguments
+    assert matrix[0, 0] == pytest.approx(round((1.2 + 2) / (1.2 + 4), 2))
+    # A different relation, no shared argument
+    assert matrix[0, 1] == pytest.approx(round(1.05 / (1.05 + 2), 2))
+    # A negation mismatch
+    assert matrix[1, 0] == 0
@@ -0,0 +1,276 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.test import override_settings
+
+from lti_app.core import transport
+from lti_app.core.api import CoreNlpClient, LanguageToolClient
+from lti_app.core.exceptions import ApiException
+from lti_app.core.transport import CircuitBreaker, HttpTransport, LoadBalancer
+from .utils import StubServer
+
+
+# Utility/Global Entities
+# =============================================
+
+@pytest.fixture(autouse=True)
+def clear_transports():
+    # Stub ports get reused, do not inherit the transports of other tests
+    yield
+    transport._transports.clear()
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def _stub_server(**kwargs):
+        server = StubServer(**kwargs).start()
+        servers.append(server)
+        return server
+
+    yield _stub_server
+
+    for server in servers:
+        server.stop()
+
+
+def run_concurrently(client, num_requests, num_threads):
+    started_at = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        results = list(executor.map(
+            lambda _: client.run('Some text.', ['tokenize']),
+            range(num_requests)
+        ))
+
+    return results, time.monotonic() - started_at
+
+
+# Tests
+# =============================================
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+    # Closed
+    # ---------------------------------------------
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.closed
+    assert breaker.allow_request()
+
+    # Open
+    # ---------------------------------------------
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.open
+    assert not breaker.allow_request()
+
+    # Half-open: a single trial request
+    # ---------------------------------------------
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.half_open
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # Failed trial re-opens the breaker
+    # ---------------------------------------------
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.open
+
+    # Successful trial closes the breaker
+    # ---------------------------------------------
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.closed
+
+
+def test_transport_reuses_connections(stub_server):
+    server = stub_server(body=b'{"sentences": []}')
+    transport = HttpTransport(server.endpoint)
+
+    for _ in range(5):
+        response = transport.post(data=b'text')
+        assert response.json() == {'sentences': []}
+
+    stats = transport.stats()
+
+    assert server.requests == 5
+    assert stats['pool_misses'] == 1
+    assert stats['pool_hits'] == 4
+    assert stats['breaker_state'] == CircuitBreaker.closed
+
+
+def test_clients_share_transports(stub_server):
+    server = stub_server(body=b'{"sentences": []}')
+
+    # Like the jobs run one after the other by a worker process
+    for _ in range(2):
+        CoreNlpClient(backends=[server.endpoint]).run('Some text.', ['tokenize'])
+
+    shared = transport.get_transport(server.endpoint)
+
+    assert server.requests == 2
+    assert shared.stats()['pool_misses'] == 1
+    assert shared.stats()['pool_hits'] == 1
+
+
+def test_transport_circuit_breaking(stub_server):
+    server = stub_server(delay=0.2)
+    transport = HttpTransport(
+        server.endpoint,
+        read_timeout=0.05,
+        failure_threshold=2,
+        reset_timeout=60
+    )
+
+    for _ in range(2):
+        with pytest.raises(ApiException) as exc_info:
+            transport.post(data=b'text')
+        assert exc_info.value.code == 'API_SERVICE_UNAVAILABLE'
+
+    # Fail fast without reaching the server
+    # ---------------------------------------------
+    with pytest.raises(ApiException) as exc_info:
+        transport.post(data=b'text')
+
+    assert exc_info.value.code == 'API_CIRCUIT_OPEN'
+    assert server.requests == 2
+    assert transport.stats()['breaker_state'] == CircuitBreaker.open
+
+
+def test_transport_server_error(stub_server):
+    server = stub_server(status=500)
+    transport = HttpTransport(server.endpoint, max_retries=0)
+
+    with pytest.raises(ApiException) as exc_info:
+        transport.post(data=b'text')
+
+    assert exc_info.value.code == 'API_SERVICE_UNAVAILABLE'
+    assert transport.stats()['breaker_failures'] == 1
+
+
+def test_load_balancer_spreads_requests(stub_server):
+    # Each stub, like a saturated CoreNLP server, serves one request at a time
+    single = stub_server(body=b'{"sentences": []}', delay=0.05, concurrency=1)
+    servers = [
+        stub_server(body=b'{"sentences": []}', delay=0.05, concurrency=1)
+        for _ in range(3)
+    ]
+
+    # All the requests queue on a single backend
+    # ---------------------------------------------
+    _, single_duration = run_concurrently(
+        CoreNlpClient(backends=[single.endpoint]),
+        num_requests=12,
+        num_threads=6
+    )
+
+    assert single.requests == 12
+    assert single.max_outstanding > 2
+
+    # The fewest outstanding requests: with 6 in flight, a backend never
+    # gets a third one while another has less than 2
+    # ---------------------------------------------
+    results, multi_duration = run_concurrently(
+        CoreNlpClient(backends=[server.endpoint for server in servers]),
+        num_requests=12,
+        num_threads=6
+    )
+
+    assert results == [{'sentences': []}] * 12
+    assert sum(server.requests for server in servers) == 12
+    assert all(server.requests > 0 for server in servers)
+    assert all(server.max_outstanding <= 2 for server in servers)
+
+    # The throughput scales with the backends (0.6s of serial work on a
+    # single backend, 0.2s on each of three)
+    # ---------------------------------------------
+    assert multi_duration < single_duration / 2
+
+
+def test_load_balancer_ejects_and_readmits(stub_server):
+    healthy = stub_server(body=b'{}')
+    unhealthy = stub_server(status=500)
+    balancer = LoadBalancer(
+        [healthy.endpoint, unhealthy.endpoint],
+        max_retries=0,
+        failure_threshold=1,
+        reset_timeout=0.5
+    )
+
+    # Eject the failing backend
+    # ---------------------------------------------
+    for _ in range(20):
+        try:
+            balancer.post(data=b'text')
+        except ApiException:
+            break
+
+    assert unhealthy.requests == 1
+
+    for _ in range(3):
+        balancer.post(data=b'text')
+
+    assert unhealthy.requests == 1
+
+    # Re-admit it after recovery
+    # ---------------------------------------------
+    unhealthy.status = 200
+    time.sleep(0.6)
+
+    for _ in range(20):
+        balancer.post(data=b'text')
+
+    assert unhealthy.requests > 2
+
+
+def test_load_balancer_failover(stub_server):
+    healthy = stub_server(body=b'{}')
+    down = stub_server()
+    down.stop()
+    balancer = LoadBalancer([down.endpoint, healthy.endpoint], max_retries=0)
+
+    for _ in range(5):
+        assert balancer.post(data=b'text').json() == {}
+
+    assert healthy.requests == 5
+
+    # No backend left
+    # ---------------------------------------------
+    down = stub_server()
+    down.stop()
+    balancer = LoadBalancer([down.endpoint], max_retries=0, failure_threshold=1)
+
+    with pytest.raises(ApiException) as exc_info:
+        balancer.post(data=b'text')
+    assert exc_info.value.code == 'API_CONNECTION_FAILED'
+
+    with pytest.raises(ApiException) as exc_info:
+        balancer.post(data=b'text')
+    assert exc_info.value.code == 'API_NO_ENDPOINT_AVAILABLE'
+
+
+def test_async_requests_overlap(stub_server):
+    corenlp = stub_server(body=b'{"sentences": []}', delay=0.2)
+    languagetool = stub_server(body=b'{"matches": [{"offset": 0}]}', delay=0.2)
+    host, port = languagetool.server.server_address
+
+    with override_settings(LANGUAGETOOL={'HOST': host, 'PORT': port}):
+        languagetool_client = LanguageToolClient()
+
+    future = languagetool_client.check_async('Some text.')
+    parse = CoreNlpClient(backends=[corenlp.endpoint]).run('Some text.', ['parse'])
+    matches = future.result()
+
+    assert parse == {'sentences': []}
+    assert matches == [{'offset': 0}]
+
+    # Each request was served while the other one was
+    # ---------------------------------------------
+    [(corenlp_start, corenlp_end)] = corenlp.intervals
+    [(languagetool_start, languagetool_end)] = languagetool.intervals
+
+    assert corenlp_start < languagetool_end
+    assert languagetool_start < corenlp_end
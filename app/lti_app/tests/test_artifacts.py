@@ -0,0 +1,222 @@
+import copy
+import os
+import pickle
+import time
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+
+from lti_app.artifacts import (
+    ArtifactStore,
+    CacheBackend,
+    DiskBackend,
+    MemoryBackend,
+    artifact_key,
+    get_store
+)
+from lti_app.caching import CachingException, decode_value, get_local_cache
+from lti_app.core.text_processing.processing_graphs import (
+    Parser,
+    ProcessorNode,
+    text_cleaner
+)
+from lti_app.core.text_processing.processors import TextProcessor
+
+
+# Utility/Global Entities
+# =============================================
+
+class WordCounter(ProcessorNode):
+    def __init__(self, name='word_counter', out='word_count'):
+        ProcessorNode.__init__(self, name=name, out=out)
+        self.calls = 0
+
+    def options(self, **kwargs):
+        return {'separator': kwargs.get('separator', ' ')}
+
+    def _process(self, **kwargs):
+        document = kwargs.get('document')
+        input_key = kwargs.get('input_key')
+        separator = self.options(**kwargs)['separator']
+        self.calls += 1
+
+        return {'count': len(document.get(input_key).split(separator))}
+
+
+def memory_settings(**config):
+    return override_settings(ARTIFACTS={
+        'BACKEND': 'memory',
+        'DIRECTORY': None,
+        'MAX_ITEM_SIZE': 1000,
+        'MAX_SIZE': 10000,
+        'TIMEOUT': None,
+        **config
+    })
+
+
+# Tests
+# =============================================
+
+def test_artifact_key():
+    key = artifact_key('digest', 'parser', 1, {'parse_level': 'tokens'})
+
+    assert key == artifact_key('digest', 'parser', 1, {'parse_level': 'tokens'})
+    assert key != artifact_key('other', 'parser', 1, {'parse_level': 'tokens'})
+    assert key != artifact_key('digest', 'stemmer', 1, {'parse_level': 'tokens'})
+    assert key != artifact_key('digest', 'parser', 2, {'parse_level': 'tokens'})
+    assert key != artifact_key('digest', 'parser', 1, {'parse_level': 'dependencies'})
+
+
+def test_size_limits(tmpdir):
+    # Least recently used entries are evicted
+    # ---------------------------------------------
+    backend = MemoryBackend(max_size=10)
+    backend.set('a', b'12345')
+    backend.set('b', b'12345')
+    backend.get('a')
+    backend.set('c', b'12345')
+
+    assert backend.get('a') == b'12345'
+    assert backend.get('b') is None
+    assert backend.size == 10
+
+    backend = DiskBackend(str(tmpdir), max_size=10)
+    backend.set('a', b'12345')
+    backend.set('b', b'12345')
+    os.utime(str(tmpdir.join('a')), (0, 0))
+
+    assert backend.set('c', b'12345') == 1
+    assert backend.get('a') is None
+    assert backend.get('b') == b'12345'
+    assert sorted(os.listdir(str(tmpdir))) == ['b', 'c']
+
+    # Large artefacts are not stored
+    # ---------------------------------------------
+    store = ArtifactStore(MemoryBackend(max_size=1000), max_item_size=100)
+
+    assert store.put('small', [1, 2, 3])
+    assert store.get('small') == [1, 2, 3]
+    assert not store.put('large', 'x' * 200)
+    assert store.get('large') is None
+
+
+def test_cache_backend():
+    with override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }):
+        store = ArtifactStore(CacheBackend(timeout=None), max_item_size=1000)
+
+        assert store.put('key', [1, 2, 3])
+
+        # The artefacts are pickled once
+        # ---------------------------------------------
+        data = decode_value(cache.get('artifact_key'), pickled=True)
+        assert pickle.loads(data) == [1, 2, 3]
+
+        # They are served by the local cache first
+        # ---------------------------------------------
+        cache.clear()
+        assert store.get('key') == [1, 2, 3]
+
+        get_local_cache().clear()
+        assert store.get('key') is None
+
+
+def test_get_or_compute(tmpdir):
+    single_flight = {
+        'ENABLED': True,
+        'LEASE_TIMEOUT': 60,
+        'WAIT_TIMEOUT': 1,
+        'INTERVAL': 0.01,
+        'MAX_INTERVAL': 0.05
+    }
+
+    with override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        },
+        SINGLE_FLIGHT=single_flight
+    ):
+        # Other workers never see the artefacts of a process, they do not
+        # wait for them
+        # ---------------------------------------------
+        store = ArtifactStore(MemoryBackend(max_size=1000), max_item_size=100)
+        cache.add('lease_artifact_small', 'other worker')
+        started_at = time.monotonic()
+
+        assert store.get_or_compute('small', lambda: [1, 2, 3]) == [1, 2, 3]
+        assert time.monotonic() - started_at < single_flight['WAIT_TIMEOUT']
+        assert store.get('small') == [1, 2, 3]
+
+        # Nor do they wait for artefacts too large to be stored
+        # ---------------------------------------------
+        store = ArtifactStore(DiskBackend(str(tmpdir), 1000), max_item_size=100)
+
+        assert store.get_or_compute('large', lambda: 'x' * 200) == 'x' * 200
+        assert store.get('large') is None
+        assert cache.get('lease_' + store.coalescing_key('large')) is not None
+
+        started_at = time.monotonic()
+
+        assert store.get_or_compute('large', lambda: 'y' * 200) == 'y' * 200
+        assert time.monotonic() - started_at < single_flight['WAIT_TIMEOUT']
+
+        # Nor do they wait for the disk artefacts of another host
+        # ---------------------------------------------
+        cache.add('lease_artifact_small', 'worker of another host')
+        started_at = time.monotonic()
+
+        assert store.get_or_compute('small', lambda: [1, 2, 3]) == [1, 2, 3]
+        assert time.monotonic() - started_at < single_flight['WAIT_TIMEOUT']
+        assert store.get('small') == [1, 2, 3]
+
+def test_node_artifacts():
+    word_counter = WordCounter()
+    graph = {text_cleaner: [word_counter], word_counter: []}
+    text_processor = TextProcessor(graph, text_cleaner)
+
+    with memory_settings():
+        document = text_processor.run('Some  text.', enable_cache=True)
+
+        assert document.get('word_count') == {'count': 2}
+
+        # Shared by the texts cleaned into the same text
+        # ---------------------------------------------
+        text_processor.run(' Some text. ', enable_cache=True)
+        assert word_counter.calls == 1
+
+        # Not shared across options and versions
+        # ---------------------------------------------
+        text_processor.run('Some text.', enable_cache=True, separator='.')
+        assert word_counter.calls == 2
+
+        word_counter.version = 2
+        text_processor.run('Some text.', enable_cache=True)
+        assert word_counter.calls == 3
+
+        # No lookup when caching is disabled
+        # ---------------------------------------------
+        text_processor.run('Some text.', enable_cache=False)
+        assert word_counter.calls == 4
+
+    with memory_settings(BACKEND='unknown'):
+        with pytest.raises(CachingException) as exc_info:
+            get_store()
+        assert exc_info.value.code == 'CCH_INVALID_BACKEND'
+
+
+def test_parser_options():
+    parser = Parser()
+    options = parser.options(parser_profile='fast')
+    profiles = copy.deepcopy(settings.STANFORD_CORENLP['PARSER_PROFILES'])
+    profiles['fast']['properties']['parse.maxlen'] = '50'
+
+    # The artefacts follow the definition of the profile
+    # ---------------------------------------------
+    with override_settings(STANFORD_CORENLP={
+        **settings.STANFORD_CORENLP,
+        'PARSER_PROFILES': profiles
+    }):
+        assert parser.options(parser_profile='fast') != options
@@ -0,0 +1,265 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+
+from lti_app import caching as caching_module
+from lti_app.caching import Cache, LocalCache, bump_generation, caching, coalesce
+from lti_app.metrics import Metrics
+
+
+# Utility/Global Entities
+# =============================================
+
+class Squarer:
+    def __init__(self, enabled, namespace='squarer', generations=None):
+        self.cache = Cache(
+            enabled=enabled,
+            base_key='squarer_',
+            namespace=namespace,
+            generations=generations
+        )
+        self.calls = 0
+
+    @caching('square_{}', 0)
+    def square(self, number, enable_cache=True):
+        self.calls += 1
+        return [number * number]
+
+
+@pytest.fixture
+def locmem_cache():
+    with override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        },
+        LOCAL_CACHE={'MAX_SIZE': 10000, 'TTL': 60, 'GENERATION_TTL': 60}
+    ):
+        yield
+
+
+def get_counter(name):
+    return Metrics().counters.get(name, 0)
+
+
+# Tests
+# =============================================
+
+def test_local_cache():
+    local_cache = LocalCache(max_size=100, ttl=0.1)
+    local_cache.set('a', 'x' * 20)
+    local_cache.set('b', 'y' * 20)
+
+    # Values are copies
+    # ---------------------------------------------
+    value = [1, 2]
+    local_cache.set('c', value)
+    value.append(3)
+    assert local_cache.get('c') == [1, 2]
+
+    # Least recently used entries are evicted
+    # ---------------------------------------------
+    local_cache.get('a')
+    local_cache.set('d', 'z' * 40)
+
+    assert local_cache.get('a') == 'x' * 20
+    assert local_cache.get('b') is None
+    assert local_cache.size <= 100
+
+    # Entries expire
+    # ---------------------------------------------
+    time.sleep(0.15)
+    assert local_cache.get('a') is None
+
+
+def test_two_tiers(locmem_cache):
+    squarer = Squarer(enabled=True)
+    local_hits = get_counter('cache.squarer.local_hits')
+    hits = get_counter('cache.squarer.hits')
+    misses = get_counter('cache.squarer.misses')
+
+    assert squarer.square(3) == [9]
+    assert squarer.square(3) == [9]
+    assert squarer.calls == 1
+    assert get_counter('cache.squarer.misses') == misses + 1
+    assert get_counter('cache.squarer.local_hits') == local_hits + 1
+
+    # Other processes read the shared cache first, the value is kept
+    # pickled as read
+    # ---------------------------------------------
+    caching_module._local_caches.clear()
+
+    with patch.object(caching_module.pickle, 'dumps', side_effect=AssertionError('Pickled again')):
+        assert squarer.square(3) == [9]
+
+    assert squarer.calls == 1
+    assert get_counter('cache.squarer.hits') == hits + 1
+
+    caching_module._local_caches.clear()
+
+    with patch.object(caching_module.pickle, 'dumps', side_effect=AssertionError('Pickled again')):
+        assert squarer.cache.get_many(['square_3']) == {'square_3': [9]}
+
+
+def test_disabled_cache(locmem_cache, monkeypatch):
+    def fail(*args):
+        raise AssertionError('Cache looked up')
+
+    monkeypatch.setattr(caching_module, 'from_cache', fail)
+    monkeypatch.setattr(caching_module, 'save_cache', fail)
+
+    # No lookup at all when disabled
+    # ---------------------------------------------
+    squarer = Squarer(enabled=False)
+    assert squarer.square(2) == [4]
+
+    squarer = Squarer(enabled=True)
+    assert squarer.square(2, enable_cache=False) == [4]
+    assert squarer.calls == 1
+
+
+def test_large_values(locmem_cache):
+    text = 'The students paraphrase the excerpt. ' * 2000
+    value = {'text': text, 'words': text.split()}
+
+    with override_settings(CACHE_VALUES={
+        'COMPRESS_THRESHOLD': 1024,
+        'COMPRESS_LEVEL': 6,
+        'CHUNK_SIZE': 100
+    }):
+        caching_module.store_values({'key': value, 'small': [1]}, namespace='large')
+
+        # Compressed and split in chunks
+        # ---------------------------------------------
+        manifest = cache.get('key')
+        chunk_keys = json.loads(manifest[len(caching_module.manifest_prefix):].decode('utf-8'))
+        encoded, size = caching_module.encode_value(value)
+
+        assert len(chunk_keys) > 1
+        assert len(encoded) < size / 10
+        assert caching_module.load_values(['key', 'small', 'missing']) == {
+            'key': value,
+            'small': [1]
+        }
+
+        histogram = Metrics().snapshot()['histograms']['cache.large.size']
+        assert histogram['buckets']['1024'] >= 1
+        assert histogram['buckets']['1048576'] >= 1
+
+        # A value with a missing chunk is missing
+        # ---------------------------------------------
+        cache.delete(chunk_keys[-1])
+        assert caching_module.load_values(['key']) == {}
+
+    # Values stored before the encoding are still read
+    # ---------------------------------------------
+    cache.set('legacy', [1, 2])
+    assert caching_module.load_values(['legacy']) == {'legacy': [1, 2]}
+
+
+def test_single_flight(locmem_cache):
+    class SlowSquarer(Squarer):
+        @caching('slow_square_{}', 0)
+        def square(self, number, enable_cache=True):
+            time.sleep(0.2)
+            self.calls += 1
+            return [number * number]
+
+    squarer = SlowSquarer(enabled=True, namespace='slow_squarer')
+    coalesced = get_counter('cache.slow_squarer.coalesced')
+
+    # Concurrent misses are computed once
+    # ---------------------------------------------
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(squarer.square, [3, 3, 3, 3]))
+
+    assert results == [[9]] * 4
+    assert squarer.calls == 1
+    assert get_counter('cache.slow_squarer.coalesced') == coalesced + 3
+
+
+def test_single_flight_fallback(locmem_cache, monkeypatch):
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return 'value'
+
+    with override_settings(SINGLE_FLIGHT={
+        'ENABLED': True,
+        'LEASE_TIMEOUT': 60,
+        'WAIT_TIMEOUT': 0.2,
+        'INTERVAL': 0.01,
+        'MAX_INTERVAL': 0.05
+    }):
+        # The holder of the lease never saves the value
+        # ---------------------------------------------
+        cache.add('lease_stuck', 'other worker')
+        started_at = time.monotonic()
+
+        assert coalesce('stuck', lambda: None, compute, lambda value: None) == 'value'
+        assert time.monotonic() - started_at >= 0.2
+
+        # The lease is released without a value
+        # ---------------------------------------------
+        cache.add('lease_released', 'other worker')
+        threading.Timer(0.05, cache.delete, ['lease_released']).start()
+        started_at = time.monotonic()
+
+        assert coalesce('released', lambda: None, compute, lambda value: None) == 'value'
+        assert time.monotonic() - started_at < 0.2
+        assert cache.get('lease_released') is None
+        assert len(computed) == 2
+
+        # The lease is released with the value before it is read
+        # ---------------------------------------------
+        monkeypatch.setattr(caching_module.cache, 'add', lambda *args, **kwargs: False)
+
+        assert coalesce('raced', lambda: 'stored', compute, lambda value: None) == 'stored'
+        assert len(computed) == 2
+
+
+def test_generations(locmem_cache):
+    squarer = Squarer(enabled=True, generations=['squares'])
+
+    assert squarer.square(3) == [9]
+    assert squarer.calls == 1
+
+    # Local hits need no round trip to the shared cache
+    # ---------------------------------------------
+    with patch.object(cache, 'get_many', side_effect=AssertionError('Shared cache read')):
+        assert squarer.square(3) == [9]
+
+    # Bumping the generation drops every entry at once (local ones too)
+    # ---------------------------------------------
+    bump_generation('squares')
+    assert squarer.square(3) == [9]
+    assert squarer.calls == 2
+
+    # Generations evicted from the shared cache never come back
+    # ---------------------------------------------
+    generation = cache.get('generation_squares')
+    cache.delete('generation_squares')
+    caching_module._generations.clear()
+    squarer.square(3)
+
+    assert squarer.calls == 3
+    assert cache.get('generation_squares') > generation
+
+    # Bumps of other processes are seen after the generation TTL
+    # ---------------------------------------------
+    with override_settings(LOCAL_CACHE={'MAX_SIZE': 10000, 'TTL': 60, 'GENERATION_TTL': 0.05}):
+        caching_module._generations.clear()
+        squarer.square(3)
+        cache.incr('generation_squares')
+        squarer.square(3)
+        assert squarer.calls == 3
+
+        time.sleep(0.1)
+        squarer.square(3)
+        assert squarer.calls == 4
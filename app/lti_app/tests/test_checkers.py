@@ -0,0 +1,151 @@
+from concurrent.futures import Future
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+
+from lti_app.core import compiler
+from lti_app.core.checkers import BatchChecker
+from lti_app.core.text_processing.tools import Tools
+from .utils import FakeCoreNlpClient
+
+
+# Utility/Global Entities
+# =============================================
+
+@pytest.fixture
+def fake_corenlp():
+    # The pool processes are forked with the fake client
+    parser = Tools().parser
+    client, output_format = parser.client, parser.output_format
+    parser.client, parser.output_format = FakeCoreNlpClient(), 'json'
+
+    with override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }):
+        yield parser.client
+        # The entries of the local memory caches outlive the settings
+        cache.clear()
+
+    parser.client, parser.output_format = client, output_format
+
+
+@pytest.fixture
+def pending_languagetool():
+    # Records the checks and leaves them pending
+    tools = Tools()
+    languagetool = tools.languagetool
+    futures = []
+
+    class PendingLanguageToolClient:
+        def check_async(self, text):
+            futures.append(Future())
+            return futures[-1]
+
+    tools.languagetool = PendingLanguageToolClient()
+    yield futures
+    tools.languagetool = languagetool
+
+
+# Data Providers
+# =============================================
+
+excerpt = 'one two three four five six seven eight nine ten'
+checks = {
+    'citation': False,
+    'grammar': False,
+    'plagiarism': True,
+    'academic_style': False,
+    'semantics': 0
+}
+
+
+# Tests
+# =============================================
+
+def test_batch_checker(fake_corenlp):
+    events = []
+    batch_checker = BatchChecker(excerpt, '', '', checks, batch_size=2, processes=1)
+    process_batch = batch_checker.process_batch
+
+    def record_batch(texts):
+        events.append(('batch', len(texts)))
+        return process_batch(texts)
+
+    batch_checker.process_batch = record_batch
+
+    # Each text copies four words of the excerpt from a different word
+    texts = [
+        ' '.join(excerpt.split()[start:start + 4]) + ' and more'
+        for start in range(5)
+    ]
+    results = []
+
+    for data in batch_checker.run(texts):
+        events.append(('result', len(results)))
+        results.append(data)
+
+    # In the order of the texts
+    # ---------------------------------------------
+    assert [data['plagiarism_check'] for data in results] == [
+        [' '.join(excerpt.split()[start:start + 4])]
+        for start in range(5)
+    ]
+
+    # The next batch is processed before the results of the previous one
+    # ---------------------------------------------
+    assert events == [
+        ('batch', 2),
+        ('batch', 2),
+        ('result', 0),
+        ('result', 1),
+        ('batch', 1),
+        ('result', 2),
+        ('result', 3),
+        ('result', 4)
+    ]
+
+    # The checks share the excerpt compiled once, only the texts are
+    # sent with each submission
+    # ---------------------------------------------
+    kwargs = batch_checker._get_checker_kwargs(texts[0], process_batch(texts[:1])[0])
+
+    assert sorted(kwargs) == ['text', 'text_document']
+    assert batch_checker._get_shared_kwargs()['compiled'] is batch_checker.compiled
+    assert batch_checker.compiled.fingerprint == compiler.get_fingerprint(excerpt, '', '', checks)
+
+
+def test_batch_requests(fake_corenlp, pending_languagetool):
+    batch_checker = BatchChecker(
+        excerpt,
+        '',
+        '',
+        {**checks, 'grammar': True},
+        processes=0
+    )
+    texts = ['The cat sleeps.', 'The dog barks.', 'The cat sleeps.']
+    start = len(fake_corenlp.texts)
+
+    with override_settings(LANGUAGETOOL={
+        **settings.LANGUAGETOOL,
+        'CONCURRENT': False
+    }):
+        batch_checker.process_batch(texts)
+
+    # The sentences of the batch are parsed in a single request, whatever
+    # the sentence cache setting
+    # ---------------------------------------------
+    assert [
+        text
+        for text, annotators in zip(
+            fake_corenlp.texts[start:],
+            fake_corenlp.annotators[start:]
+        )
+        if annotators != ['tokenize', 'ssplit']
+    ] == ['The cat sleeps.\nThe dog barks.']
+
+    # The LanguageTool requests of the batch are in flight together
+    # ---------------------------------------------
+    assert len(pending_languagetool) == 3
+    assert not any(future.done() for future in pending_languagetool)
@@ -0,0 +1,108 @@
+import copy
+
+import pytest
+from django.conf import settings
+from django.test import override_settings
+
+from lti_app import strings
+from lti_app.core import compiler
+from lti_app.core.semantics_checker import split_supporting_excerpts
+from lti_app.core.text_processing.tools import Tools
+from lti_app.metrics import Metrics
+from .utils import FakeCoreNlpClient
+
+
+# Utility/Global Entities
+# =============================================
+
+@pytest.fixture
+def fake_corenlp():
+    parser = Tools().parser
+    client, output_format = parser.client, parser.output_format
+    parser.client, parser.output_format = FakeCoreNlpClient(), 'json'
+
+    with override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }):
+        yield parser.client
+
+    parser.client, parser.output_format = client, output_format
+
+
+# Data Providers
+# =============================================
+
+excerpt = 'The students paraphrase the excerpt. They do not copy it.'
+supporting_excerpts = 'The students reword the excerpt.\n\n  They avoid copying it.  '
+reference = 'Edbali, T. (2018) "The test" Journal of Testing, 15(4): 261-278.'
+checks = {
+    'citation': True,
+    'grammar': False,
+    'plagiarism': True,
+    'academic_style': True,
+    'semantics': 0
+}
+
+
+# Tests
+# =============================================
+
+def test_compiled_assignment(fake_corenlp):
+    fingerprint = compiler.build(excerpt, supporting_excerpts, reference, checks)
+    requests = len(fake_corenlp.texts)
+
+    # Loaded in one fetch, not compiled again
+    # ---------------------------------------------
+    compiled = compiler.load(excerpt, supporting_excerpts, reference, checks)
+
+    assert compiled.fingerprint == fingerprint
+    assert len(fake_corenlp.texts) == requests
+    assert compiled.supporting_excerpts == split_supporting_excerpts(supporting_excerpts)
+    assert compiled.parsed_reference['authors'] == ['Edbali']
+    assert compiled.excerpt_document.get(strings.stems)[0] == ('The', 'the')
+    assert len(compiled.vectors[1]) == 1 + len(compiled.supporting_excerpts)
+
+    # Compiled again when the shared fields change
+    # ---------------------------------------------
+    edited = compiler.load(excerpt + ' It is new.', supporting_excerpts, reference, checks)
+
+    assert edited.fingerprint != fingerprint
+    assert len(fake_corenlp.texts) == requests + 1
+    assert compiler.get_fingerprint(excerpt, '', reference, checks) != fingerprint
+    assert compiler.get_fingerprint(excerpt, supporting_excerpts, '', checks) != fingerprint
+
+    # And when the parser profile the checks need is edited
+    # ---------------------------------------------
+    grammar_checks = {**checks, 'grammar': True}
+    grammar_fingerprint = compiler.get_fingerprint(excerpt, supporting_excerpts, reference, grammar_checks)
+    profiles = copy.deepcopy(settings.STANFORD_CORENLP['PARSER_PROFILES'])
+    profile = settings.STANFORD_CORENLP['PARSER_PROFILE']
+    profiles[profile]['properties']['parse.nthreads'] = '4'
+
+    with override_settings(STANFORD_CORENLP={
+        **settings.STANFORD_CORENLP,
+        'PARSER_PROFILES': profiles
+    }):
+        assert compiler.get_fingerprint(excerpt, supporting_excerpts, reference, checks) == fingerprint
+        assert compiler.get_fingerprint(
+            excerpt,
+            supporting_excerpts,
+            reference,
+            grammar_checks
+        ) != grammar_fingerprint
+
+    # Malformed references are left to the citation check
+    # ---------------------------------------------
+    assert compiler.compile_assignment(excerpt, '', 'Not a reference', checks).parsed_reference is None
+
+    # Dropped when the generation of the assignment changes
+    # ---------------------------------------------
+    compiler.build(excerpt, supporting_excerpts, reference, checks, generation='1')
+    misses = Metrics().counters.get('compiled_assignments.misses', 0)
+    compiler.load(excerpt, supporting_excerpts, reference, checks, generation='1')
+
+    assert Metrics().counters.get('compiled_assignments.misses', 0) == misses
+
+    compiler.load(excerpt, supporting_excerpts, reference, checks, generation='2')
+
+    assert Metrics().counters.get('compiled_assignments.misses', 0) == misses + 1
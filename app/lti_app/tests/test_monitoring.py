@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from django.test import RequestFactory, override_settings
+
+from lti_app import metrics
+from lti_app.core import readiness
+from lti_app.monitoring import views
+
+
+# Utility/Global Entities
+# =============================================
+
+@pytest.fixture(autouse=True)
+def monitoring():
+    with override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        },
+        MONITORING={'TOKEN': 'secret', 'REPORT_MAX_AGE': 60}
+    ):
+        yield
+
+    metrics.Metrics().reset()
+
+
+def get(view, token=None):
+    headers = {} if token is None else {'HTTP_AUTHORIZATION': 'Token ' + token}
+
+    return view(RequestFactory().get('/monitoring/', **headers))
+
+
+# Tests
+# =============================================
+
+def test_monitoring_requires_token():
+    readiness.cache.set(readiness.report_key, {'ready': True, 'probes': {}})
+
+    for view in [views.index, views.ready]:
+        assert get(view).status_code == 403
+        assert get(view, 'wrong').status_code == 403
+        assert get(view, 'secret').status_code == 200
+
+    with override_settings(MONITORING={'TOKEN': '', 'REPORT_MAX_AGE': 60}):
+        assert get(views.index, '').status_code == 403
+
+
+def test_monitoring_reads_published_metrics():
+    assert json.loads(get(views.index, 'secret').content) == {}
+
+    metrics.Metrics().increment('transport.failures')
+    metrics.publish()
+    reports = json.loads(get(views.index, 'secret').content)
+
+    assert len(reports) == 1
+    report = next(iter(reports.values()))
+    assert report['counters']['transport.failures'] == 1
+    assert 'published_at' in report
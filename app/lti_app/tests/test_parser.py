@@ -0,0 +1,307 @@
+import pytest
+from django.test import override_settings
+from nltk.tree import ParentedTree
+
+from lti_app import strings
+from lti_app.core.exceptions import TextProcessingException
+from lti_app.core.text_processing.parser import (
+    Parser,
+    build_parse_data,
+    decode_sentences,
+    plan_level
+)
+from lti_app.helpers import flatten
+from .utils import FakeCoreNlpClient, SegmentingCoreNlpClient
+
+
+# Utility/Global Entities
+# =============================================
+
+def make_serialized_document():
+    corenlp_protobuf = pytest.importorskip('corenlp_protobuf')
+    document = corenlp_protobuf.Document()
+    document.text = 'Cats sleep.'
+    sentence = document.sentence.add()
+    sentence.sentenceIndex = 0
+    sentence.tokenOffsetBegin = 0
+    sentence.tokenOffsetEnd = 3
+
+    for word, pos, begin, end, after in [
+        ('Cats', 'NNS', 0, 4, ' '),
+        ('sleep', 'VBP', 5, 10, ''),
+        ('.', '.', 10, 11, '')
+    ]:
+        token = sentence.token.add()
+        token.word = word
+        token.originalText = word
+        token.lemma = word.lower()
+        token.pos = pos
+        token.beginChar = begin
+        token.endChar = end
+        token.before = ' ' if begin == 5 else ''
+        token.after = after
+
+    def add_tree(node, tree):
+        if type(tree) is str:
+            node.value = tree
+            return
+
+        label, *children = tree
+        node.value = label
+
+        for child in children:
+            add_tree(node.child.add(), child)
+
+    add_tree(
+        sentence.parseTree,
+        ('ROOT', ('S', ('NP', ('NNS', 'Cats')), ('VP', ('VBP', 'sleep')), ('.', '.')))
+    )
+
+    graph = sentence.basicDependencies
+    graph.root.append(2)
+
+    for source, target, dep in [(2, 3, 'punct'), (2, 1, 'nsubj')]:
+        edge = graph.edge.add()
+        edge.source = source
+        edge.target = target
+        edge.dep = dep
+
+    return corenlp_protobuf.writeToDelimitedString(document).getvalue()
+
+
+# Data Providers
+# =============================================
+
+expected_sentences = [
+    {
+        'index': 0,
+        'parse': '(ROOT (S (NP (NNS Cats)) (VP (VBP sleep)) (. .)))',
+        'basicDependencies': [
+            {'dep': 'ROOT', 'governor': 0, 'governorGloss': 'ROOT', 'dependent': 2, 'dependentGloss': 'sleep'},
+            {'dep': 'nsubj', 'governor': 2, 'governorGloss': 'sleep', 'dependent': 1, 'dependentGloss': 'Cats'},
+            {'dep': 'punct', 'governor': 2, 'governorGloss': 'sleep', 'dependent': 3, 'dependentGloss': '.'}
+        ],
+        'tokens': [
+            {'index': 1, 'word': 'Cats', 'originalText': 'Cats', 'lemma': 'cats', 'characterOffsetBegin': 0, 'characterOffsetEnd': 4, 'pos': 'NNS', 'before': '', 'after': ' '},
+            {'index': 2, 'word': 'sleep', 'originalText': 'sleep', 'lemma': 'sleep', 'characterOffsetBegin': 5, 'characterOffsetEnd': 10, 'pos': 'VBP', 'before': ' ', 'after': ''},
+            {'index': 3, 'word': '.', 'originalText': '.', 'lemma': '.', 'characterOffsetBegin': 10, 'characterOffsetEnd': 11, 'pos': '.', 'before': '', 'after': ''}
+        ]
+    }
+]
+
+
+# Tests
+# =============================================
+
+def test_decode_protobuf():
+    sentences = decode_sentences(make_serialized_document())
+
+    assert sentences == expected_sentences
+
+
+def test_build_parse_data():
+    parse_data = build_parse_data(expected_sentences)
+
+    assert parse_data[strings.constituencies] == [
+        ParentedTree.fromstring(expected_sentences[0]['parse'])
+    ]
+    assert parse_data[strings.dependencies] == [expected_sentences[0]['basicDependencies']]
+    assert parse_data[strings.tagged_tokens] == [expected_sentences[0]['tokens']]
+
+
+@pytest.fixture
+def incremental_parser():
+    with override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }):
+        parser = Parser(output_format='json', sentence_cache=True)
+        parser.client = SegmentingCoreNlpClient()
+        yield parser
+
+
+def parse_requests(client):
+    # The requests other than the sentence splitting ones
+    return [
+        text
+        for text, annotators in zip(client.texts, client.annotators)
+        if annotators != ['tokenize', 'ssplit']
+    ]
+
+
+def test_incremental_parsing(incremental_parser):
+    client = incremental_parser.client
+
+    first = incremental_parser.annotate_incrementally(
+        'The cat sleeps. The dog barks.',
+        ['parse']
+    )
+    second = incremental_parser.annotate_incrementally(
+        'The dog  barks. A bird sings. The cat sleeps.',
+        ['parse']
+    )
+
+    # Only the new sentence is sent on resubmission
+    # ---------------------------------------------
+    assert parse_requests(client) == ['The cat sleeps.\nThe dog barks.', 'A bird sings.']
+
+    # Indices and offsets are consistent with the whole text
+    # ---------------------------------------------
+    assert [sentence['index'] for sentence in first] == [0, 1]
+    assert [sentence['index'] for sentence in second] == [0, 1, 2]
+    assert [
+        (token['word'], token['characterOffsetBegin'])
+        for token in first[1]['tokens']
+    ] == [('The', 16), ('dog', 20), ('barks.', 24)]
+    assert [
+        (token['word'], token['characterOffsetBegin'])
+        for token in second[2]['tokens']
+    ] == [('The', 30), ('cat', 34), ('sleeps.', 38)]
+
+    # Offsets and whitespace are those of the text, not of the normalized
+    # sentence that was parsed
+    # ---------------------------------------------
+    assert [
+        (token['word'], token['characterOffsetBegin'], token['characterOffsetEnd'])
+        for token in second[0]['tokens']
+    ] == [('The', 0, 3), ('dog', 4, 7), ('barks.', 9, 15)]
+    assert [
+        (token['before'], token['after'])
+        for token in second[0]['tokens']
+    ] == [('', ' '), (' ', '  '), ('  ', ' ')]
+
+    text = 'The dog\n barks.'
+    assert [
+        text[token['characterOffsetBegin']:token['characterOffsetEnd']]
+        for token in incremental_parser.annotate_incrementally(text, ['parse'])[0]['tokens']
+    ] == ['The', 'dog', 'barks.']
+
+
+def test_incremental_segmentation(incremental_parser):
+    texts = [
+        ('Dr. Smith paraphrases the excerpt. He does not\ncopy it.', 2),
+        ('The cat sleeps, e.g. on the sofa.\nThe dog barks.\n\n A bird sings.', 3)
+    ]
+
+    # The sentences of CoreNLP, whether parsed or cached
+    # ---------------------------------------------
+    for text, num_sentences in texts:
+        expected = incremental_parser.annotate(text, ['parse'])
+
+        assert len(expected) == num_sentences
+        assert incremental_parser.annotate_incrementally(text, ['parse']) == expected
+        assert incremental_parser.annotate_incrementally(text, ['parse']) == expected
+
+
+def test_prefetching(incremental_parser):
+    client = incremental_parser.client
+    texts = ['The cat sleeps. The dog barks.', 'The dog barks. A bird sings.']
+
+    # The distinct sentences of the batch in a single request
+    # ---------------------------------------------
+    assert incremental_parser.prefetch(texts) == 3
+    assert parse_requests(client) == ['A bird sings.\nThe cat sleeps.\nThe dog barks.']
+
+    # The texts are then parsed from the cache
+    # ---------------------------------------------
+    parse_data = [incremental_parser.parse(text) for text in texts]
+
+    assert len(parse_requests(client)) == 1
+    assert [
+        (token['word'], token['characterOffsetBegin'])
+        for token in parse_data[1][strings.tagged_tokens][1]
+    ] == [('A', 15), ('bird', 17), ('sings.', 22)]
+    assert incremental_parser.prefetch(texts) == 0
+
+
+def test_chunked_parsing():
+    parser = Parser(
+        output_format='json',
+        sentence_cache=False,
+        chunk_size=32,
+        chunk_concurrency=2
+    )
+    parser.client = SegmentingCoreNlpClient()
+    text = 'The cat sleeps. The dog barks. A bird sings.'
+
+    parse_data = parser.parse(text)
+
+    # Sentence-aligned chunks
+    # ---------------------------------------------
+    assert sorted(parse_requests(parser.client)) == [
+        'A bird sings.',
+        'The cat sleeps.\nThe dog barks.'
+    ]
+
+    # Merged with global indices and offsets
+    # ---------------------------------------------
+    tagged_tokens = parse_data[strings.tagged_tokens]
+
+    assert len(parse_data[strings.constituencies]) == 3
+    assert [
+        (token['word'], token['characterOffsetBegin'])
+        for token in tagged_tokens[2]
+    ] == [('A', 31), ('bird', 33), ('sings.', 38)]
+    assert all(
+        text[token['characterOffsetBegin']:token['characterOffsetEnd']] == token['word']
+        for token in flatten(tagged_tokens)
+    )
+
+    # Sentences over several lines are annotated as in the whole text
+    # ---------------------------------------------
+    text = 'The cat sleeps. The dog\n barks. A bird sings.'
+    parser.client = SegmentingCoreNlpClient()
+    sentences = parser.annotate_in_chunks(text, ['parse'])
+
+    assert sorted(parse_requests(parser.client)) == [
+        'A bird sings.',
+        'The cat sleeps.\nThe dog barks.'
+    ]
+    assert sentences == parser.annotate(text, ['parse'])
+
+
+def test_parser_profiles():
+    parser = Parser(output_format='json', sentence_cache=False, chunk_size=0)
+    parser.client = FakeCoreNlpClient()
+
+    annotators, properties = parser.get_profile('fast')
+    assert annotators == ['tokenize', 'ssplit', 'pos', 'parse']
+    assert 'srparser' in properties['parse.model']
+
+    with pytest.raises(TextProcessingException) as exc_info:
+        parser.parse('The cat sleeps.', 'unknown')
+    assert exc_info.value.code == 'TXT_INVALID_PARSER_PROFILE'
+
+
+def test_annotation_levels():
+    parser = Parser(output_format='json', sentence_cache=False, chunk_size=0)
+    parser.client = FakeCoreNlpClient()
+
+    # The cheapest level providing the required parse data
+    # ---------------------------------------------
+    assert plan_level([]) == strings.tokens
+    assert plan_level([strings.tokens, strings.tagged_tokens]) == strings.tagged_tokens
+    assert plan_level([strings.tagged_tokens, strings.dependencies]) == strings.dependencies
+    assert plan_level([strings.dependencies, strings.constituencies]) == strings.constituencies
+
+    # Only the annotators of the level are requested
+    # ---------------------------------------------
+    parse_data = parser.parse('The cat sleeps.', level=strings.tagged_tokens)
+
+    assert parser.client.annotators[-1] == ['tokenize', 'ssplit', 'pos']
+    assert parse_data[strings.constituencies] == [None]
+    assert parse_data[strings.dependencies] == [None]
+    assert len(parse_data[strings.tagged_tokens][0]) == 3
+
+    # The dependencies without the constituency parser
+    parse_data = parser.parse('The cat sleeps.', 'fast', strings.dependencies)
+
+    assert parser.client.annotators[-1] == ['tokenize', 'ssplit', 'pos', 'depparse']
+    assert parse_data[strings.dependencies][0] is not None
+    assert parse_data[strings.constituencies] == [None]
+
+    parser.parse('The cat sleeps.', 'fast', strings.constituencies)
+    assert parser.client.annotators[-1] == ['tokenize', 'ssplit', 'pos', 'parse']
+
+    with pytest.raises(TextProcessingException) as exc_info:
+        parser.parse('The cat sleeps.', level='unknown')
+    assert exc_info.value.code == 'TXT_INVALID_ANNOTATION_LEVEL'
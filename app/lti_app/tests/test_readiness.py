@@ -0,0 +1,76 @@
+import pytest
+from django.test import override_settings
+
+from lti_app.core import readiness, transport
+from lti_app.core.exceptions import ApiException
+from .utils import StubServer
+
+
+# Utility/Global Entities
+# =============================================
+
+@pytest.fixture(autouse=True)
+def clear_transports():
+    yield
+    transport._transports.clear()
+
+
+@pytest.fixture
+def services():
+    servers = {
+        'corenlp': StubServer(body=b'{"sentences": []}').start(),
+        'languagetool': StubServer(body=b'{"matches": []}').start()
+    }
+    host, port = servers['languagetool'].server.server_address
+
+    with override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        },
+        STANFORD_CORENLP={
+            'BACKENDS': [servers['corenlp'].endpoint],
+            'PARSER_PROFILES': {
+                'fast': {'annotators': ['parse'], 'properties': {}},
+                'accurate': {'annotators': ['parse'], 'properties': {}}
+            },
+            'MAX_RETRIES': 0
+        },
+        LANGUAGETOOL={'HOST': host, 'PORT': port, 'MAX_RETRIES': 0},
+        READINESS={'BUDGET': 0.1, 'TIMEOUT': 0.3, 'INTERVAL': 0.1}
+    ):
+        yield servers
+
+    for server in servers.values():
+        server.stop()
+
+
+# Tests
+# =============================================
+
+def test_ready(services):
+    report = readiness.wait_until_ready()
+
+    assert report['ready']
+    # One CoreNLP probe per parser profile and per annotation level not
+    # produced by a profile
+    assert len(report['probes']) == 6
+    assert services['corenlp'].requests == 5
+    assert services['languagetool'].requests == 1
+    assert readiness.get_report() == report
+
+
+def test_not_ready_within_budget(services):
+    services['corenlp'].delay = 0.15
+
+    # An attempt sends the 5 CoreNLP probes one after the other (0.75s),
+    # the timeout leaves room for a second attempt
+    with pytest.raises(ApiException) as exc_info:
+        readiness.wait_until_ready(timeout=1.2)
+
+    assert exc_info.value.code == 'API_NOT_READY'
+    assert services['corenlp'].requests > 5
+
+    report = readiness.get_report()
+
+    assert not report['ready']
+    assert report['probes']['languagetool ' + services['languagetool'].endpoint + '/v2/check']['ok']
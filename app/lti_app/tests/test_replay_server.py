@@ -0,0 +1,120 @@
+import os
+
+import pytest
+from django.test import override_settings
+
+from bin.replay_server import Recordings, ReplayServer, record, replay
+from lti_app.core import transport
+from lti_app.core.api import CoreNlpClient, LanguageToolClient
+from lti_app.core.exceptions import ApiException
+from .utils import StubServer
+
+
+# Utility/Global Entities
+# =============================================
+
+@pytest.fixture(autouse=True)
+def clear_transports():
+    yield
+    transport._transports.clear()
+
+
+@pytest.fixture
+def replay_server(tmpdir):
+    servers = []
+
+    def _replay_server(**kwargs):
+        server = ReplayServer(Recordings(str(tmpdir)), **kwargs).start()
+        servers.append(server)
+        return server
+
+    yield _replay_server
+
+    for server in servers:
+        server.stop()
+
+
+def make_clients(server):
+    host, port = server.server.server_address
+
+    with override_settings(LANGUAGETOOL={'HOST': host, 'PORT': port, 'MAX_RETRIES': 0}):
+        languagetool_client = LanguageToolClient()
+
+    return CoreNlpClient(backends=[server.endpoint]), languagetool_client
+
+
+# Tests
+# =============================================
+
+def test_record_and_replay(replay_server):
+    upstream = StubServer(body=b'{"sentences": [], "matches": [{"offset": 1}]}').start()
+
+    # Record
+    # ---------------------------------------------
+    recorder = replay_server(
+        mode=record,
+        corenlp=upstream.endpoint,
+        languagetool=upstream.endpoint
+    )
+    corenlp_client, languagetool_client = make_clients(recorder)
+
+    parse = corenlp_client.run('Some text.', ['parse'], {'parse.maxlen': 80})
+    matches = languagetool_client.check('Some text.')
+    upstream.stop()
+
+    assert upstream.requests == 2
+    assert recorder.stats['hits'] == 2
+
+    # Replay
+    # ---------------------------------------------
+    player = replay_server(mode=replay)
+    corenlp_client, languagetool_client = make_clients(player)
+
+    assert corenlp_client.run('Some text.', ['parse'], {'parse.maxlen': 80}) == parse
+    assert languagetool_client.check('Some text.') == matches
+    assert player.stats['hits'] == 2
+
+    # Unknown requests are not served
+    # ---------------------------------------------
+    response = player.handle('POST', '/', '', b'Other text.', None)
+
+    assert response['status'] == 404
+    assert player.stats['misses'] == 1
+
+
+def test_unreachable_upstream(replay_server):
+    upstream = StubServer().start()
+    upstream.stop()
+    recorder = replay_server(mode=record, corenlp=upstream.endpoint)
+
+    response = recorder.handle('POST', '/', '', b'Some text.', None)
+
+    assert response['status'] == 502
+    assert b'Cannot connect' in response['body']
+    assert recorder.stats['upstream_errors'] == 1
+    assert os.listdir(recorder.recordings.directory) == []
+
+
+def test_injected_errors_and_latency(replay_server):
+    failing = replay_server(mode=replay, error_rate=1.0)
+    corenlp_client, _ = make_clients(failing)
+
+    with pytest.raises(ApiException) as exc_info:
+        corenlp_client.run('Some text.', ['parse'])
+
+    assert exc_info.value.code == 'API_SERVICE_UNAVAILABLE'
+    assert failing.stats['errors'] > 0
+
+    # Same seed, same behaviour
+    # ---------------------------------------------
+    servers = [
+        replay_server(mode=replay, latency=0.01, jitter=0.01, error_rate=0.5, seed=1)
+        for _ in range(2)
+    ]
+
+    for server in servers:
+        for _ in range(20):
+            server.handle('POST', '/', '', b'text', None)
+
+    assert servers[0].stats == servers[1].stats
+    assert 0 < servers[0].stats['errors'] < 20
@@ -0,0 +1,132 @@
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from lti_app.assignments.repositories import AssignmentRepository
+from lti_app.models import Assignment
+
+
+# Utility/Global Entities
+# =============================================
+
+@pytest.fixture
+def assignments():
+    with override_settings(
+        CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        },
+        LOCAL_CACHE={'MAX_SIZE': 100000, 'TTL': 60, 'GENERATION_TTL': 60}
+    ):
+        with connection.schema_editor() as editor:
+            editor.create_model(Assignment)
+
+        yield AssignmentRepository()
+
+        with connection.schema_editor() as editor:
+            editor.delete_model(Assignment)
+
+
+def create(repository, assignment_id):
+    return repository.create({
+        'course_id': 'course',
+        'assignment_id': assignment_id,
+        'assignment_type': 'D',
+        'reference': 'Edbali, T. (2018) "The test"',
+        'excerpt': 'The students paraphrase the excerpt.',
+        'max_attempts': 3
+    })
+
+
+# Tests
+# =============================================
+
+def test_rows(assignments):
+    first = create(assignments, '1')
+    second = create(assignments, '2')
+    fields = {'course_id': 'course', 'assignment_id': '1'}
+
+    # Cached as row snapshots, read back without any query
+    # ---------------------------------------------
+    with CaptureQueriesContext(connection) as queries:
+        assignments.get_first_by(fields)
+    assert len(queries) == 1
+
+    with CaptureQueriesContext(connection) as queries:
+        assignment = assignments.get_first_by(fields)
+        assert assignment.id == first.id
+        assert assignment.max_attempts == 3
+        assert assignments.get_by_id(first.id).excerpt == first.excerpt
+    assert len(queries) == 0
+
+    # Nor any shared cache round trip
+    with patch.object(cache, 'get_many', side_effect=AssertionError('Shared cache read')):
+        assert assignments.get_first_by(fields).id == first.id
+
+    # Missing rows are fetched in a single query
+    # ---------------------------------------------
+    third = create(assignments, '3')
+
+    with CaptureQueriesContext(connection) as queries:
+        rows = assignments.get_many([first.id, second.id, third.id, 1000])
+    assert len(queries) == 1
+    assert sorted(rows) == [first.id, second.id, third.id]
+
+    with CaptureQueriesContext(connection) as queries:
+        assert len(assignments.get_all()) == 3
+    assert len(queries) == 1
+
+    with pytest.raises(Assignment.DoesNotExist):
+        assignments.get_by_id(1000)
+
+    # Updates are visible right away
+    # ---------------------------------------------
+    assignments.update(first.id, {'max_attempts': 5})
+
+    with CaptureQueriesContext(connection) as queries:
+        assert assignments.get_first_by(fields).max_attempts == 5
+        assert assignments.get_by_id(first.id).max_attempts == 5
+    assert len(queries) == 1
+
+    # Saves and creations too
+    # ---------------------------------------------
+    assignment.excerpt = 'A new excerpt.'
+    assignment.save()
+
+    assert assignments.get_by_id(first.id).excerpt == 'A new excerpt.'
+    assert assignments.get_first_by({'assignment_id': '4'}) is None
+
+    create(assignments, '4')
+
+    assert assignments.get_first_by({'assignment_id': '4'}) is not None
+
+
+def test_concurrent_writes(assignments):
+    first = create(assignments, '1')
+    fields = {'course_id': 'course', 'assignment_id': '1'}
+
+    def update_before(method, value):
+        # Another worker updates the row once it was read
+        original = getattr(assignments, method)
+
+        def wrapped(*args, **kwargs):
+            Assignment.objects.filter(id=first.id).update(max_attempts=value)
+            assignments.invalidate(first.id)
+            setattr(assignments, method, original)
+            return original(*args, **kwargs)
+
+        setattr(assignments, method, wrapped)
+
+    # Stale lookups and rows are not cached
+    # ---------------------------------------------
+    update_before('_get_row_keys', 4)
+    assert assignments.get_first_by(fields).max_attempts == 3
+    assert assignments.get_first_by(fields).max_attempts == 4
+
+    assignments.invalidate(first.id)
+    update_before('_cache_rows', 5)
+    assert assignments.get_by_id(first.id).max_attempts == 4
+    assert assignments.get_by_id(first.id).max_attempts == 5
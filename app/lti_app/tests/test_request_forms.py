@@ -0,0 +1,39 @@
+import pytest
+
+from lti_app.assignments.request_forms import AssignmentRequestForm
+from lti_app.request_forms import ValidationException
+
+
+# Data Providers
+# =============================================
+
+def get_form_data(**kwargs):
+    return {
+        'course_id': 'course',
+        'assignment_id': 'assignment',
+        'semantics_check': '1',
+        **kwargs
+    }
+
+
+# Tests
+# =============================================
+
+@pytest.mark.parametrize('parser_profile, expected', [
+    ('', None),
+    ('fast', 'fast'),
+    ('accurate', 'accurate')
+])
+def test_parser_profile(parser_profile, expected):
+    form = AssignmentRequestForm(get_form_data(parser_profile=parser_profile))
+
+    assert form.validate()['parser_profile'] == expected
+
+
+def test_unknown_parser_profile():
+    form = AssignmentRequestForm(get_form_data(parser_profile='unknown'))
+
+    with pytest.raises(ValidationException) as exc_info:
+        form.validate()
+
+    assert 'parser_profile' in exc_info.value.description
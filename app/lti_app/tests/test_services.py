@@ -0,0 +1,22 @@
+import pickle
+
+from redis import Redis
+from rq.job import Job
+
+from lti_app.assignments.services import AssignmentService
+from lti_app.metrics import Metrics
+
+
+# Tests
+# =============================================
+
+def test_enqueued_jobs():
+    service = AssignmentService()
+
+    # The jobs of the views are pickled by RQ
+    # ---------------------------------------------
+    for func in (service.run_analysis, service.warm):
+        job = Job.create(func, args=(1,), connection=Redis())
+        _, instance, _, _ = pickle.loads(job.data)
+
+        assert instance.metrics is Metrics()
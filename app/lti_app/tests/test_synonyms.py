@@ -0,0 +1,63 @@
+import pytest
+from django.test import override_settings
+
+from lti_app.core import synonyms, text_helpers
+from .utils import FakeWordNet
+
+
+# Utility/Global Entities
+# =============================================
+
+@pytest.fixture
+def wordnet(monkeypatch, tmpdir):
+    wordnet = FakeWordNet()
+    monkeypatch.setattr(synonyms, 'wn', wordnet)
+    monkeypatch.setattr(synonyms, '_index', None)
+    synonyms.get_groups.cache_clear()
+
+    with override_settings(SYNONYM_INDEX={'DIRECTORY': str(tmpdir)}):
+        yield wordnet
+
+    synonyms.get_groups.cache_clear()
+
+
+def are_synonyms(word1, word2):
+    # The original definition
+    syn1 = set(lemma for syn in FakeWordNet.synsets_by_word.get(word1.lower(), []) for lemma in syn.lemma_names())
+    syn2 = set(lemma for syn in FakeWordNet.synsets_by_word.get(word2.lower(), []) for lemma in syn.lemma_names())
+
+    return len(syn1 & syn2) > 0
+
+
+# Data Providers
+# =============================================
+
+words = ['car', 'Auto', 'automobile', 'railcar', 'cars', 'tree', 'tree_diagram', 'unknown']
+
+
+# Tests
+# =============================================
+
+def test_synonym_index(wordnet, tmpdir):
+    assert synonyms.build_index(str(tmpdir)) == 6
+
+    lookups = wordnet.lookups
+    index = synonyms.get_index()
+
+    assert index is not None
+    assert index.get_groups('cars') is None
+
+    # Same answers as WordNet, without WordNet for indexed words
+    # ---------------------------------------------
+    for word1 in words:
+        for word2 in words:
+            assert text_helpers.are_synonyms(word1, word2) == are_synonyms(word1, word2)
+
+    # Only the words missing from the index are looked up
+    assert wordnet.lookups == lookups + 2
+
+
+def test_without_index(wordnet):
+    assert synonyms.get_index() is None
+    assert text_helpers.are_synonyms('car', 'railcar')
+    assert not text_helpers.are_synonyms('car', 'tree')
@@ -1,12 +1,21 @@
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+from django.test import override_settings
 
+from lti_app.caching import caching
 from lti_app.core.exceptions import TextProcessingException
 from lti_app.core.text_processing.document import Document
 from lti_app.core.text_processing.processing_graphs import (
     ProcessorNode,
     text_cleaner
 )
-from lti_app.core.text_processing.processors import TextProcessor
+from lti_app.core.text_processing.processors import (
+    ProcessingPlan,
+    TextProcessor
+)
 
 
 # Utility/Global Entities
@@ -26,6 +35,59 @@ class FullStopToCommaConverter(ProcessorNode):
 fullstop2comma_converter = FullStopToCommaConverter()
 
 
+class SlowCounter(ProcessorNode):
+    def __init__(self, name, out, delay):
+        ProcessorNode.__init__(self, name=name, out=out, delay=delay)
+
+    def process(self, **kwargs):
+        document = kwargs.get('document')
+        input_key = kwargs.get('input_key')
+        time.sleep(self.attrs.get('delay'))
+
+        return len(document.get(input_key))
+
+slow_counter = SlowCounter('slow_counter', 'slow_count', 0.2)
+fast_counter = SlowCounter('fast_counter', 'fast_count', 0.1)
+
+
+class Combiner(ProcessorNode):
+    def __init__(self, name='combiner', out='combined'):
+        ProcessorNode.__init__(
+            self,
+            name=name,
+            out=out,
+            inputs={'text': 'commatized', 'count': 'fast_count'}
+        )
+        self.calls = 0
+
+    @caching(['attrs', 'name'])
+    def _process(self, **kwargs):
+        inputs = kwargs.get('inputs')
+        self.calls += 1
+
+        return '{0} ({1})'.format(inputs['text'], inputs['count'])
+
+combiner = Combiner()
+
+
+class BatchCounter(ProcessorNode):
+    def __init__(self, name='batch_counter', out='batch_count'):
+        ProcessorNode.__init__(self, name=name, out=out)
+        self.batches = []
+
+    def prefetch(self, batch, **kwargs):
+        self.batches.append([
+            arguments.get('document').get(arguments.get('input_key'))
+            for arguments in batch
+        ])
+
+    def process(self, **kwargs):
+        document = kwargs.get('document')
+        input_key = kwargs.get('input_key')
+
+        return len(document.get(input_key))
+
+
 # Data Providers
 # =============================================
 
@@ -112,3 +174,220 @@ def test_remove_processor(graph, root):
     # ---------------------------------------------
     text_processor.remove_processor(root)
     assert len(text_processor) == 0
+
+
+def test_concurrent_processing():
+    graph = {
+        text_cleaner: [slow_counter, fullstop2comma_converter],
+        fullstop2comma_converter: [fast_counter],
+        slow_counter: [],
+        fast_counter: []
+    }
+    text_processor = TextProcessor(graph, text_cleaner, max_workers=2)
+
+    document = text_processor.run('  Some  text. ')
+
+    assert document.get('slow_count') == 10
+    assert document.get('fast_count') == 10
+
+    # Per-node timings and critical path
+    # ---------------------------------------------
+    timings = document.timings
+
+    assert set(timings) == {
+        'text_cleaner',
+        'slow_counter',
+        'fullstop2comma_converter',
+        'fast_counter'
+    }
+    assert timings['fast_counter']['start'] >= timings['fullstop2comma_converter']['end']
+
+    # The independent nodes overlap
+    assert timings['slow_counter']['start'] < timings['fast_counter']['end']
+    assert timings['fast_counter']['start'] < timings['slow_counter']['end']
+
+    names, path_duration = document.critical_path
+
+    assert names == ['text_cleaner', 'slow_counter']
+    assert path_duration >= 0.2
+
+
+def test_cyclic_graph():
+    graph = {
+        text_cleaner: [fullstop2comma_converter],
+        fullstop2comma_converter: [fast_counter],
+        fast_counter: [fullstop2comma_converter]
+    }
+    text_processor = TextProcessor(graph, text_cleaner)
+
+    with pytest.raises(TextProcessingException) as exc_info:
+        text_processor.run('Some text.')
+    assert exc_info.value.code == 'TXT_INVALID_GRAPH'
+
+
+def test_compiled_plan():
+    graph = {
+        text_cleaner: [slow_counter, fullstop2comma_converter],
+        fullstop2comma_converter: [fast_counter],
+        slow_counter: [fast_counter],
+        fast_counter: []
+    }
+
+    # Shared by the processors of the same graph
+    # ---------------------------------------------
+    plan = TextProcessor(graph, text_cleaner).get_plan()
+
+    assert TextProcessor(graph, text_cleaner).get_plan() is plan
+    assert plan.order[0] == text_cleaner
+    assert plan.order[-1] == fast_counter
+    assert plan.predecessors[fast_counter] == (slow_counter, fullstop2comma_converter)
+    assert plan.input_keys[fast_counter] == 'slow_count'
+
+    with pytest.raises(TypeError):
+        plan.successors[fast_counter] = ()
+
+    # Changes are made on a private copy of the graph
+    # ---------------------------------------------
+    text_processor = TextProcessor(graph, text_cleaner)
+    text_processor.remove_processor(slow_counter)
+
+    assert slow_counter in graph
+    assert text_processor.graph is not graph
+    assert len(text_processor.get_plan()) == 3
+    assert len(ProcessingPlan(graph, text_cleaner)) == 4
+
+
+def test_multiple_inputs():
+    graph = {
+        text_cleaner: [fullstop2comma_converter, combiner],
+        fullstop2comma_converter: [fast_counter],
+        fast_counter: [],
+        combiner: []
+    }
+    text_processor = TextProcessor(graph, text_cleaner)
+    plan = text_processor.get_plan()
+
+    # Runs once all the inputs are ready
+    # ---------------------------------------------
+    assert set(plan.predecessors[combiner]) == {
+        text_cleaner,
+        fullstop2comma_converter,
+        fast_counter
+    }
+    assert plan.order[-1] == combiner
+
+    with override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }):
+        combiner.calls = 0
+        document = text_processor.run('Some  text.', enable_cache=True)
+
+        assert document.get('combined') == 'Some text, (10)'
+
+        # Cached by the digests of all the inputs
+        # ---------------------------------------------
+        text_processor.run(' Some text. ', enable_cache=True)
+        assert combiner.calls == 1
+
+        text_processor.run('Some text!', enable_cache=True)
+        assert combiner.calls == 2
+
+    # Inputs must be produced by the graph
+    # ---------------------------------------------
+    with pytest.raises(TextProcessingException) as exc_info:
+        TextProcessor({text_cleaner: [combiner], combiner: []}, text_cleaner).run('Text.')
+    assert exc_info.value.code == 'TXT_MISSING_KEY'
+
+
+def test_lazy_processing():
+    graph = {
+        text_cleaner: [slow_counter, fullstop2comma_converter],
+        fullstop2comma_converter: [fast_counter],
+        slow_counter: [],
+        fast_counter: []
+    }
+    text_processor = TextProcessor(graph, text_cleaner)
+
+    document = text_processor.run('Some text.', eager_keys=['commatized'])
+
+    assert document.materialised == ['cleaned_text', 'commatized']
+    assert 'slow_count' not in document.data
+
+    # Computed (with the missing inputs) on the first request
+    # ---------------------------------------------
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        counts = list(executor.map(
+            lambda key: document.get(key),
+            ['fast_count', 'slow_count', 'fast_count', 'slow_count']
+        ))
+
+    assert counts == [10, 10, 10, 10]
+    assert sorted(document.materialised) == [
+        'cleaned_text',
+        'commatized',
+        'fast_count',
+        'slow_count'
+    ]
+    assert set(document.digests) == set(document.materialised)
+
+
+def test_lazy_serialization():
+    graph = {
+        text_cleaner: [slow_counter, fullstop2comma_converter],
+        fullstop2comma_converter: [fast_counter],
+        slow_counter: [],
+        fast_counter: []
+    }
+    text_processor = TextProcessor(graph, text_cleaner)
+
+    # Lazy entities are not silently lost
+    # ---------------------------------------------
+    document = text_processor.run('Some text.', eager_keys=['commatized'])
+
+    with pytest.raises(TextProcessingException) as exc_info:
+        pickle.dumps(document)
+    assert exc_info.value.code == 'TXT_LAZY_KEYS'
+
+    document.get('fast_count')
+    document.get('slow_count')
+
+    assert pickle.loads(pickle.dumps(document)).get('slow_count') == 10
+
+    # Dropped entities cannot be requested
+    # ---------------------------------------------
+    document = text_processor.run('Some text.', eager_keys=['commatized'])
+    document.drop_lazy()
+    document = pickle.loads(pickle.dumps(document))
+
+    assert document.get('commatized') == 'Some text,'
+
+    with pytest.raises(TextProcessingException) as exc_info:
+        document.get('slow_count')
+    assert exc_info.value.code == 'TXT_DROPPED_KEY'
+
+
+def test_batch_processing():
+    batch_counter = BatchCounter()
+    graph = {
+        text_cleaner: [slow_counter, fullstop2comma_converter],
+        fullstop2comma_converter: [batch_counter],
+        slow_counter: [],
+        batch_counter: []
+    }
+    text_processor = TextProcessor(graph, text_cleaner)
+
+    documents = text_processor.run_many(
+        ['Some text.', 'Other  text.'],
+        eager_keys=['batch_count']
+    )
+
+    # One prefetch for the whole batch, then one run per document
+    # ---------------------------------------------
+    assert batch_counter.batches == [['Some text,', 'Other text,']]
+    assert [document.get('batch_count') for document in documents] == [10, 11]
+
+    # The other processors stay lazy
+    # ---------------------------------------------
+    for document in documents:
+        assert document.materialised == ['cleaned_text', 'commatized', 'batch_count']
+        assert 'slow_count' not in document.data
@@ -1,3 +1,11 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from lti_app.helpers import flatten
+
+
 def remove_keys(keys, ls):
     new_ls = []
 
@@ -11,3 +19,225 @@ def remove_keys(keys, ls):
         new_ls.append(item)
 
     return new_ls
+
+
+class FakeSynset:
+    def __init__(self, *lemma_names):
+        self.names = list(lemma_names)
+
+    def lemma_names(self):
+        return self.names
+
+
+class FakeWordNet:
+    synsets_by_word = {
+        'car': [FakeSynset('car', 'auto', 'automobile'), FakeSynset('car', 'railcar')],
+        'auto': [FakeSynset('car', 'auto', 'automobile')],
+        'railcar': [FakeSynset('car', 'railcar')],
+        'automobile': [FakeSynset('car', 'auto', 'automobile')],
+        'cars': [FakeSynset('car', 'auto', 'automobile'), FakeSynset('car', 'railcar')],
+        'tree': [FakeSynset('tree'), FakeSynset('tree', 'tree_diagram')],
+        'tree_diagram': [FakeSynset('tree', 'tree_diagram')],
+        'drive': [FakeSynset('drive', 'ride')],
+        'drives': [FakeSynset('drive', 'ride')],
+        'ride': [FakeSynset('drive', 'ride')],
+        'pupil': [FakeSynset('pupil', 'student')],
+        'student': [FakeSynset('pupil', 'student')]
+    }
+
+    def __init__(self):
+        self.lookups = 0
+
+    def synsets(self, word):
+        self.lookups += 1
+        return self.synsets_by_word.get(word.lower(), [])
+
+    def all_lemma_names(self):
+        return ['car', 'auto', 'automobile', 'railcar', 'tree', 'tree_diagram']
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubServer:
+    """Serves a canned HTTP response on a free local port.
+
+    Args:
+        status (int, optional): Defaults to 200. The response status.
+        body (bytes, optional): Defaults to b'{}'. The response body.
+        delay (float, optional): Defaults to 0.0. Seconds to wait
+            before responding.
+        concurrency (int, optional): Defaults to None. The number of
+            requests served at the same time (unbounded if None).
+
+    The (start, end) monotonic times of the served requests are recorded
+    in `intervals`.
+    """
+
+    def __init__(self, status=200, body=b'{}', delay=0.0, concurrency=None):
+        self.status = status
+        self.body = body
+        self.delay = delay
+        self.slots = (
+            threading.BoundedSemaphore(concurrency)
+            if concurrency is not None
+            else None
+        )
+        self.requests = 0
+        self.outstanding = 0
+        self.max_outstanding = 0
+        self.intervals = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address
+        return 'http://{0}:{1}'.format(host, port)
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+
+                # Outstanding from the arrival of the request, waiting
+                # for a slot included
+                with stub.lock:
+                    stub.outstanding += 1
+                    stub.max_outstanding = max(stub.max_outstanding, stub.outstanding)
+
+                if stub.slots is not None:
+                    stub.slots.acquire()
+
+                with stub.lock:
+                    stub.requests += 1
+
+                started_at = time.monotonic()
+
+                if stub.delay > 0:
+                    time.sleep(stub.delay)
+
+                if stub.slots is not None:
+                    stub.slots.release()
+
+                with stub.lock:
+                    stub.outstanding -= 1
+                    stub.intervals.append((started_at, time.monotonic()))
+
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(stub.body)))
+                self.end_headers()
+                self.wfile.write(stub.body)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeCoreNlpClient:
+    """Annotates every line as a sentence and records the requests."""
+
+    def __init__(self):
+        self.texts = []
+        self.annotators = []
+
+    def split(self, text, properties):
+        return [line.split(' ') for line in text.split('\n')]
+
+    def run(self, text, annotators, properties=None):
+        self.texts.append(text)
+        self.annotators.append(annotators)
+        sentences = []
+        offset = 0
+
+        for words in self.split(text, properties or {}):
+            tokens = []
+
+            for index, word in enumerate(words, 1):
+                begin = text.index(word, offset)
+                offset = begin + len(word)
+                tokens.append({
+                    'index': index,
+                    'word': word,
+                    'characterOffsetBegin': begin,
+                    'characterOffsetEnd': offset
+                })
+
+            sentence = {'index': len(sentences), 'tokens': tokens}
+
+            for token in tokens:
+                token['before'] = ' ' if token['index'] > 1 else ''
+                token['after'] = ' ' if token['index'] < len(tokens) else ''
+
+            if 'parse' in annotators:
+                sentence['parse'] = '(ROOT (S {}))'.format(' '.join(
+                    '(X {})'.format(token['word']) for token in tokens
+                ))
+
+            if 'parse' in annotators or 'depparse' in annotators:
+                sentence['basicDependencies'] = []
+
+            sentences.append(sentence)
+
+        return {'sentences': sentences}
+
+
+class SegmentingCoreNlpClient(FakeCoreNlpClient):
+    """Splits the sentences like CoreNLP and records the requests.
+
+    A sentence ends with a word ending with a period, unless the word is
+    an abbreviation. Line breaks only end sentences with `ssplit.eolonly`.
+    """
+
+    abbreviations = ['Dr.', 'e.g.', 'etc.']
+
+    def split(self, text, properties):
+        if properties.get('ssplit.eolonly') == 'true':
+            return FakeCoreNlpClient.split(self, text, properties)
+
+        sentences = [[]]
+
+        for word in text.split():
+            sentences[-1].append(word)
+
+            if word.endswith('.') and word not in self.abbreviations:
+                sentences.append([])
+
+        return [words for words in sentences if len(words) > 0]
+
+    def run(self, text, annotators, properties=None):
+        data = FakeCoreNlpClient.run(self, text, annotators, properties)
+        tokens = flatten(sentence['tokens'] for sentence in data['sentences'])
+        previous_end = 0
+
+        # The whitespace of the text around the tokens
+        for token, next_token in zip(tokens, tokens[1:] + [None]):
+            next_begin = len(text) if next_token is None else next_token['characterOffsetBegin']
+            token['before'] = text[previous_end:token['characterOffsetBegin']]
+            token['after'] = text[token['characterOffsetEnd']:next_begin]
+            previous_end = token['characterOffsetEnd']
+
+        return data
@@ -137,6 +137,49 @@ CACHES = {
     }
 }
 
+# Values in the shared cache are pickled and compressed (with zlib at
+# COMPRESS_LEVEL) from COMPRESS_THRESHOLD bytes. Values larger than
+# CHUNK_SIZE bytes once encoded are split across several keys, as
+# memcached does not store items over 1 MB.
+CACHE_VALUES = {
+    'COMPRESS_THRESHOLD': int(os.environ.get('CACHE_VALUES_COMPRESS_THRESHOLD', '1024')),
+    'COMPRESS_LEVEL': int(os.environ.get('CACHE_VALUES_COMPRESS_LEVEL', '6')),
+    'CHUNK_SIZE': int(os.environ.get('CACHE_VALUES_CHUNK_SIZE', str(1000 * 1000)))
+}
+
+# A worker missing a cached value takes a lease on it for LEASE_TIMEOUT
+# seconds while computing it. The other workers missing it wait for it
+# (polling from every INTERVAL up to every MAX_INTERVAL seconds) for up
+# to WAIT_TIMEOUT seconds before computing it themselves.
+SINGLE_FLIGHT = {
+    'ENABLED': os.environ.get('SINGLE_FLIGHT_ENABLED', 'true') == 'true',
+    'LEASE_TIMEOUT': int(os.environ.get('SINGLE_FLIGHT_LEASE_TIMEOUT', '120')),
+    'WAIT_TIMEOUT': float(os.environ.get('SINGLE_FLIGHT_WAIT_TIMEOUT', '60')),
+    'INTERVAL': float(os.environ.get('SINGLE_FLIGHT_INTERVAL', '0.05')),
+    'MAX_INTERVAL': float(os.environ.get('SINGLE_FLIGHT_MAX_INTERVAL', '1'))
+}
+
+# Cached values are also kept in each process, up to MAX_SIZE bytes
+# (least recently used first out). They are read again from the shared
+# cache after TTL seconds. The cache generations (see
+# `lti_app.caching.get_generations`) are read again after GENERATION_TTL
+# seconds, so writes of other processes are seen within that delay.
+LOCAL_CACHE = {
+    'MAX_SIZE': int(os.environ.get('LOCAL_CACHE_MAX_SIZE', str(64 * 1024 * 1024))),
+    'TTL': float(os.environ.get('LOCAL_CACHE_TTL', '60')),
+    'GENERATION_TTL': float(os.environ.get('LOCAL_CACHE_GENERATION_TTL', '1'))
+}
+
+# The precomputed WordNet synonym index, built in DIRECTORY by
+# `python manage.py build_synonym_index`. WordNet is used directly until
+# it is built.
+SYNONYM_INDEX = {
+    'DIRECTORY': os.environ.get(
+        'SYNONYM_INDEX_DIRECTORY',
+        os.path.join(BASE_DIR, 'lti_app', 'core', 'data', 'synonyms')
+    )
+}
+
 # Django-RQ
 # https://github.com/rq/django-rq
 
@@ -148,7 +191,14 @@ RQ_QUEUES = {
     }
 }
 
+# The workers run the jobs in their own process rather than in a forked
+# work horse, so that the jobs share the connection pools of the process
+RQ = {
+    'WORKER_CLASS': 'rq.SimpleWorker'
+}
+
 RQ_EXCEPTION_HANDLERS = [
+    'lti_app.rq_exception_handlers.publish_metrics',
     'lti_app.rq_exception_handlers.inflate_exception',
     'lti_app.rq_exception_handlers.move_to_failed_queue'
 ]
@@ -215,12 +265,120 @@ CANVAS = {
     'DEVELOPER_KEY': os.environ.get('CANVAS_DEVELOPER_KEY')
 }
 
+# With CONCURRENT the LanguageTool request of a submission is sent while
+# CoreNLP parses it instead of afterwards.
 LANGUAGETOOL = {
     'HOST': os.environ.get('LANGUAGETOOL_HOST', 'languagetool'),
-    'PORT': os.environ.get('LANGUAGETOOL_PORT', '8010')
+    'PORT': os.environ.get('LANGUAGETOOL_PORT', '8010'),
+    'CONNECT_TIMEOUT': float(os.environ.get('LANGUAGETOOL_CONNECT_TIMEOUT', '2')),
+    'READ_TIMEOUT': float(os.environ.get('LANGUAGETOOL_READ_TIMEOUT', '10')),
+    'MAX_RETRIES': int(os.environ.get('LANGUAGETOOL_MAX_RETRIES', '2')),
+    'BACKOFF_FACTOR': float(os.environ.get('LANGUAGETOOL_BACKOFF_FACTOR', '0.5')),
+    'POOL_MAXSIZE': int(os.environ.get('LANGUAGETOOL_POOL_MAXSIZE', '10')),
+    'BREAKER_THRESHOLD': int(os.environ.get('LANGUAGETOOL_BREAKER_THRESHOLD', '5')),
+    'BREAKER_RESET_TIMEOUT': float(os.environ.get('LANGUAGETOOL_BREAKER_RESET_TIMEOUT', '30')),
+    'CONCURRENT': os.environ.get('LANGUAGETOOL_CONCURRENT', 'true') == 'true'
 }
 
+# The read timeout is slightly above the CoreNLP server timeout (15s)
+# so that server-side timeouts are reported rather than cut short.
+# BACKENDS is a comma-separated list of `host:port` CoreNLP servers to
+# balance the load on, HOST and PORT are used when it is empty.
+# OUTPUT_FORMAT is either `json` or `serialized` (protobuf).
+# SENTENCE_CACHE caches parses per sentence so that only new or edited
+# sentences are sent to CoreNLP (disabled by default).
+# Texts longer than CHUNK_SIZE characters (0 disables chunking) are split at
+# sentence boundaries and sent as CHUNK_CONCURRENCY concurrent requests.
+# PARSER_PROFILE is the default parser profile, assignments can override it.
 STANFORD_CORENLP = {
     'HOST': os.environ.get('STANFORD_CORENLP_HOST', 'corenlp'),
-    'PORT': os.environ.get('STANFORD_CORENLP_PORT', '9000')
+    'PORT': os.environ.get('STANFORD_CORENLP_PORT', '9000'),
+    'BACKENDS': [
+        backend.strip()
+        for backend in os.environ.get('STANFORD_CORENLP_BACKENDS', '').split(',')
+        if backend.strip() != ''
+    ],
+    'OUTPUT_FORMAT': os.environ.get('STANFORD_CORENLP_OUTPUT_FORMAT', 'json'),
+    'SENTENCE_CACHE': os.environ.get('STANFORD_CORENLP_SENTENCE_CACHE', 'false') == 'true',
+    'CHUNK_SIZE': int(os.environ.get('STANFORD_CORENLP_CHUNK_SIZE', '2000')),
+    'CHUNK_CONCURRENCY': int(os.environ.get('STANFORD_CORENLP_CHUNK_CONCURRENCY', '4')),
+    'PARSER_PROFILE': os.environ.get('STANFORD_CORENLP_PARSER_PROFILE', 'accurate'),
+    'PARSER_PROFILES': {
+        # Shift-reduce parser (stanford-srparser models), it needs POS tags
+        'fast': {
+            'annotators': ['tokenize', 'ssplit', 'pos', 'parse'],
+            'properties': {
+                'parse.model': 'edu/stanford/nlp/models/srparser/englishSR.ser.gz',
+                'parse.maxlen': os.environ.get('STANFORD_CORENLP_PARSER_MAXLEN', '100'),
+                'parse.nthreads': os.environ.get('STANFORD_CORENLP_PARSER_THREADS', '1')
+            }
+        },
+        # PCFG parser (CoreNLP default), it parses sentences of any length
+        'accurate': {
+            'annotators': ['parse'],
+            'properties': {
+                'parse.model': 'edu/stanford/nlp/models/lexparser/englishPCFG.ser.gz',
+                'parse.nthreads': os.environ.get('STANFORD_CORENLP_PARSER_THREADS', '1')
+            }
+        }
+    },
+    'CONNECT_TIMEOUT': float(os.environ.get('STANFORD_CORENLP_CONNECT_TIMEOUT', '2')),
+    'READ_TIMEOUT': float(os.environ.get('STANFORD_CORENLP_READ_TIMEOUT', '16')),
+    'MAX_RETRIES': int(os.environ.get('STANFORD_CORENLP_MAX_RETRIES', '2')),
+    'BACKOFF_FACTOR': float(os.environ.get('STANFORD_CORENLP_BACKOFF_FACTOR', '0.5')),
+    'POOL_MAXSIZE': int(os.environ.get('STANFORD_CORENLP_POOL_MAXSIZE', '10')),
+    'BREAKER_THRESHOLD': int(os.environ.get('STANFORD_CORENLP_BREAKER_THRESHOLD', '5')),
+    'BREAKER_RESET_TIMEOUT': float(os.environ.get('STANFORD_CORENLP_BREAKER_RESET_TIMEOUT', '30'))
+}
+
+# MAX_WORKERS is the number of independent text processing nodes run
+# at the same time for a document. Batch checks process BATCH_SIZE
+# submissions at a time and run the checks in BATCH_PROCESSES processes
+# (0 runs them in the calling process).
+TEXT_PROCESSING = {
+    'MAX_WORKERS': int(os.environ.get('TEXT_PROCESSING_MAX_WORKERS', '4')),
+    'BATCH_SIZE': int(os.environ.get('TEXT_PROCESSING_BATCH_SIZE', '32')),
+    'BATCH_PROCESSES': int(os.environ.get(
+        'TEXT_PROCESSING_BATCH_PROCESSES',
+        str(os.cpu_count() or 1)
+    ))
+}
+
+# The semantics checker pairs the text and excerpt predicates either
+# greedily ('greedy', the most similar remaining pair first) or so that
+# the total similarity is maximal ('optimal', Hungarian algorithm).
+SEMANTICS = {
+    'MATCHING': os.environ.get('SEMANTICS_MATCHING', 'greedy')
+}
+
+# The outputs of the processing nodes are stored by the digest of their
+# inputs and the name, version and options of the node. BACKEND is either
+# 'memory' (per process), 'cache' (the default cache, entries expire after
+# TIMEOUT seconds) or 'disk' (in DIRECTORY). Artefacts larger than
+# MAX_ITEM_SIZE bytes are not stored and the memory and disk backends
+# hold at most MAX_SIZE bytes.
+ARTIFACTS = {
+    'BACKEND': os.environ.get('ARTIFACTS_BACKEND', 'cache'),
+    'DIRECTORY': os.environ.get('ARTIFACTS_DIRECTORY', '/tmp/scriba-artifacts'),
+    'MAX_ITEM_SIZE': int(os.environ.get('ARTIFACTS_MAX_ITEM_SIZE', str(16 * 1024 * 1024))),
+    'MAX_SIZE': int(os.environ.get('ARTIFACTS_MAX_SIZE', str(256 * 1024 * 1024))),
+    'TIMEOUT': int(os.environ.get('ARTIFACTS_TIMEOUT', str(30 * 24 * 3600)))
+}
+
+# Workers wait until every CoreNLP server (for each parser profile) and
+# LanguageTool answer a warm-up request within BUDGET seconds. They give
+# up after TIMEOUT seconds, probing every INTERVAL seconds.
+READINESS = {
+    'BUDGET': float(os.environ.get('READINESS_BUDGET', '5')),
+    'TIMEOUT': float(os.environ.get('READINESS_TIMEOUT', '600')),
+    'INTERVAL': float(os.environ.get('READINESS_INTERVAL', '5'))
+}
+
+# The monitoring endpoints answer requests with the header
+# `Authorization: Token <TOKEN>` (and none if TOKEN is empty). Processes
+# publish their metrics to the cache, reports older than REPORT_MAX_AGE
+# seconds are dropped.
+MONITORING = {
+    'TOKEN': os.environ.get('MONITORING_TOKEN', ''),
+    'REPORT_MAX_AGE': int(os.environ.get('MONITORING_REPORT_MAX_AGE', str(24 * 3600)))
 }
@@ -27,7 +27,8 @@ urlpatterns = [
     path('register/', include('lti_app.register.urls')),
     path('launch/', include('lti_app.launch.urls')),
     path('assignments/', include('lti_app.assignments.urls')),
-    path('jobs/', include('lti_app.jobs.urls'))
+    path('jobs/', include('lti_app.jobs.urls')),
+    path('monitoring/', include('lti_app.monitoring.urls'))
 ]
 
 handler500 = error_500